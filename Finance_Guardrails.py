@@ -1,7 +1,12 @@
 import streamlit as st
-import boto3
 import json
 from botocore.exceptions import ClientError
+from aws_clients import get_client
+from document_cache import get_document_cache
+from inference_cache import memoized
+from identity_cache import IdentityCache, SessionExpired
+from post_checks import PostCheck, run_post_checks
+from bedrock_streaming import BEDROCK_STREAMING, anthropic_messages_text, invoke_model_stream, render_stream
 
 # AWS configurations
 REGION_NAME = "us-west-2"
@@ -18,13 +23,13 @@ GUARDRAIL_IDS = {
 MAX_TOKENS = 1000
 GUARDRAIL_VERSION = "DRAFT"
 S3_BUCKET_NAME = "stock-market-data-poc"
+CUSTOMER_DATA_KEY = "Customer_Data.txt"
 
-# Initialize AWS clients
-session = boto3.Session(region_name=REGION_NAME)
-cognito_client = session.client('cognito-idp')
-bedrock_client = session.client('bedrock-runtime')
-s3_client = session.client('s3')
-comprehend_client = session.client('comprehend')
+# Shared AWS clients
+cognito_client = get_client('cognito-idp', REGION_NAME)
+bedrock_client = get_client('bedrock-runtime', REGION_NAME)
+s3_client = get_client('s3', REGION_NAME)
+comprehend_client = get_client('comprehend', REGION_NAME)
 
 def authenticate_user(username, password):
     try:
@@ -42,28 +47,36 @@ def authenticate_user(username, password):
         st.error(f"Authentication failed: {e}")
         return None
 
+# Function to get this browser session's cached Cognito identity
+def identity_cache():
+    return IdentityCache(cognito_client, USER_POOL_ID, CLIENT_ID, st.session_state)
+
 def get_user_group(username):
     try:
-        response = cognito_client.admin_list_groups_for_user(
-            Username=username,
-            UserPoolId=USER_POOL_ID
-        )
-        groups = [group['GroupName'] for group in response['Groups']]
+        # Cached per session until the tokens expire; no Cognito call on most reruns
+        groups = identity_cache().groups(username)
         return groups[0] if groups else None
+    except SessionExpired:
+        # The tokens could not be refreshed; back to the login form
+        st.session_state.auth_status = False
+        st.session_state.session_expired = True
+        st.rerun()
     except ClientError as e:
         st.error(f"Failed to get user group: {e}")
         return None
 
-def get_s3_file_content(file_name):
+# Function to get a reference document as a CachedDocument (its text and
+# ETag), or None if S3 could not be read
+def get_s3_document(file_name):
     try:
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=file_name)
-        file_content = response['Body'].read().decode('utf-8')
-        return file_content
+        # Served from the shared cache; S3 is only asked again once the TTL lapses
+        return get_document_cache(REGION_NAME).get(S3_BUCKET_NAME, file_name)
     except ClientError as e:
         st.error(f"Failed to retrieve file from S3: {e}")
         return None
 
-def generate_analysis(prompt, context, guardrail_id):
+@memoized("bedrock.invoke_model", model_id=MODEL_ID, guardrail_version=GUARDRAIL_VERSION, max_tokens=MAX_TOKENS)
+def generate_analysis(prompt, context, guardrail_id, stream=False):
     full_prompt = f"Context:\n{context}\n\nQuestion: {prompt}\n\nAnalysis:"
     payload = {
         "anthropic_version": "bedrock-2023-05-31",
@@ -76,15 +89,19 @@ def generate_analysis(prompt, context, guardrail_id):
         ]
     }
 
+    request = {
+        "body": json.dumps(payload),
+        "modelId": MODEL_ID,
+        "contentType": "application/json",
+        "accept": "application/json",
+        "guardrailIdentifier": guardrail_id,
+        "guardrailVersion": GUARDRAIL_VERSION
+    }
+
     try:
-        response = bedrock_client.invoke_model(
-            body=json.dumps(payload),
-            modelId=MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            guardrailIdentifier=guardrail_id,
-            guardrailVersion=GUARDRAIL_VERSION
-        )
+        if stream:
+            return invoke_model_stream(bedrock_client, anthropic_messages_text, **request)
+        response = bedrock_client.invoke_model(**request)
         response_body = json.loads(response['body'].read())
         return response_body['content'][0]['text']
     except ClientError as e:
@@ -93,27 +110,46 @@ def generate_analysis(prompt, context, guardrail_id):
             st.error(f"Error details: {e.response['Error']['Message']}")
         return None
 
+# The two post-checks below run on worker threads: a ClientError is raised
+# and shown by run_post_checks in that check's section
+@memoized("comprehend.detect_pii_entities", language_code='en')
 def detect_pii_entities(text):
-    try:
-        response = comprehend_client.detect_pii_entities(
-            Text=text,
-            LanguageCode='en'
-        )
-        return response['Entities']
-    except ClientError as e:
-        st.error(f"Failed to detect PII entities: {e}")
-        return None
+    response = comprehend_client.detect_pii_entities(
+        Text=text,
+        LanguageCode='en'
+    )
+    return response['Entities']
 
+@memoized("comprehend.detect_sentiment", language_code='en')
 def analyze_sentiment(text):
-    try:
-        response = comprehend_client.detect_sentiment(
-            Text=text,
-            LanguageCode='en'
-        )
-        return response['Sentiment'], response['SentimentScore']
-    except ClientError as e:
-        st.error(f"Failed to analyze sentiment: {e}")
-        return None, None
+    response = comprehend_client.detect_sentiment(
+        Text=text,
+        LanguageCode='en'
+    )
+    return response['Sentiment'], response['SentimentScore']
+
+# Function to show the PII entities found in the analysis
+def render_pii_entities(analysis, pii_entities):
+    st.subheader("PII Detection")
+    if pii_entities:
+        st.write("Detected PII Entities in the analysis:")
+        for entity in pii_entities:
+            detected_text = analysis[entity['BeginOffset']:entity['EndOffset']]
+            st.write(f"- Type: {entity['Type']}, Text: '{detected_text}'")
+    else:
+        st.write("No PII entities detected in the analysis.")
+
+# Function to show the sentiment of the analysis
+def render_sentiment(sentiment_result):
+    st.subheader("Sentiment Analysis")
+    sentiment, sentiment_score = sentiment_result
+    if sentiment and sentiment_score:
+        st.write(f"Overall Sentiment of the analysis: {sentiment}")
+        st.write("Sentiment Scores:")
+        for key, value in sentiment_score.items():
+            st.write(f"- {key}: {value:.2f}")
+    else:
+        st.write("Failed to analyze sentiment of the analysis.")
 
 def main():
     st.title("Investment Analysis App")
@@ -123,6 +159,8 @@ def main():
 
     if not st.session_state.auth_status:
         st.subheader("Login")
+        if st.session_state.pop("session_expired", False):
+            st.info("Your session has expired. Please log in again.")
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
 
@@ -134,6 +172,7 @@ def main():
                     st.session_state.auth_response = auth_response
                     st.session_state.username = username
                 else:
+                    identity_cache().remember_login(username, auth_response['AuthenticationResult'])
                     st.session_state.auth_status = True
                     st.session_state.username = username
                     st.success("Login successful!")
@@ -163,41 +202,38 @@ def main():
         user_group = get_user_group(st.session_state.username)
         if user_group:
             st.write(f"You are in the {user_group} group.")
-            guardrail_id = GUARDRAIL_IDS.get(user_group)
+            guardrail_id = identity_cache().guardrail_id(st.session_state.username, GUARDRAIL_IDS)
             if guardrail_id:
-                file_content = get_s3_file_content("Customer_Data.txt")
-                if file_content:
+                document = get_s3_document(CUSTOMER_DATA_KEY)
+                if document is not None and document.text:
                     st.subheader("Custom Question")
                     user_prompt = st.text_area("Enter your custom analysis question:")
                     if st.button("Generate Custom Analysis"):
                         if user_prompt:
                             st.info("Generating analysis... Please wait.")
-                            analysis = generate_analysis(user_prompt, file_content, guardrail_id)
+                            # The whole document when it fits the model budget, else the header and the records relevant to the question
+                            from retrieval import retrieve_context
+                            context = retrieve_context(user_prompt, document, CUSTOMER_DATA_KEY)
+                            analysis = generate_analysis(user_prompt, context, guardrail_id, stream=BEDROCK_STREAMING)
                             if analysis:
                                 st.write("Analysis Result:")
-                                st.write(analysis)
-                               
-                                # PII Detection (Updated to exclude scores)
-                                st.subheader("PII Detection")
-                                pii_entities = detect_pii_entities(analysis)
-                                if pii_entities:
-                                    st.write("Detected PII Entities in the analysis:")
-                                    for entity in pii_entities:
-                                        detected_text = analysis[entity['BeginOffset']:entity['EndOffset']]
-                                        st.write(f"- Type: {entity['Type']}, Text: '{detected_text}'")
+                                if BEDROCK_STREAMING:
+                                    analysis = render_stream(analysis)
                                 else:
-                                    st.write("No PII entities detected in the analysis.")
+                                    st.write(analysis)
                                
-                                # Sentiment Analysis
-                                st.subheader("Sentiment Analysis")
-                                sentiment, sentiment_score = analyze_sentiment(analysis)
-                                if sentiment and sentiment_score:
-                                    st.write(f"Overall Sentiment of the analysis: {sentiment}")
-                                    st.write("Sentiment Scores:")
-                                    for key, value in sentiment_score.items():
-                                        st.write(f"- {key}: {value:.2f}")
+                                # A stream can end with no text (an error, or a guardrail
+                                # intervention); Comprehend rejects empty input
+                                if not analysis:
+                                    st.info("No analysis text was returned, so PII detection and sentiment analysis were skipped.")
                                 else:
-                                    st.write("Failed to analyze sentiment of the analysis.")
+                                    # PII detection and sentiment analysis run in parallel
+                                    report = run_post_checks([
+                                        PostCheck("PII Detection", lambda: detect_pii_entities(analysis),
+                                                  lambda pii_entities: render_pii_entities(analysis, pii_entities)),
+                                        PostCheck("Sentiment Analysis", lambda: analyze_sentiment(analysis), render_sentiment)
+                                    ])
+                                    st.caption(report.summary())
                             else:
                                 st.error("Failed to generate analysis. Please check the error messages above for more details.")
                         else:
@@ -210,6 +246,7 @@ def main():
             st.error("Failed to retrieve user group.")
 
         if st.button("Logout"):
+            identity_cache().forget()
             st.session_state.auth_status = False
             st.rerun()
 
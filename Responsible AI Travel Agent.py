@@ -1,17 +1,16 @@
 import streamlit as st
-import boto3
 import json
-import pandas as pd
 from botocore.exceptions import NoCredentialsError, PartialCredentialsError
-import requests
+from aws_clients import get_client
+from inference_cache import memoized
+from toxicity import detect_toxicity_in_text
+from bedrock_streaming import BEDROCK_STREAMING, invoke_model_stream, render_stream, titan_text
 
  
 # AWS client setup using environment variables
 try:
-    session = boto3.Session()
- 
-    bedrock_runtime = session.client('bedrock-runtime')
-    comprehend = session.client('comprehend')
+    bedrock_runtime = get_client('bedrock-runtime')
+    comprehend = get_client('comprehend')
 except (NoCredentialsError, PartialCredentialsError) as e:
     st.error("AWS credentials not found. Please configure your environment correctly.")
  
@@ -19,32 +18,41 @@ except (NoCredentialsError, PartialCredentialsError) as e:
 guardrail_id = 'y334bznjuo9v'
  
 # Function to call the AI model and return the necessary output, including any guardrail actions
-def call_bedrock_titan_model_with_guardrails(prompt):
+# With stream=True it returns a BedrockStream instead (or None on failure)
+@memoized("bedrock.invoke_model", model_id="amazon.titan-text-lite-v1", guardrail_id=guardrail_id, guardrail_version="DRAFT")
+def call_bedrock_titan_model_with_guardrails(prompt, stream=False):
     try:
         input_body = {"inputText": prompt}
-        response = bedrock_runtime.invoke_model(
-            modelId="amazon.titan-text-lite-v1",
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(input_body),
-            trace="ENABLED",
-            guardrailIdentifier=guardrail_id,
-            guardrailVersion="DRAFT"
-        )
+        request = {
+            "modelId": "amazon.titan-text-lite-v1",
+            "contentType": "application/json",
+            "accept": "application/json",
+            "body": json.dumps(input_body),
+            "trace": "ENABLED",
+            "guardrailIdentifier": guardrail_id,
+            "guardrailVersion": "DRAFT"
+        }
+        if stream:
+            return invoke_model_stream(bedrock_runtime, titan_text, **request)
+        response = bedrock_runtime.invoke_model(**request)
         output_body = json.loads(response["body"].read().decode())
         action = output_body.get("amazon-bedrock-guardrailAction", "NONE")
         return output_body["results"][0]["outputText"], output_body
     except Exception as e:
         st.error(f"Error invoking model: {e}")
-        return None, None
+        return None if stream else (None, None)
  
 # Function to check toxicity using Amazon Comprehend
 def check_toxicity_with_comprehend(text):
     try:
-        response = comprehend.detect_toxic_content(
-            TextSegments=[{"Text": text}],
-            LanguageCode='en'
-        )
+        # Long responses are split under the 1 KB segment limit and scored in batches
+        report = detect_toxicity_in_text(comprehend, text)
+        if report.failed():
+            st.error(f"Error checking toxicity: {'; '.join(report.errors)}")
+            return False, None
+        for error in report.errors:
+            st.warning(f"Part of the response could not be checked for toxicity: {error}")
+        response = {"ResultList": report.result_list()}
  
         # Remove the "GRAPHIC" label from the response
         for result in response.get("ResultList", []):
@@ -66,6 +74,7 @@ def json_to_table(toxicity_json):
                 "Score": label["Score"]
             })
     if table_data:
+        import pandas as pd
         df = pd.DataFrame(table_data)
         return df
     else:
@@ -92,27 +101,17 @@ def trace_json_to_table(trace_json):
             })
  
     if trace_data:
+        import pandas as pd
         df = pd.DataFrame(trace_data)
         return df
     else:
         return None
  
-# Initialize the Google Search API
-def search_google(query, api_key, cse_id):
-    url = "https://www.googleapis.com/customsearch/v1"
-    params = {
-        "key": api_key,
-        "cx": cse_id,
-        "q": query,
-        "num": 5  # Get top 5 results
-    }
-    response = requests.get(url, params=params)
-    return response.json()
- 
 # Summarize using Hugging Face's summarization pipeline
 # Summarize using an Amazon Bedrock model (replacing Hugging Face)
 # Summarize using an Amazon Bedrock model (e.g., Anthropic Claude)
 # Summarize using an Amazon Bedrock model (e.g., Anthropic Claude)
+@memoized("bedrock.invoke_model.summarize", model_id='anthropic.claude-v2')
 def summarize_snippets(snippets):
     combined_text = " ".join(snippets)
     prompt = f"Human: Summarize the following text:\n\n{combined_text}\n\nSummary:\nAssistant:"
@@ -137,6 +136,7 @@ def summarize_snippets(snippets):
  
 # Fact-check using AWS Bedrock LLM
 # Fact-check using AWS Bedrock LLM (e.g., Anthropic Claude)
+@memoized("bedrock.invoke_model.fact_check", model_id='anthropic.claude-v2')
 def fact_check(statement, summary):
     prompt = f"Human: Please fact-check the following statement: '{statement}' based on the following summary: {summary}\nAssistant:"
 
@@ -158,16 +158,22 @@ def fact_check(statement, summary):
 
     return fact_check_result.strip()
  
-# Generate a fact-checked response
+# Generate a fact-checked response. The statement is searched under a few
+# phrasings at once and the results merged before summarizing.
 def generate_fact_check(statement, api_key, cse_id):
-    search_results = search_google(statement, api_key, cse_id)
-    snippets = [item['snippet'] for item in search_results.get('items', [])]
+    import requests
+    from web_search import get_web_search, reformulate
+    try:
+        items = get_web_search(api_key, cse_id).search_many(reformulate(statement))
+    except requests.RequestException as e:
+        return f"Web search failed: {e}"
+    snippets = [item['snippet'] for item in items if item['snippet']]
  
     if not snippets:
         return "No relevant results found for the given statement."
  
     summary = summarize_snippets(snippets)
-    sources = "\n".join([f"- [{item['title']}]({item['link']})" for item in search_results.get('items', [])])
+    sources = "\n".join([f"- [{item['title']}]({item['link']})" for item in items])
  
     fact_check_result = fact_check(statement, summary)
  
@@ -209,11 +215,25 @@ def main():
  
     if st.button("Submit Query"):
  
-        response_text, output_body = call_bedrock_titan_model_with_guardrails(user_input)
+        if BEDROCK_STREAMING:
  
-        st.session_state.response_text = response_text  # Save the response in session state
+            st.write("Model Response:")
+ 
+            stream = call_bedrock_titan_model_with_guardrails(user_input, stream=True)
+ 
+            # The guardrail outcome is shown with the trace details below
  
-        st.write("Model Response:", response_text)
+            response_text = render_stream(stream, show_guardrail_action=False) if stream else None
+ 
+            output_body = stream.output_body if stream else None
+ 
+        else:
+ 
+            response_text, output_body = call_bedrock_titan_model_with_guardrails(user_input)
+ 
+            st.write("Model Response:", response_text)
+ 
+        st.session_state.response_text = response_text  # Save the response in session state
  
         if response_text:
  
@@ -1,89 +1,258 @@
-import json
+import io
 import time
-import boto3
 import streamlit as st
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
+from aws_clients import get_client
+from s3_listing import get_s3_listing_index
+from s3_upload import get_uploader
+from decision_cache import get_decision_cache
+from thumbnail_cache import get_thumbnail_cache
+from image_preprocess import IMAGE_MAX_SIDE, IMAGE_QUALITY, OUTPUT_TYPES, preprocess_image
+from execution_tracker import DEADLINE_EXCEEDED, get_execution_tracker
+from rate_limit import RateLimiter
+from underwriting_batch import RESULT_COLUMNS, UnderwritingBatch, parse_decision_rationale
 
 # AWS Configuration
 region_name = 'us-east-1'
 s3_bucket_name = 'underwriting-document-bucket-101'
 step_function_arn = "arn:aws:states:us-east-1:913524913171:stateMachine:UnderwritingValidationStateMachine"
+# How often the progress fragment refreshes while an execution runs; the
+# tracker decides when a refresh actually calls Step Functions
+PROGRESS_REFRESH_SECONDS = 0.5
+# Batch mode: executions in flight at once, and StartExecution calls per second
+BATCH_CONCURRENCY = 10
+BATCH_START_RATE = 5.0
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Most keys offered by the image picker at once; a search narrows them
+PICKER_LIMIT = 200
+# Thumbnails per gallery page, and per row
+GALLERY_PAGE_SIZE = 12
+GALLERY_COLUMNS = 4
 
-# Initialize AWS clients
-s3_client = boto3.client('s3', region_name=region_name)
-stepfunctions_client = boto3.client('stepfunctions', region_name=region_name)
+# Shared AWS clients
+s3_client = get_client('s3', region_name)
 
-# Function to list files in S3 bucket
-def list_files_in_s3(bucket_name):
+# Function to search the files in an S3 bucket through the shared listing
+# index. Returns (keys, more), where more says the picker is truncated.
+def list_files_in_s3(bucket_name, query="", force_refresh=False):
+    index = get_s3_listing_index(bucket_name, region_name)
     try:
-        response = s3_client.list_objects_v2(Bucket=bucket_name)
-        if 'Contents' in response:
-            return [content['Key'] for content in response['Contents']]
-        else:
-            return []
+        index.refresh(force=force_refresh)
+    except (ClientError, BotoCoreError) as e:
+        st.error(f"An error occurred while listing files in S3: {e}")
+    return index.search(query, limit=PICKER_LIMIT)
+
+# Function to show one page of thumbnails for the images matching a search.
+# Only the visible page is looked up, and its thumbnails are fetched
+# concurrently. Choosing one remembers it for the picker.
+def render_gallery(bucket_name, query):
+    index = get_s3_listing_index(bucket_name, region_name)
+    page = st.number_input("Gallery page", min_value=1, value=1, step=1)
+    keys, more = index.search(query, limit=page * GALLERY_PAGE_SIZE, suffixes=IMAGE_EXTENSIONS)
+    keys = keys[(page - 1) * GALLERY_PAGE_SIZE:]
+    if not keys:
+        st.caption("No images on this page.")
+        return
+
+    thumbnails = get_thumbnail_cache(region_name).get_many(bucket_name, [(key, index.etag(key)) for key in keys])
+    columns = st.columns(GALLERY_COLUMNS)
+    for position, (key, thumbnail) in enumerate(zip(keys, thumbnails)):
+        with columns[position % GALLERY_COLUMNS]:
+            if thumbnail:
+                st.image(thumbnail, caption=key)
+            else:
+                st.caption(f"{key} (no preview)")
+            if st.button("Select", key=f"gallery:{key}"):
+                st.session_state.gallery_choice = key
+    if more:
+        st.caption("More images on the next page.")
+
+# Function to list the image keys under a prefix, across every page
+def list_image_keys(bucket_name, prefix):
+    try:
+        keys = []
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+            keys.extend(content['Key'] for content in page.get('Contents', [])
+                        if content['Key'].lower().endswith(IMAGE_EXTENSIONS))
+        return keys
     except ClientError as e:
         st.error(f"An error occurred while listing files in S3: {e}")
         return []
 
-# Function to upload file to S3
-def upload_file_to_s3(file, bucket_name, object_name=None):
+# Function to upright, downscale and recompress an uploaded photo, and report
+# what it saved. The upload needs the result, so it runs right here on the
+# script thread; Pillow releases the GIL while decoding and encoding, so
+# other sessions keep running meanwhile.
+def preprocess_upload(file, options):
+    with st.spinner("Preparing the image..."):
+        try:
+            result = preprocess_image(file.getvalue(), file.name, content_type=file.type, **options)
+        except Exception as e:
+            # Unreadable or oversized images still go up unchanged
+            st.warning(f"Could not preprocess the image, uploading it as is: {e}")
+            return io.BytesIO(file.getvalue()), file.name, file.type
+    st.caption(f"Preprocessed {result.original_size[0]}x{result.original_size[1]} to {result.size[0]}x{result.size[1]}: "
+               f"{result.original_bytes / 1e6:.2f} MB to {len(result.data) / 1e6:.2f} MB "
+               f"({result.bytes_saved / 1e6:.2f} MB saved) in {result.seconds * 1000:.0f} ms")
+    return io.BytesIO(result.data), result.file_name, result.content_type
+
+# Function to upload file to S3 under its content hash, optionally
+# preprocessed first. Reruns with the same file and options in the uploader
+# reuse the key remembered in session state, and content already in the
+# bucket is not sent again.
+def upload_file_to_s3(file, bucket_name, preprocess_options=None):
+    uploaded = st.session_state.setdefault("uploaded_objects", {})
+    upload_id = (getattr(file, "file_id", None) or (file.name, file.size),
+                 tuple(sorted((preprocess_options or {}).items())))
+    if upload_id in uploaded:
+        return uploaded[upload_id]
+
+    if preprocess_options:
+        body, file_name, content_type = preprocess_upload(file, preprocess_options)
+    else:
+        body, file_name, content_type = file, file.name, file.type
     try:
-        if object_name is None:
-            object_name = file.name
-        s3_client.upload_fileobj(file, bucket_name, object_name)
-        st.success(f"File uploaded successfully to {bucket_name}/{object_name}")
-        return object_name
+        object_name, sent = get_uploader(bucket_name, region_name).upload(body, file_name, content_type)
     except ClientError as e:
         st.error(f"An error occurred while uploading to S3: {e}")
         return None
+    get_s3_listing_index(bucket_name, region_name).add(object_name)
+    uploaded[upload_id] = object_name
+    if sent:
+        st.success(f"File uploaded successfully to {bucket_name}/{object_name}")
+        # Written next to the image so the gallery never downloads the original
+        try:
+            get_thumbnail_cache(region_name).store(bucket_name, object_name, body.getvalue())
+        except Exception as e:
+            st.caption(f"No gallery thumbnail was stored for this image: {e}")
+    else:
+        st.info(f"This image is already stored as {bucket_name}/{object_name}")
+    return object_name
+
+# Function to get an object's ETag, which identifies its content for the decision cache
+def get_image_etag(bucket_name, object_name):
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=object_name)['ETag']
+    except ClientError as e:
+        st.error(f"An error occurred while reading the image from S3: {e}")
+        return None
+
+# Function to store a finished execution's decision once, under the image
+# content it was started for
+def remember_decision(execution, decision, rationale):
+    content_id = st.session_state.get("underwriting_content_id")
+    if content_id and st.session_state.get("underwriting_saved_arn") != execution.execution_arn:
+        get_decision_cache().put(step_function_arn, content_id, decision, rationale, execution.execution_arn)
+        st.session_state.underwriting_saved_arn = execution.execution_arn
+
+# Function to drop the decision or execution shown for the previous
+# selection, so it is never displayed under another image
+def forget_underwriting_result():
+    for key in ("underwriting_object", "underwriting_content_id", "underwriting_cached", "underwriting_execution"):
+        st.session_state.pop(key, None)
+
+# Function to show a decision from the cache, marked as such
+def render_cached_decision(cached):
+    st.markdown("### Underwriting Result:")
+    st.caption(f"Cached decision from {time.strftime('%Y-%m-%d %H:%M', time.localtime(cached.created_at))}; "
+               "no Step Function was run. Tick \"Force recompute\" to run it again.")
+    show_decision_rationale(cached.decision, cached.rationale)
+    if st.button("Forget this cached decision"):
+        get_decision_cache().invalidate(step_function_arn, st.session_state.get("underwriting_content_id"))
+        st.session_state.underwriting_cached = None
+        st.rerun()
 
-# Function to start a Step Function execution
+# Function to start a Step Function execution. Express workflows run to
+# completion in this call; Standard ones are tracked by the progress fragment.
 def start_step_function(state_machine_arn, input_data):
+    tracker = get_execution_tracker(region_name)
     try:
-        response = stepfunctions_client.start_execution(
-            stateMachineArn=state_machine_arn,
-            input=json.dumps(input_data)
-        )
-        return response['executionArn']
+        if tracker.is_express(state_machine_arn):
+            with st.spinner("Running the Express workflow..."):
+                return tracker.run_sync(state_machine_arn, input_data)
+        return tracker.start(state_machine_arn, input_data)
     except ClientError as e:
         st.error(f"An error occurred while starting the Step Function: {e}")
         return None
 
-# Function to get the result of a Step Function execution
-def get_step_function_result(execution_arn):
-    while True:
+# Function to show an execution's progress and result. While it runs only
+# this fragment reruns, so the rest of the page stays usable.
+def render_execution(execution):
+    @st.fragment(run_every=None if execution.done else PROGRESS_REFRESH_SECONDS)
+    def execution_progress():
+        tracker = get_execution_tracker(region_name)
+        was_done = execution.done
         try:
-            response = stepfunctions_client.describe_execution(
-                executionArn=execution_arn
-            )
-            status = response['status']
-            if status == 'SUCCEEDED':
-                return json.loads(response['output'])
-            elif status in ['FAILED', 'TIMED_OUT', 'ABORTED']:
-                st.error(f"Step Function execution failed with status: {status}")
-                return None
-            time.sleep(2)
+            tracker.poll(execution)
         except ClientError as e:
             st.error(f"An error occurred while retrieving execution result: {e}")
-            return None
+            return
 
-# Function to parse and display the decision and rationale
-def display_decision_rationale(content):
-    if content:
-        text = content[0]['text']
-        decision_start = text.find('<decision>') + len('<decision>')
-        decision_end = text.find('</decision>')
-        rationale_start = text.find('<rationale>') + len('<rationale>')
-        rationale_end = text.find('</rationale>')
+        if not execution.done:
+            st.info(f"Step Function running for {execution.elapsed(tracker.clock()):.0f}s, waiting for result...")
+        elif not was_done:
+            # Rerun the page once so the fragment stops refreshing
+            st.rerun()
+        elif execution.status == 'SUCCEEDED':
+            st.markdown("### Underwriting Result:")
+            #st.json(result)
+            parsed = display_decision_rationale(execution.output["Body"]["content"])
+            if parsed:
+                remember_decision(execution, *parsed)
+        elif execution.status == DEADLINE_EXCEEDED:
+            st.warning(f"Stopped waiting after {tracker.timeout:.0f}s; the execution is still running: {execution.execution_arn}")
+        else:
+            st.error(f"Step Function execution failed with status: {execution.status}")
+
+    execution_progress()
+
+# Function to show a batch's progress, then its results table and statistics.
+# Like render_execution, only this fragment reruns while the batch runs.
+def render_batch(batch):
+    @st.fragment(run_every=None if batch.done else PROGRESS_REFRESH_SECONDS)
+    def batch_progress():
+        was_done = batch.done
+        try:
+            batch.advance()
+        except ClientError as e:
+            st.error(f"An error occurred while retrieving execution results: {e}")
+
+        stats = batch.stats()
+        st.progress(stats["finished"] / max(1, stats["images"]),
+                    text=f"{stats['finished']} of {stats['images']} images finished")
+        st.write(", ".join(f"{status}: {count}" for status, count in sorted(batch.counts().items())))
+        if not batch.done:
+            return
+        if not was_done:
+            # Rerun the page once so the fragment stops refreshing
+            st.rerun()
 
-        decision = text[decision_start:decision_end].strip()
-        rationale = text[rationale_start:rationale_end].strip()
+        import pandas as pd
+        results = pd.DataFrame(batch.results(), columns=RESULT_COLUMNS)
+        st.markdown("### Batch Results")
+        st.dataframe(results)
+        st.json(stats)
+        st.download_button("Download results as CSV", results.to_csv(index=False),
+                           file_name="underwriting_results.csv", mime="text/csv")
 
-        st.markdown("### Decision")
-        st.write(decision)
+    batch_progress()
 
-        st.markdown("### Rationale")
-        st.write(rationale)
+# Function to display a decision and its rationale
+def show_decision_rationale(decision, rationale):
+    st.markdown("### Decision")
+    st.write(decision)
+
+    st.markdown("### Rationale")
+    st.write(rationale)
+
+# Function to parse and display the decision and rationale. Returns them, or
+# None when there is no content.
+def display_decision_rationale(content):
+    if content:
+        decision, rationale = parse_decision_rationale(content[0]['text'])
+        show_decision_rationale(decision, rationale)
+        return decision, rationale
+    return None
 
 # Main Streamlit application
 def main():
@@ -92,35 +261,84 @@ def main():
     st.markdown("## Select or Upload an Image for Underwriting Analysis")
     
     with st.expander("Select an Image"):
-        s3_files = list_files_in_s3(s3_bucket_name)
-        selected_file = st.selectbox("Select an image from S3", s3_files)
+        force_refresh = st.button("Refresh image list")
+        query = st.text_input("Search images by prefix or name")
+        s3_files, more = list_files_in_s3(s3_bucket_name, query, force_refresh)
+        if more:
+            st.caption(f"Showing the first {PICKER_LIMIT} matches; search to narrow them down.")
+        if st.toggle("Show thumbnails"):
+            render_gallery(s3_bucket_name, query)
+        chosen = st.session_state.get("gallery_choice")
+        if chosen and chosen not in s3_files:
+            s3_files = [chosen] + s3_files
+        selected_file = st.selectbox("Select an image from S3", s3_files,
+                                     index=s3_files.index(chosen) if chosen else 0)
 
     with st.expander("Upload a New Image"):
         uploaded_file = st.file_uploader("Upload an image file", type=['jpg', 'jpeg', 'png'])
+        preprocess_options = None
+        # Opt-in: unless checked, the photo is uploaded byte for byte as chosen
+        if st.checkbox("Downscale and recompress before upload"):
+            columns = st.columns(3)
+            preprocess_options = {
+                "max_side": columns[0].number_input("Maximum side (px)", min_value=256, max_value=8192,
+                                                    value=IMAGE_MAX_SIDE, step=256),
+                "image_format": columns[1].selectbox("Format", list(OUTPUT_TYPES)),
+                "quality": columns[2].slider("Quality", min_value=40, max_value=95, value=IMAGE_QUALITY),
+            }
         if uploaded_file:
-            object_name = upload_file_to_s3(uploaded_file, s3_bucket_name)
+            object_name = upload_file_to_s3(uploaded_file, s3_bucket_name, preprocess_options)
             selected_file = object_name
 
+    # A stored decision or execution belongs to the object it was started for
+    if st.session_state.get("underwriting_object") != (s3_bucket_name, selected_file):
+        forget_underwriting_result()
+
     if selected_file:
         st.markdown(f"### Selected Image: `{selected_file}`")
         
+        force_recompute = st.checkbox("Force recompute", help="Run the Step Function even if this image has a cached decision")
         if st.button("Start Underwriting Process"):
-            input_data = {
-                "detail": {
-                    "s3_bucket": s3_bucket_name,
-                    "s3_key": selected_file
+            content_id = get_image_etag(s3_bucket_name, selected_file)
+            cached = get_decision_cache().get(step_function_arn, content_id) if content_id and not force_recompute else None
+            st.session_state.underwriting_object = (s3_bucket_name, selected_file)
+            st.session_state.underwriting_content_id = content_id
+            st.session_state.underwriting_cached = cached
+            st.session_state.underwriting_execution = None
+            if cached is None:
+                input_data = {
+                    "detail": {
+                        "s3_bucket": s3_bucket_name,
+                        "s3_key": selected_file
+                    }
                 }
-            }
-            execution_arn = start_step_function(step_function_arn, input_data)
-            
-            if execution_arn:
-                st.info("Step Function started, waiting for result...")
-                result = get_step_function_result(execution_arn)
-                
-                if result:
-                    st.markdown("### Underwriting Result:")
-                    #st.json(result)
-                    display_decision_rationale(result["Body"]["content"])
+                st.session_state.underwriting_execution = start_step_function(step_function_arn, input_data)
+
+    if st.session_state.get("underwriting_cached"):
+        render_cached_decision(st.session_state.underwriting_cached)
+    elif st.session_state.get("underwriting_execution"):
+        render_execution(st.session_state.underwriting_execution)
+
+    st.markdown("## Batch Underwriting")
+
+    with st.expander("Underwrite Many Images"):
+        prefix = st.text_input("S3 prefix (every image under it)")
+        listed_keys = st.text_area("Or S3 keys, one per line")
+        concurrency = st.number_input("Executions in flight", min_value=1, max_value=50, value=BATCH_CONCURRENCY)
+        if st.button("Start Batch Underwriting"):
+            keys = [key.strip() for key in listed_keys.splitlines() if key.strip()]
+            if prefix:
+                keys += list_image_keys(s3_bucket_name, prefix)
+            if keys:
+                st.session_state.underwriting_batch = UnderwritingBatch(
+                    get_execution_tracker(region_name), step_function_arn, s3_bucket_name, keys,
+                    concurrency=int(concurrency), rate_limiter=RateLimiter(BATCH_START_RATE, burst=int(BATCH_START_RATE))
+                )
+            else:
+                st.warning("No images found for that prefix or key list.")
+
+    if st.session_state.get("underwriting_batch"):
+        render_batch(st.session_state.underwriting_batch)
 
 # Running the main function
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import re
+import sys
+import threading
+
+# Directory holding the sub-app scripts
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# File names of the sub-apps imported so far. The modules themselves live only
+# in sys.modules, so when Streamlit's file watcher drops an edited app from
+# sys.modules the next rerun imports the new version.
+_registered_apps = set()
+# Module names being executed right now; they are already in sys.modules but
+# not ready, so other sessions wait on the lock for them
+_loading = set()
+_load_lock = threading.Lock()
+
+# Function to turn a script file name into an importable module name
+def module_name_for(file_name):
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    return "rai_app_" + re.sub(r"\W+", "_", stem).lower()
+
+# Function to import a sub-app once per process, on first use or after the
+# file watcher has unloaded it
+def load_app(file_name):
+    name = module_name_for(file_name)
+    module = sys.modules.get(name)
+    if module is not None and name not in _loading:
+        return module
+
+    with _load_lock:
+        module = sys.modules.get(name)
+        if module is None:
+            path = os.path.join(APP_DIR, file_name)
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[spec.name] = module
+            _loading.add(name)
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                # Leave no half-initialised module behind so the next rerun retries
+                sys.modules.pop(spec.name, None)
+                raise
+            finally:
+                _loading.discard(name)
+            _registered_apps.add(file_name)
+    return module
+
+# Function to render a sub-app through its main() entry point
+def render_app(file_name):
+    module = load_app(file_name)
+    module.main()
+
+# Function to list which sub-apps have been imported so far
+def loaded_apps():
+    return sorted(file_name for file_name in _registered_apps if module_name_for(file_name) in sys.modules)
@@ -0,0 +1,54 @@
+import os
+import threading
+import boto3
+import streamlit as st
+from botocore.config import Config
+
+# Connection pool and retry settings, overridable from the environment
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "120"))
+RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "adaptive")
+MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "4"))
+
+
+# One boto3 client per (service, region), shared by every thread and session.
+# boto3 clients are thread-safe once built; only construction needs the lock.
+class ClientFactory:
+    def __init__(self, max_pool_connections=MAX_POOL_CONNECTIONS, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, retry_mode=RETRY_MODE, max_attempts=MAX_ATTEMPTS):
+        self.config = Config(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={"mode": retry_mode, "max_attempts": max_attempts}
+        )
+        self._session = boto3.Session()
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, service_name, region_name=None):
+        region_name = region_name or self._session.region_name
+        key = (service_name, region_name)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._session.client(service_name, region_name=region_name, config=self.config)
+                    self._clients[key] = client
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+# Process-wide factory, kept alive across reruns and browser sessions
+@st.cache_resource
+def get_client_factory():
+    return ClientFactory()
+
+# Function to get the shared client for a service
+def get_client(service_name, region_name=None):
+    return get_client_factory().client(service_name, region_name)
@@ -0,0 +1,130 @@
+import json
+import os
+import time
+import streamlit as st
+from botocore.exceptions import ClientError
+
+# Stream answers token by token; set BEDROCK_STREAMING=0 to wait for the full body
+BEDROCK_STREAMING = os.environ.get("BEDROCK_STREAMING", "1") == "1"
+
+# Response keys Bedrock adds to the final chunk(s) of a guarded stream
+METADATA_KEYS = ("amazon-bedrock-guardrailAction", "amazon-bedrock-trace", "amazon-bedrock-invocationMetrics")
+
+
+# Text extractors for the chunk formats of the model families we use
+def anthropic_messages_text(chunk):
+    if chunk.get("type") == "content_block_delta":
+        return chunk.get("delta", {}).get("text", "")
+    return ""
+
+
+def titan_text(chunk):
+    return chunk.get("outputText", "")
+
+
+# Iterable over the text of an invoke_model_with_response_stream body. Hand it
+# to st.write_stream; once exhausted it holds the full text, the guardrail
+# action and trace, and timings. A stream error ends iteration and is kept in
+# `error` so the page can report it after the partial answer.
+class BedrockStream:
+    def __init__(self, events, extract_text, started_at=None, clock=time.perf_counter):
+        self.events = events
+        self.extract_text = extract_text
+        self.clock = clock
+        self.started_at = clock() if started_at is None else started_at
+        self.metadata = {}
+        self.parts = []
+        self.error = None
+        self.time_to_first_token = None
+        self.total_time = None
+        self.from_cache = False
+        self._done_callbacks = []
+
+    # Function to rebuild a finished stream from snapshot(); iterating it
+    # yields the cached text at once
+    @classmethod
+    def replay(cls, snapshot):
+        stream = cls([], None)
+        stream.metadata = dict(snapshot["metadata"])
+        stream.parts = [snapshot["text"]]
+        stream.from_cache = True
+        return stream
+
+    # Function to register fn(stream), called once the stream has been read
+    # to the end without an error
+    def add_done_callback(self, fn):
+        self._done_callbacks.append(fn)
+
+    def snapshot(self):
+        return {"text": self.text, "metadata": self.metadata}
+
+    def __iter__(self):
+        if self.from_cache:
+            yield from self.parts
+            return
+        try:
+            for event in self.events:
+                if "chunk" not in event:
+                    # Modelled stream exceptions arrive as their own event type
+                    name, detail = next(iter(event.items()), ("UnknownStreamEvent", {}))
+                    self.error = f"{name}: {detail.get('message', '')}"
+                    break
+                chunk = json.loads(event["chunk"]["bytes"])
+                for key in METADATA_KEYS:
+                    if key in chunk:
+                        self.metadata[key] = chunk[key]
+                text = self.extract_text(chunk)
+                if text:
+                    if self.time_to_first_token is None:
+                        self.time_to_first_token = self.clock() - self.started_at
+                    self.parts.append(text)
+                    yield text
+        except ClientError as e:
+            self.error = str(e)
+        finally:
+            self.total_time = self.clock() - self.started_at
+        if self.error is None:
+            for fn in self._done_callbacks:
+                fn(self)
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def guardrail_action(self):
+        return self.metadata.get("amazon-bedrock-guardrailAction", "NONE")
+
+    # Shape of a non-streaming Titan body, so trace helpers work unchanged
+    @property
+    def output_body(self):
+        return dict(self.metadata, results=[{"outputText": self.text}])
+
+    def metrics(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": self.total_time,
+            "chunks": len(self.parts),
+            **self.metadata.get("amazon-bedrock-invocationMetrics", {})
+        }
+
+
+# Function to start a streamed invocation; raises ClientError like invoke_model
+def invoke_model_stream(bedrock_client, extract_text, **request):
+    started_at = time.perf_counter()
+    response = bedrock_client.invoke_model_with_response_stream(**request)
+    return BedrockStream(response["body"], extract_text, started_at=started_at)
+
+
+# Function to render a stream as it arrives, then its guardrail outcome and timings
+def render_stream(stream, show_guardrail_action=True):
+    st.write_stream(stream)
+    if stream.error:
+        st.error(f"The response stream ended early: {stream.error}")
+    if show_guardrail_action and stream.guardrail_action != "NONE":
+        st.warning(f"Guardrail action: {stream.guardrail_action}")
+    if stream.from_cache:
+        st.caption("Served from the response cache")
+    elif stream.time_to_first_token is not None:
+        st.caption(f"Time to first token: {stream.time_to_first_token:.2f} s, total: {stream.total_time:.2f} s")
+    return stream.text
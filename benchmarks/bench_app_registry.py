@@ -0,0 +1,64 @@
+# Rerun latency and per-rerun allocations of the old exec() launcher versus
+# app_registry. Needs the packages from requirements.txt; AWS credentials are
+# not needed because only client construction happens at import time.
+#
+#   python benchmarks/bench_app_registry.py --reruns 20 --app Finance_Guardrails.py
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_registry
+
+
+# The launcher before the registry: read, compile and exec the file on every rerun
+def exec_rerun(file_name):
+    with open(os.path.join(app_registry.APP_DIR, file_name), 'r') as f:
+        code = f.read()
+    namespace = {"__name__": "__bench__"}
+    exec(code, namespace)
+
+
+# The registry launcher, minus the UI: only the import is cached across reruns
+def registry_rerun(file_name):
+    app_registry.load_app(file_name)
+
+
+def measure(rerun, file_name, reruns):
+    timings = []
+    allocations = []
+    for _ in range(reruns):
+        tracemalloc.start()
+        start = time.perf_counter()
+        rerun(file_name)
+        timings.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocations.append(peak)
+    return timings, allocations
+
+
+def report(label, timings, allocations):
+    # The first registry rerun pays the import; steady state is what users feel
+    steady = timings[1:] or timings
+    print(f"{label:<10} first={timings[0] * 1000:9.2f} ms  "
+          f"median={statistics.median(steady) * 1000:9.3f} ms  "
+          f"peak alloc/rerun={statistics.median(allocations[1:] or allocations) / 1024:9.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--app", default="Finance_Guardrails.py")
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    report("exec()", *measure(exec_rerun, args.app, args.reruns))
+    report("registry", *measure(registry_rerun, args.app, args.reruns))
+
+
+if __name__ == "__main__":
+    main()
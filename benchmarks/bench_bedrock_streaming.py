@@ -0,0 +1,84 @@
+# Timings for bedrock_streaming.BedrockStream and its use with
+# inference_cache.memoized, on synthetic invoke_model_with_response_stream
+# events instead of Bedrock: time to first token and total time for a
+# streamed answer, against replaying the same request from the cache, and a
+# stream that fails halfway through. The stream and cache behaviour is tested
+# in tests/test_bedrock_streaming.py.
+#
+#   python benchmarks/bench_bedrock_streaming.py --chunks 40 --chunk-ms 20
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bedrock_streaming import BedrockStream, anthropic_messages_text
+from inference_cache import get_inference_cache, memoized
+
+
+def chunk(body):
+    return {"chunk": {"bytes": json.dumps(body).encode("utf-8")}}
+
+
+# Anthropic messages stream: message_start, text deltas, then the metrics
+def anthropic_events(words, delay=0.0, fail_after=None):
+    yield chunk({"type": "message_start", "message": {"role": "assistant"}})
+    for index, word in enumerate(words):
+        if fail_after is not None and index == fail_after:
+            yield {"modelStreamErrorException": {"message": "stream reset"}}
+            return
+        time.sleep(delay)
+        yield chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}})
+    yield chunk({"type": "message_stop", "amazon-bedrock-invocationMetrics": {"outputTokenCount": len(words)}})
+
+
+class FakeModel:
+    def __init__(self, words, delay):
+        self.words = words
+        self.delay = delay
+        self.calls = 0
+        self.fail_after = None
+
+    def invoke(self, prompt, stream=False):
+        self.calls += 1
+        return BedrockStream(anthropic_events(self.words, self.delay, self.fail_after), anthropic_messages_text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--chunk-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    words = [f"word{index} " for index in range(args.chunks)]
+
+    model = FakeModel(words, args.chunk_ms / 1000)
+    invoke = memoized("bench.bedrock.stream", model_id="bench")(model.invoke)
+    cache = get_inference_cache()
+
+    start = time.perf_counter()
+    first = invoke("What is in my portfolio?", stream=True)
+    "".join(first)
+    streamed_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    second = invoke("What is in my portfolio?", stream=True)
+    "".join(second)
+    replayed_seconds = time.perf_counter() - start
+    print(f"{'streamed from the model':>24}: {streamed_seconds * 1000:7.1f} ms")
+    print(f"{'replayed from the cache':>24}: {replayed_seconds * 1000:7.1f} ms  (model calls={model.calls})")
+
+    # A stream reset halfway through: the partial answer arrives and nothing is cached
+    model.fail_after = max(1, args.chunks // 2)
+    start = time.perf_counter()
+    failed = invoke("What changed since yesterday?", stream=True)
+    partial = "".join(failed)
+    failed_seconds = time.perf_counter() - start
+    print(f"{'stream reset halfway':>24}: {failed_seconds * 1000:7.1f} ms  ({len(partial.split())} of "
+          f"{args.chunks} chunks, error={failed.error!r})")
+    print(f"time to first token {first.time_to_first_token * 1000:.1f} ms of {first.total_time * 1000:.1f} ms; "
+          f"cache {cache.summary()['entries']} entries")
+
+
+if __name__ == "__main__":
+    main()
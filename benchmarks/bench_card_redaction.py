@@ -0,0 +1,125 @@
+# Credit card redaction time on digit-heavy documents of 1 to 8 MB: the old
+# redact_credit_card regex versus card_redaction.redact_card_numbers, whole
+# and fed as 4 KB stream chunks. Corpora:
+#   notes   - prose with phone numbers, record IDs and a few real card numbers
+#   phones  - one unbroken run of hyphen/space separated digit groups
+#   digits  - long digit runs ending in a letter, so \b never matches
+#   spaced  - single digits separated by runs of spaces
+# "masked" counts digits replaced with X; the old regex also masks phone lists
+# and record IDs. Before timing, regression cases check that phone lists and
+# lists of 6/8-digit IDs are never masked, that real cards are in every
+# accepted layout, and that streaming in chunks of 1-7 characters matches
+# whole-text redaction on them.
+#
+#   python benchmarks/bench_card_redaction.py --sizes 1000000 4000000
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_redaction import iter_redacted, luhn_valid, redact_card_numbers
+
+CARDS = ["4111 1111 1111 1111", "5500-0000-0000-0004", "378282246310005", "4012888888881881"]
+
+
+# redact_credit_card as it was before card_redaction
+def legacy_redact_credit_card(text):
+    cc_pattern = r'\b(?:\d[ -]*?){13,16}\b'
+    return re.sub(cc_pattern, 'XXXXXXXXXXXXXXXX', text)
+
+
+def digits(rng, count):
+    return ''.join(rng.choice("0123456789") for _ in range(count))
+
+
+def make_corpus(kind, size, rng):
+    parts = []
+    length = 0
+    while length < size:
+        if kind == "notes":
+            part = rng.choice([
+                f"Patient called from {digits(rng, 3)}-{digits(rng, 3)}-{digits(rng, 4)} about MRN {digits(rng, 14)}. ",
+                f"Paid with card {rng.choice(CARDS)} on file. ",
+                "Follow-up in two weeks, no change to dosage. ",
+            ])
+        elif kind == "phones":
+            part = f"{digits(rng, 3)}-{digits(rng, 3)} {digits(rng, 4)} "
+        elif kind == "digits":
+            part = digits(rng, 40) + "a "
+        else:
+            part = digits(rng, 1) + "   "
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)[:size]
+
+
+def with_check_digit(digits):
+    return next(digits + check for check in "0123456789" if luhn_valid(digits + check))
+
+
+def card_layouts(rng):
+    card = with_check_digit("4" + digits(rng, 14))
+    amex = with_check_digit("37" + digits(rng, 12))
+    long_card = with_check_digit("6" + digits(rng, 17))
+    grouped = " ".join([card[:4], card[4:8], card[8:12], card[12:]])
+    return [card, grouped, grouped.replace(" ", "-"), grouped.replace(" ", " - "),
+            " ".join([amex[:4], amex[4:10], amex[10:]]), long_card,
+            "-".join([long_card[:4], long_card[4:8], long_card[8:12], long_card[12:16], long_card[16:]])]
+
+
+# Phone and ID lists must come through untouched, cards must not, and any
+# chunking of the stream must give the whole-text result
+def check_regressions(rng, samples=2000):
+    assert redact_card_numbers("phone 555-123-4567 555-987-6543") == "phone 555-123-4567 555-987-6543"
+    for _ in range(samples):
+        phones = " ".join(f"{digits(rng, 3)}-{digits(rng, 3)}-{digits(rng, 4)}" for _ in range(rng.randint(2, 6)))
+        ids = rng.choice([" ", "-", ", "]).join(digits(rng, rng.choice([6, 8])) for _ in range(rng.randint(2, 6)))
+        fours = rng.choice([" ", "-"]).join(digits(rng, 4) for _ in range(rng.randint(5, 8)))
+        for text in (phones, ids, fours, f"call {phones} re IDs {ids}."):
+            assert redact_card_numbers(text) == text, text
+        for card in card_layouts(rng):
+            text = f"card {card} on file, call {phones}"
+            expected = text.replace(card, card.translate(str.maketrans("0123456789", "X" * 10)))
+            assert redact_card_numbers(text) == expected, text
+            size = rng.randint(1, 7)
+            assert "".join(iter_redacted(text[i:i + size] for i in range(0, len(text), size))) == expected, text
+    print(f"regressions: {samples} phone, ID and 4-digit-group lists untouched, "
+          f"{samples * len(card_layouts(rng))} card layouts masked, streamed == whole: ok")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 4_000_000, 8_000_000])
+    parser.add_argument("--corpora", nargs="+", default=["notes", "phones", "digits", "spaced"])
+    parser.add_argument("--chunk", type=int, default=4096)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    check_regressions(rng)
+    for kind in args.corpora:
+        for size in args.sizes:
+            text = make_corpus(kind, size, rng)
+
+            legacy, legacy_time = timed(legacy_redact_credit_card, text)
+            whole, scanner_time = timed(redact_card_numbers, text)
+            chunks = [text[i:i + args.chunk] for i in range(0, len(text), args.chunk)]
+            streamed, stream_time = timed(lambda: ''.join(iter_redacted(chunks)))
+            assert streamed == whole and len(whole) == len(text)
+
+            print(f"{kind:>6} {size / 1e6:5.1f} MB  legacy={legacy_time:6.2f} s  scanner={scanner_time:6.2f} s  "
+                  f"streamed={stream_time:6.2f} s  masked: legacy={legacy.count('X') - text.count('X')} "
+                  f"scanner={whole.count('X') - text.count('X')}")
+
+
+if __name__ == "__main__":
+    main()
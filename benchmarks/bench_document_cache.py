@@ -0,0 +1,90 @@
+# S3 requests, bytes and time for the Finance/Healthcare reference document:
+# the old get_object on every rerun versus document_cache.DocumentCache. A
+# real boto3 S3 client runs under botocore's Stubber, answering the first GET
+# with the body and each revalidation after the TTL with a 304. The cache's
+# behaviour is tested in tests/test_document_cache.py.
+#
+#   python benchmarks/bench_document_cache.py --kb 512 --reruns 200 --rerun-seconds 15 --ttl 300
+import argparse
+import io
+import os
+import sys
+import time
+
+import boto3
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_cache import DocumentCache
+
+BUCKET = "stock-market-data-poc"
+KEY = "Customer_Data.txt"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_document(kb):
+    line = "customer   1 | portfolio balanced | risk moderate | region us-west\n"
+    return (line * (kb * 1024 // len(line) + 1)).encode("utf-8")
+
+
+def expect_body(stubber, body, etag):
+    stubber.add_response("get_object", {"Body": StreamingBody(io.BytesIO(body), len(body)), "ETag": etag,
+                                        "ContentLength": len(body)}, {"Bucket": BUCKET, "Key": KEY})
+
+
+def expect_not_modified(stubber, etag):
+    stubber.add_client_error("get_object", service_error_code="304", service_message="Not Modified",
+                             http_status_code=304, expected_params={"Bucket": BUCKET, "Key": KEY, "IfNoneMatch": etag})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kb", type=int, default=512, help="document size")
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--rerun-seconds", type=float, default=15.0, help="time between reruns")
+    parser.add_argument("--ttl", type=float, default=300.0)
+    args = parser.parse_args()
+
+    client = boto3.client("s3", region_name="us-west-2", aws_access_key_id="bench", aws_secret_access_key="bench")
+    document = make_document(args.kb)
+    with Stubber(client) as stubber:
+        # The old code fetched the whole object on every rerun
+        started = time.perf_counter()
+        for _ in range(args.reruns):
+            expect_body(stubber, document, '"v1"')
+            client.get_object(Bucket=BUCKET, Key=KEY)["Body"].read().decode("utf-8")
+        uncached_seconds = time.perf_counter() - started
+
+        clock = Clock()
+        cache = DocumentCache(client, ttl_seconds=args.ttl, disk_dir=None, clock=clock)
+        requests, checked_at, cached_seconds = 0, None, 0.0
+        for _ in range(args.reruns):
+            if checked_at is None or clock.now - checked_at >= args.ttl:
+                if checked_at is None:
+                    expect_body(stubber, document, '"v1"')
+                else:
+                    expect_not_modified(stubber, '"v1"')
+                requests, checked_at = requests + 1, clock.now
+            started = time.perf_counter()
+            cache.get_text(BUCKET, KEY)
+            cached_seconds += time.perf_counter() - started
+            clock.now += args.rerun_seconds
+
+    print(f"{args.reruns} reruns, {args.rerun_seconds:.0f} s apart, {args.kb} KiB document:")
+    print(f"{'get_object every rerun':>24}: GETs={args.reruns:4d}  bytes={args.reruns * len(document) / 1e6:8.2f} MB  "
+          f"time={uncached_seconds * 1000:8.1f} ms")
+    print(f"{'DocumentCache':>24}: GETs={requests:4d}  bytes={cache.stats['bytes_downloaded'] / 1e6:8.2f} MB  "
+          f"time={cached_seconds * 1000:8.1f} ms  (memory hits={cache.stats['hits']}, "
+          f"304s={cache.stats['not_modified']})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# describe_execution calls and latency added after completion: the old fixed
+# 2 s polling loop versus execution_tracker.ExecutionTracker, against a stub
+# Step Functions client on a simulated clock (no waiting, no AWS). Execution
+# durations are log-normal around --median seconds. The tracker is run cold
+# (nothing learned yet) and warm (after the same number of executions). Its
+# deadline and Express handling are tested in tests/test_execution_tracker.py.
+#
+#   python benchmarks/bench_execution_tracker.py --executions 500 --median 8
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_tracker import ExecutionTracker, TrackedExecution
+
+OUTPUT = json.dumps({"Body": {"content": [{"text": "<decision>Approve</decision><rationale>ok</rationale>"}]}})
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# Step Functions stub: each execution finishes `next_duration` seconds after it starts
+class StubStepFunctions:
+    def __init__(self, clock):
+        self.clock = clock
+        self.executions = {}
+        self.calls = 0
+
+    def start_execution(self, stateMachineArn, input):
+        arn = f"execution-{len(self.executions)}"
+        self.executions[arn] = (self.clock(), self.next_duration)
+        return {"executionArn": arn}
+
+    def describe_execution(self, executionArn):
+        self.calls += 1
+        started, duration = self.executions[executionArn]
+        if self.clock() >= started + duration:
+            return {"status": "SUCCEEDED", "output": OUTPUT}
+        return {"status": "RUNNING"}
+
+
+# get_step_function_result as it was, minus Streamlit
+def legacy_wait(client, execution_arn, sleep):
+    while True:
+        response = client.describe_execution(executionArn=execution_arn)
+        if response["status"] == "SUCCEEDED":
+            return json.loads(response["output"])
+        sleep(2)
+
+
+def simulate(name, durations, wait):
+    clock = SimulatedClock()
+    client = StubStepFunctions(clock)
+    added = []
+    for duration in durations:
+        client.next_duration = duration
+        started = clock()
+        wait(client, clock, client.start_execution(stateMachineArn="sm", input="{}")["executionArn"], started)
+        added.append(clock() - started - duration)
+    print(f"{name:>13}: describe_execution calls/execution={client.calls / len(durations):5.2f}  "
+          f"added latency mean={statistics.mean(added):5.2f} s  max={max(added):5.2f} s")
+    return client.calls / len(durations), statistics.mean(added)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--executions", type=int, default=500)
+    parser.add_argument("--median", type=float, default=8.0, help="median execution duration, seconds")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    durations = [rng.lognormvariate(0, 0.5) * args.median for _ in range(args.executions)]
+
+    simulate("fixed 2 s", durations, lambda client, clock, arn, started: legacy_wait(client, arn, clock.sleep))
+
+    trackers = {}
+
+    def tracked(client, clock, arn, started):
+        tracker = trackers.setdefault(id(client), ExecutionTracker(client, clock=clock, sleep=clock.sleep))
+        execution = TrackedExecution(arn, started)
+        execution.next_poll_at = started + tracker.next_delay(0.0)
+        tracker.wait(execution)
+
+    simulate("tracker cold", durations, tracked)
+
+    # Warm: the same tracker has already seen a day's worth of executions
+    def warm(client, clock, arn, started):
+        if id(client) not in trackers:
+            tracker = trackers[id(client)] = ExecutionTracker(client, clock=clock, sleep=clock.sleep)
+            tracker.durations.extend(durations)
+        tracked(client, clock, arn, started)
+
+    trackers.clear()
+    simulate("tracker warm", durations, warm)
+
+
+if __name__ == "__main__":
+    main()
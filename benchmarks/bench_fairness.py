@@ -0,0 +1,111 @@
+# Fairness computation time: the original list-comprehension
+# calculate_fairness_metrics versus the vectorized engine in fairness.py,
+# from 1e3 to 1e7 rows. The original is skipped above --legacy-max rows
+# because it takes minutes there. The engine row also includes an
+# intersectional age x race x gender audit with 1000 bootstrap resamples.
+#
+#   python benchmarks/bench_fairness.py --sizes 1000 100000 10000000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fairness import audit, binary_split_metrics
+
+
+# calculate_fairness_metrics as it was before the engine, plus the Disparate
+# Impact it had commented out, with the same 0 for an empty denominator
+def legacy_fairness_metrics(predictions, true_labels, protected_group, privileged_value, favorable_label):
+    binary_predictions = [1 if pred['Name'] == favorable_label else 0 for pred in predictions]
+
+    tp = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 1 and true == 1])
+    fp = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 1 and true == 0])
+    tn = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 0 and true == 0])
+    fn = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 0 and true == 1])
+
+    privileged_group_indices = [i for i, attr in enumerate(protected_group) if attr == privileged_value]
+    unprivileged_group_indices = [i for i, attr in enumerate(protected_group) if attr != privileged_value]
+
+    def calculate_group_rates(indices):
+        tp_group = sum([1 for i in indices if binary_predictions[i] == 1 and true_labels[i] == 1])
+        fp_group = sum([1 for i in indices if binary_predictions[i] == 1 and true_labels[i] == 0])
+        tn_group = sum([1 for i in indices if binary_predictions[i] == 0 and true_labels[i] == 0])
+        fn_group = sum([1 for i in indices if binary_predictions[i] == 0 and true_labels[i] == 1])
+
+        tpr = tp_group / (tp_group + fn_group) if tp_group + fn_group > 0 else 0
+        rate = (tp_group + fp_group) / len(indices) if len(indices) > 0 else 0
+        return tpr, rate
+
+    tpr_priv, rate_priv = calculate_group_rates(privileged_group_indices)
+    tpr_unpriv, rate_unpriv = calculate_group_rates(unprivileged_group_indices)
+    return {"Disparate Impact": rate_unpriv / rate_priv if rate_priv > 0 else 0,
+            "Equal Opportunity Difference": tpr_unpriv - tpr_priv}
+
+
+# Function to check the engine against the original on the cases where a
+# denominator is empty: a group with no rows, no positives or no favorable
+# predictions
+def check_edge_cases():
+    cases = [
+        ([1, 0, 1, 0], [1, 1, 0, 0], [2, 2, 2, 2]),
+        ([1, 0, 1, 0], [1, 1, 0, 0], [0, 1, 3, 0]),
+        ([1, 1, 0, 0], [0, 0, 0, 0], [2, 0, 2, 0]),
+        ([0, 1, 0, 1], [1, 1, 1, 1], [2, 0, 2, 1]),
+        ([], [], []),
+    ]
+    for predicted, labels, race in cases:
+        names = [{"Name": "Cardiology" if p else "Other"} for p in predicted]
+        expected = legacy_fairness_metrics(names, labels, race, 2, "Cardiology")
+        engine = binary_split_metrics((np.asarray(race) == 2).astype(np.int64), np.asarray(predicted, dtype=np.int64),
+                                      np.asarray(labels, dtype=np.int64))
+        assert engine == expected, (predicted, labels, race, engine, expected)
+    print(f"empty-group and zero-denominator cases match the original: {len(cases)} ok")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000_000)
+    parser.add_argument("--bootstrap", type=int, default=1000)
+    args = parser.parse_args()
+
+    check_edge_cases()
+    rng = np.random.default_rng(11)
+    for size in args.sizes:
+        labels = rng.integers(0, 2, size)
+        race = rng.integers(0, 4, size)
+        predicted = rng.integers(0, 2, size)
+
+        legacy_time = None
+        if size <= args.legacy_max:
+            names = [{"Name": "Cardiology" if p else "Other"} for p in predicted]
+            label_list = labels.tolist()
+            race_list = race.tolist()
+            start = time.perf_counter()
+            legacy = legacy_fairness_metrics(names, label_list, race_list, 2, "Cardiology")
+            legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        engine = binary_split_metrics((race == 2).astype(np.int64), predicted, labels)
+        engine_time = time.perf_counter() - start
+        if legacy_time is not None:
+            for name, value in legacy.items():
+                assert abs(engine[name] - value) < 1e-9
+
+        age = rng.integers(0, 3, size)
+        gender = rng.integers(0, 3, size)
+        start = time.perf_counter()
+        audit(predicted, labels, age, race, gender, n_boot=args.bootstrap, seed=0)
+        intersectional_time = time.perf_counter() - start
+
+        legacy_text = f"{legacy_time * 1000:10.1f} ms" if legacy_time is not None else "   skipped   "
+        print(f"{size:>9} rows  legacy={legacy_text}  engine={engine_time * 1000:8.2f} ms  "
+              f"intersectional+bootstrap={intersectional_time * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Cognito calls and time per browser session for the Finance/Healthcare
+# group lookup: the old admin_list_groups_for_user on every rerun versus
+# identity_cache.IdentityCache. A real boto3 cognito-idp client runs under
+# botocore's Stubber, answering the refreshes and lookups the cache makes.
+# The cache's behaviour is tested in tests/test_identity_cache.py.
+#
+#   python benchmarks/bench_identity_cache.py --reruns 500 --rerun-seconds 20 --expires-in 3600
+import argparse
+import os
+import sys
+import time
+
+import boto3
+from botocore.stub import Stubber
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from identity_cache import REFRESH_MARGIN_SECONDS, IdentityCache
+
+USER_POOL_ID = "us-west-2_bench"
+CLIENT_ID = "benchclient"
+USERNAME = "analyst"
+GUARDRAIL_IDS = {"Employee": "employee-guardrail", "Portfolio_Manager": "pm-guardrail"}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def auth_result(expires_in, generation, refresh_token=True):
+    result = {"AccessToken": f"access-{generation}", "IdToken": f"id-{generation}", "ExpiresIn": expires_in,
+              "TokenType": "Bearer"}
+    if refresh_token:
+        result["RefreshToken"] = "refresh-token"
+    return result
+
+
+def expect_groups(stubber, names):
+    stubber.add_response("admin_list_groups_for_user", {"Groups": [{"GroupName": name} for name in names]},
+                         {"Username": USERNAME, "UserPoolId": USER_POOL_ID})
+
+
+def expect_refresh(stubber, expires_in, generation):
+    stubber.add_response("admin_initiate_auth",
+                         {"AuthenticationResult": auth_result(expires_in, generation, refresh_token=False)},
+                         {"UserPoolId": USER_POOL_ID, "ClientId": CLIENT_ID, "AuthFlow": "REFRESH_TOKEN_AUTH",
+                          "AuthParameters": {"REFRESH_TOKEN": "refresh-token"}})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reruns", type=int, default=500)
+    parser.add_argument("--rerun-seconds", type=float, default=20.0, help="time between reruns")
+    parser.add_argument("--expires-in", type=int, default=3600, help="token lifetime from Cognito")
+    args = parser.parse_args()
+
+    client = boto3.client("cognito-idp", region_name="us-west-2", aws_access_key_id="bench",
+                          aws_secret_access_key="bench")
+    # Portfolio_Manager first, as Cognito returned it: the guardrail must follow that order
+    groups = ["Portfolio_Manager", "Employee"]
+    with Stubber(client) as stubber:
+        # The old get_user_group asked Cognito on every rerun
+        started = time.perf_counter()
+        for _ in range(args.reruns):
+            expect_groups(stubber, groups)
+            response = client.admin_list_groups_for_user(Username=USERNAME, UserPoolId=USER_POOL_ID)
+            GUARDRAIL_IDS.get(response["Groups"][0]["GroupName"])
+        uncached_seconds = time.perf_counter() - started
+
+        clock = Clock()
+        cache = IdentityCache(client, USER_POOL_ID, CLIENT_ID, {}, clock=clock)
+        cache.remember_login(USERNAME, auth_result(args.expires_in, 0))
+        calls, generation, looked_up, cached_seconds = 0, 0, False, 0.0
+        for _ in range(args.reruns):
+            if clock.now >= cache.get().expires_at - REFRESH_MARGIN_SECONDS:
+                generation += 1
+                expect_refresh(stubber, args.expires_in, generation)
+                calls, looked_up = calls + 1, False
+            if not looked_up:
+                expect_groups(stubber, groups)
+                calls += 1
+            started = time.perf_counter()
+            cache.guardrail_id(USERNAME, GUARDRAIL_IDS)
+            cached_seconds += time.perf_counter() - started
+            looked_up = True
+            clock.now += args.rerun_seconds
+        hours = args.reruns * args.rerun_seconds / 3600
+        print(f"{args.reruns} reruns over {hours:.1f} h, tokens valid {args.expires_in} s:")
+        print(f"{'lookup every rerun':>20}: Cognito calls={args.reruns:4d}  time={uncached_seconds * 1000:7.1f} ms")
+        print(f"{'IdentityCache':>20}: Cognito calls={calls:4d}  time={cached_seconds * 1000:7.1f} ms  "
+              f"(refreshes={generation})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Bytes and time saved by image_preprocess on synthetic license photos: 12 MP
+# phone JPEGs stored sideways (EXIF orientation 6), PNG scans with and
+# without transparency, and a small JPEG already under the size limit. Each
+# is run through preprocess_image for JPEG and WebP output, and the upload
+# time at --uplink-mbps is estimated for the raw and processed bytes. The
+# last section has several sessions preprocessing phone photos at once, to
+# show how far Pillow releasing the GIL lets them overlap (on one core they
+# can only take turns).
+#
+#   python benchmarks/bench_image_preprocess.py --max-side 2048 --quality 85 --uplink-mbps 10
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from image_preprocess import preprocess_image
+
+
+# Function to draw something photo-like: a lit gradient background, a card
+# with text-like strokes, and sensor noise so the encoder has real work
+def license_photo(width, height, rng):
+    base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    image = Image.blend(base, Image.new("RGB", (width, height), (rng.randrange(80, 200), 120, 90)), 0.6)
+    draw = ImageDraw.Draw(image)
+    left, top = width // 8, height // 6
+    draw.rounded_rectangle((left, top, width - left, height - top), radius=width // 40, fill=(225, 230, 240))
+    for line in range(12):
+        y = top + (line + 1) * (height - 2 * top) // 14
+        draw.line((left * 2, y, left * 2 + rng.randrange(width // 4, width // 2), y), fill=(40, 40, 60),
+                  width=max(2, height // 200))
+    noise = Image.merge("RGB", [Image.effect_noise((width, height), 40) for _ in range(3)])
+    return Image.blend(image.filter(ImageFilter.GaussianBlur(0.8)), noise, 0.15)
+
+
+def encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def make_corpus(rng):
+    corpus = []
+    for i in range(3):
+        photo = license_photo(4032, 3024, rng).rotate(90, expand=True)
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        corpus.append((f"phone-{i}.jpg", "image/jpeg", encode(photo, "JPEG", quality=95, exif=exif)))
+    scan = license_photo(2550, 1650, rng)
+    corpus.append(("scan.png", "image/png", encode(scan, "PNG")))
+    cutout = scan.convert("RGBA")
+    ImageDraw.Draw(cutout).rectangle((0, 0, 200, 200), fill=(0, 0, 0, 0))
+    corpus.append(("cutout.png", "image/png", encode(cutout, "PNG")))
+    corpus.append(("small.jpg", "image/jpeg", encode(license_photo(1024, 640, rng), "JPEG", quality=80)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-side", type=int, default=2048)
+    parser.add_argument("--quality", type=int, default=85)
+    parser.add_argument("--uplink-mbps", type=float, default=10.0)
+    parser.add_argument("--burst", type=int, default=8, help="phone photos preprocessed by concurrent sessions")
+    args = parser.parse_args()
+
+    corpus = make_corpus(random.Random(2))
+    upload_seconds = lambda size: size * 8 / (args.uplink_mbps * 1e6)
+
+    for image_format in ("JPEG", "WEBP"):
+        print(f"--- {image_format}, max side {args.max_side}, quality {args.quality}")
+        total_in = total_out = total_time = 0
+        for name, content_type, data in corpus:
+            result = preprocess_image(data, name, args.max_side, image_format, args.quality, content_type)
+            upright = Image.open(io.BytesIO(result.data))
+            assert max(upright.size) <= max(args.max_side, *result.original_size)
+            if name.startswith("phone"):
+                # Stored sideways with orientation 6: the output must be landscape
+                assert upright.size[0] > upright.size[1]
+            total_in, total_out, total_time = total_in + len(data), total_out + len(result.data), total_time + result.seconds
+            print(f"{name:>11}: {len(data) / 1e6:6.2f} MB -> {len(result.data) / 1e6:6.2f} MB  "
+                  f"{result.original_size[0]}x{result.original_size[1]} -> {result.size[0]}x{result.size[1]}  "
+                  f"{result.seconds * 1000:6.0f} ms  upload {upload_seconds(len(data)):5.2f} s -> "
+                  f"{upload_seconds(len(result.data)) + result.seconds:5.2f} s incl. preprocessing")
+        print(f"{'total':>11}: {total_in / 1e6:6.2f} MB -> {total_out / 1e6:6.2f} MB "
+              f"({100 * (1 - total_out / total_in):.0f}% saved) in {total_time:.2f} s")
+
+    # Sessions uploading phone photos at once, each preprocessing on its own script thread
+    phone = corpus[0][2]
+    for sessions in (1, 2, 4):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            seconds = list(pool.map(lambda _: preprocess_image(phone, "phone.jpg", max_side=args.max_side,
+                                                               quality=args.quality).seconds, range(args.burst)))
+        wall = time.perf_counter() - start
+        print(f"{sessions} session(s) at once: {args.burst} photos in {wall:5.2f} s ({args.burst / wall:4.1f}/s), "
+              f"median {statistics.median(seconds) * 1000:4.0f} ms each")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Throughput of medical_batch.run_batch: rows per second through a pipeline
+# whose Comprehend calls each take a token from one shared RateLimiter and
+# then wait a fixed latency, at different worker counts. Shows how far the
+# worker pool gets before the rate limit is what bounds the run. The
+# pipeline, checkpointing and audit are tested in tests/test_medical_batch.py.
+#
+#   python benchmarks/bench_medical_batch.py --rows 200 --chunk-size 50 --latency-ms 40 --rate 50
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_batch import run_batch
+from rate_limit import RateLimiter
+
+# Comprehend calls per row: prompt safety and classify_document
+CALLS_PER_ROW = 2
+
+
+# Pipeline standing in for MedicalPipeline: every call takes a token, then
+# waits as long as a Comprehend round trip
+class LatencyPipeline:
+    def __init__(self, rate_limiter, latency):
+        self.rate_limiter = rate_limiter
+        self.latency = latency
+
+    def classify(self, text):
+        for _ in range(CALLS_PER_ROW):
+            self.rate_limiter.acquire()
+            time.sleep(self.latency)
+        return {"redacted_text": text, "predicted_label": "Cardiology", "score": 0.9, "labels": None, "error": None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="time per Comprehend call")
+    parser.add_argument("--rate", type=float, default=50.0, help="Comprehend requests per second")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="medical-batch-bench-")
+    try:
+        input_path = os.path.join(work_dir, "notes.csv")
+        pd.DataFrame({"text": [f"Note {row}: chest pain." for row in range(args.rows)]}).to_csv(input_path,
+                                                                                                index=False)
+        print(f"{args.rows} rows, {CALLS_PER_ROW} calls per row, {args.latency_ms:.0f} ms per call, "
+              f"limit {args.rate:.0f} requests/s:")
+        for concurrency in args.concurrency:
+            output_dir = os.path.join(work_dir, f"run-{concurrency}")
+            pipeline = LatencyPipeline(RateLimiter(args.rate, burst=max(1, int(args.rate))), args.latency_ms / 1000)
+            start = time.perf_counter()
+            run_batch(input_path, output_dir, pipeline, "text", chunk_size=args.chunk_size, concurrency=concurrency)
+            seconds = time.perf_counter() - start
+            print(f"{concurrency:>4} workers: {seconds:6.2f} s  {args.rows / seconds:7.1f} rows/s  "
+                  f"{args.rows * CALLS_PER_ROW / seconds:7.1f} requests/s")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Prompt size and latency with the whole dataset in the prompt versus the
+# retrieved top-k records, at 200, 10k and 100k synthetic healthcare records.
+# "app sends" is what retrieve_context puts in the prompt: the whole document
+# up to RETRIEVAL_FULL_DOCUMENT_TOKENS, the retrieved records above it.
+# Pass --invoke to also time a real Bedrock call for both prompts (needs AWS
+# credentials with access to MODEL_ID).
+#
+#   python benchmarks/bench_retrieval.py --sizes 200 10000 100000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from retrieval import RETRIEVAL_FULL_DOCUMENT_TOKENS, RetrievalIndex, estimate_tokens, split_records
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+CONDITIONS = ["diabetes", "hypertension", "asthma", "migraine", "arthritis", "anemia", "influenza", "eczema"]
+MEDICATIONS = ["metformin", "lisinopril", "albuterol", "sumatriptan", "ibuprofen", "ferrous sulfate"]
+QUESTION = "Which patients with asthma are on albuterol and what are their ages?"
+
+
+def synthetic_document(size, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    for patient_id in range(size):
+        lines.append(
+            f"Patient {patient_id}: age {rng.randint(18, 90)}, condition {rng.choice(CONDITIONS)}, "
+            f"medication {rng.choice(MEDICATIONS)}, last visit 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        )
+    return "\n".join(lines)
+
+
+def invoke(prompt):
+    import boto3
+    client = boto3.client("bedrock-runtime", region_name="us-west-2")
+    payload = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 300,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+    start = time.perf_counter()
+    client.invoke_model(body=json.dumps(payload), modelId=MODEL_ID,
+                        contentType="application/json", accept="application/json")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--invoke", action="store_true")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        text = synthetic_document(size)
+
+        start = time.perf_counter()
+        index = RetrievalIndex(split_records(text))
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.queries):
+            context = "\n".join(index.search(QUESTION))
+        query = (time.perf_counter() - start) / args.queries
+
+        print(f"{size:>7} records  build={build * 1000:9.1f} ms  query={query * 1000:7.3f} ms  "
+              f"prompt tokens full={estimate_tokens(text):>9}  retrieved={estimate_tokens(context):>6}  "
+              f"app sends={'full' if estimate_tokens(text) <= RETRIEVAL_FULL_DOCUMENT_TOKENS else 'retrieved'}")
+
+        if args.invoke:
+            retrieved_latency = invoke(f"Context:\n{context}\n\nQuestion: {QUESTION}\n\nAnalysis:")
+            full_latency = invoke(f"Context:\n{text}\n\nQuestion: {QUESTION}\n\nAnalysis:")
+            print(f"{'':>16}bedrock full={full_latency:6.2f} s  retrieved={retrieved_latency:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
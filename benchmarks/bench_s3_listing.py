@@ -0,0 +1,113 @@
+# S3 requests and picker latency for the underwriting image list: the old
+# single list_objects_v2 call made on every rerun versus s3_listing's cached,
+# incrementally refreshed S3ListingIndex. A stub S3 client serves --keys
+# date-prefixed keys in 1000-key pages and counts requests; reruns happen on
+# a simulated clock. Search timings are wall-clock, against a full scan of
+# every key as a baseline.
+#
+#   python benchmarks/bench_s3_listing.py --keys 50000 --reruns 200
+import argparse
+import os
+import sys
+import time
+from bisect import bisect_right
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s3_listing import S3ListingIndex
+
+PAGE_SIZE = 1000
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, StartAfter=""):
+        start = bisect_right(self.client.keys, StartAfter) if StartAfter else 0
+        while True:
+            page = self.client.list_objects_v2(Bucket=Bucket, Start=start)
+            yield page
+            if not page["IsTruncated"]:
+                return
+            start += PAGE_SIZE
+
+
+# Keeps its keys sorted, as S3 returns them
+class StubS3:
+    def __init__(self, keys):
+        self.keys = sorted(keys)
+        self.requests = 0
+
+    def get_paginator(self, operation_name):
+        return StubPaginator(self)
+
+    def list_objects_v2(self, Bucket, Start=0):
+        self.requests += 1
+        contents = [{"Key": key} for key in self.keys[Start:Start + PAGE_SIZE]]
+        response = {"IsTruncated": Start + PAGE_SIZE < len(self.keys)}
+        if contents:
+            response["Contents"] = contents
+        return response
+
+
+def intake_key(i):
+    return f"intake/2024-{1 + i // 5000 % 12:02d}-{1 + i // 200 % 28:02d}/license-{i:06d}.jpg"
+
+
+def timed(function, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=50000)
+    parser.add_argument("--reruns", type=int, default=200, help="page reruns, one every 3 simulated seconds")
+    parser.add_argument("--uploads", type=int, default=30, help="new keys arriving during the reruns")
+    args = parser.parse_args()
+
+    keys = [intake_key(i) for i in range(args.keys)]
+
+    # Before: one request per rerun, and only the first page ever shows
+    client = StubS3(keys)
+    for _ in range(args.reruns):
+        visible = len(client.list_objects_v2(Bucket="b").get("Contents", []))
+    print(f"single call per rerun: {client.requests} requests, {visible} of {len(client.keys)} keys visible")
+
+    # After: one full listing, then a StartAfter request once per TTL
+    clock = SimulatedClock()
+    client = StubS3(keys)
+    index = S3ListingIndex(client, "b", ttl_seconds=60, clock=clock)
+    index.refresh()
+    cold = client.requests
+    for rerun in range(args.reruns):
+        if rerun % max(1, args.reruns // args.uploads) == 0:
+            client.keys.append(intake_key(args.keys + rerun))
+        clock.now += 3
+        index.refresh()
+    assert len(index) == len(client.keys)
+    print(f"listing index: cold build {cold} requests, then {client.requests - cold} requests over "
+          f"{args.reruns} reruns ({index.stats['incremental']} incremental refreshes), {len(index)} keys visible")
+
+    # Picker queries: the index stops at 200 matches, a full scan filters every key
+    for label, query in (("no query", ""), ("prefix", "intake/2024-03-1"), ("substring", "license-04242"),
+                         ("no match", "nothing-matches")):
+        indexed, (found, more) = timed(lambda: index.search(query, limit=200))
+        scanned, _ = timed(lambda: [key for key in index._keys if query.lower() in key.lower()][:200], repeat=20)
+        print(f"{label:>10}: index {indexed * 1000:7.3f} ms ({len(found)}{'+' if more else ''} matches)  "
+              f"full scan {scanned * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Segmentation time for 10 KB to 10 MB of text: the old convert_to_segments
+# loop versus segmenter.iter_segments. Sentences are split up front with a
+# plain regex so both sides time segmentation only (and no punkt data is
+# needed).
+#
+#   python benchmarks/bench_segmenter.py --sizes 10000 100000 1000000 10000000
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmenter import iter_segments
+
+WORDS = ["patient", "reported", "mild", "symptoms", "after", "treatment", "naïve", "дозировка", "follow-up", "clinic"]
+
+
+# The loop from healthcare_guardrails before iter_segments, fed pre-split sentences
+def old_convert_to_segments(sentences, max_bytes=1000):
+    segments = []
+    current_segment = ""
+
+    for sentence in sentences:
+        if len((current_segment + " " + sentence).encode('utf-8')) <= max_bytes:
+            current_segment += " " + sentence
+        else:
+            segments.append({"Text": current_segment.strip()})
+            current_segment = sentence
+
+    if current_segment:
+        segments.append({"Text": current_segment.strip()})
+
+    return segments
+
+
+def synthetic_text(size, seed=3):
+    rng = random.Random(seed)
+    sentences = []
+    total = 0
+    while total < size:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))).capitalize() + "."
+        sentences.append(sentence)
+        total += len(sentence.encode("utf-8")) + 1
+    return " ".join(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--max-bytes", type=int, default=1000)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        sentences = re.split(r"(?<=\.) ", synthetic_text(size))
+
+        start = time.perf_counter()
+        old = old_convert_to_segments(sentences, args.max_bytes)
+        old_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        new = list(iter_segments(None, args.max_bytes, sentences=sentences))
+        new_time = time.perf_counter() - start
+
+        print(f"{size / 1000:>8.0f} KB  old={old_time * 1000:9.1f} ms ({len(old)} segments)  "
+              f"new={new_time * 1000:9.1f} ms ({len(new)} segments)  speedup={old_time / new_time:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# Startup cost of the combined app: cold start of combined_streamlit.py (which
+# renders the first sub-app) and the first render of every other sub-app,
+# each in a fresh interpreter driven by streamlit's AppTest. --importtime runs
+# the same interpreters under `python -X importtime` and lists the modules
+# with the highest cumulative import cost, so a regression points at the
+# import that caused it.
+#
+# AWS calls made while rendering fail fast against a closed local port with
+# dummy credentials, so no account is needed and no network wait is counted.
+# To compare against an older revision, check it out next to this one and
+# pass it as --tree:
+#
+#   git worktree add /tmp/rai-before HEAD~1
+#   python benchmarks/bench_startup.py --repeat 5 --importtime 15
+#   python benchmarks/bench_startup.py --repeat 5 --tree /tmp/rai-before
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Labels from the sidebar radio in combined_streamlit.py; the first one is
+# what a cold start renders
+APPS = [
+    "Medical Diagnosis Classifier",
+    "Healthcare Application",
+    "Underwriting Auto Insurance",
+    "Investment Analysis",
+    "Travel Agent Application",
+]
+
+DRIVER = """
+import json, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("combined_streamlit.py", default_timeout=120)
+app.run()
+cold = time.perf_counter() - start
+render = None
+if sys.argv[1] != app.sidebar.radio[0].value:
+    start = time.perf_counter()
+    app.sidebar.radio[0].set_value(sys.argv[1]).run()
+    render = time.perf_counter() - start
+print(json.dumps({"cold": cold, "render": render}))
+"""
+
+AWS_ENV = {
+    "AWS_DEFAULT_REGION": "us-west-2",
+    "AWS_ACCESS_KEY_ID": "startup-bench",
+    "AWS_SECRET_ACCESS_KEY": "startup-bench",
+    "AWS_EC2_METADATA_DISABLED": "true",
+    "AWS_ENDPOINT_URL": "http://127.0.0.1:9",
+    "AWS_MAX_ATTEMPTS": "1",
+    "AWS_CONNECT_TIMEOUT": "1",
+}
+
+
+# Function to parse `-X importtime` output into (module, self_us, cumulative_us)
+# for the top-level imports made after the AppTest harness itself loaded
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if name.strip() == "streamlit.testing.v1":
+            imports = []
+        elif not name.startswith("  "):
+            imports.append((name.strip(), int(self_us), int(cumulative_us)))
+    return imports
+
+
+# Function to run one fresh interpreter that starts the app and opens `app`
+def run_once(tree, app, importtime):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", DRIVER, app]
+    env = dict(os.environ, **AWS_ENV)
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=tree, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{app} failed to start:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return dict(timings, wall=wall), (parse_importtime(result.stderr) if importtime else None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tree", default=REPO_DIR, help="checkout to measure (default: this one)")
+    parser.add_argument("--apps", nargs="+", default=APPS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--importtime", type=int, metavar="N", default=0,
+                        help="also list the N top-level imports with the highest cumulative cost")
+    args = parser.parse_args()
+
+    print(f"tree: {args.tree}")
+    for app in args.apps:
+        runs = [run_once(args.tree, app, False)[0] for _ in range(args.repeat)]
+        wall = statistics.median(run["wall"] for run in runs)
+        cold = statistics.median(run["cold"] for run in runs)
+        if runs[0]["render"] is None:
+            print(f"{app:<30} cold start: process {wall:6.2f} s, first run {cold:6.2f} s")
+        else:
+            render = statistics.median(run["render"] for run in runs)
+            print(f"{app:<30} first render {render:6.2f} s (process {wall:6.2f} s)")
+
+        if args.importtime:
+            _, imports = run_once(args.tree, app, True)
+            top = sorted(((cumulative, self_us, name) for name, self_us, cumulative in imports), reverse=True)
+            for cumulative, self_us, name in top[:args.importtime]:
+                print(f"    {cumulative / 1000:8.1f} ms cumulative {self_us / 1000:7.1f} ms self  {name}")
+
+
+if __name__ == "__main__":
+    main()
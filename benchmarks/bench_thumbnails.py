@@ -0,0 +1,177 @@
+# Time and bytes to show one page of the underwriting thumbnail gallery:
+# downloading every full-size image one after another and shrinking it,
+# versus thumbnail_cache.ThumbnailCache cold on images that predate stored
+# thumbnails (ranged GETs for JPEGs with an EXIF preview, placeholders for
+# the rest), cold on uploads with the thumbnail store() wrote next to them,
+# warm in memory, and warm on disk in a fresh process. A stub S3 serves
+# synthetic images (phone JPEGs with an embedded preview, preprocessed JPEGs
+# without one, PNG scans) with a per-request latency and a bandwidth limit.
+#
+#   python benchmarks/bench_thumbnails.py --page-size 12 --pages 4 --latency-ms 40 --mbps 200
+import argparse
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+from thumbnail_cache import ThumbnailCache, embedded_preview
+
+
+# Function to build an EXIF block whose IFD1 carries a preview JPEG
+def exif_with_preview(preview, orientation):
+    entry = lambda tag, field_type, value: struct.pack("<HHI", tag, field_type, 1) + value
+    ifd0 = struct.pack("<H", 1) + entry(0x0112, 3, struct.pack("<HH", orientation, 0)) + struct.pack("<I", 26)
+    ifd1 = (struct.pack("<H", 2) + entry(0x0201, 4, struct.pack("<I", 56))
+            + entry(0x0202, 4, struct.pack("<I", len(preview))) + struct.pack("<I", 0))
+    return b"Exif\x00\x00" + b"II*\x00" + struct.pack("<I", 8) + ifd0 + ifd1 + preview
+
+
+def photo(width, height, seed):
+    image = Image.merge("RGB", [Image.effect_noise((width, height), 30 + 10 * band) for band in range(3)])
+    ImageDraw.Draw(image).rectangle((width // 8, height // 6, width * 7 // 8, height * 5 // 6), outline=seed, width=20)
+    return image
+
+
+def encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def make_templates():
+    sideways = photo(3024, 4032, 1)
+    preview = encode(sideways.resize((120, 160)), "JPEG", quality=80)
+    phone = encode(sideways, "JPEG", quality=92, exif=exif_with_preview(preview, 6))
+    assert embedded_preview(phone[:64 * 1024])[0] == preview
+    return {
+        ".jpg": phone,
+        "-prepared.jpg": encode(photo(2048, 1536, 2), "JPEG", quality=85),
+        ".png": encode(photo(2550, 1650, 3), "PNG"),
+    }
+
+
+class Body:
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        return self.data
+
+
+def etag_of(data):
+    return f'"{hash(data) & 0xffffffff:x}"'
+
+
+# get_object with Range support, a fixed round trip and a bandwidth cap, plus
+# the head_object/put_object calls ThumbnailCache.store() makes
+class StubS3:
+    def __init__(self, objects, latency, bytes_per_second):
+        self.objects = objects
+        self.metadata = {}
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": etag_of(self.objects[Key])}
+
+    def put_object(self, Bucket, Key, Body, ContentType, Metadata):
+        self.objects[Key] = Body
+        self.metadata[Key] = Metadata
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self.requests += 1
+        if Key not in self.objects:
+            time.sleep(self.latency)
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": "not found"}}, "GetObject")
+        data = self.objects[Key]
+        response = {"ETag": etag_of(data), "Metadata": self.metadata.get(Key, {})}
+        assert IfMatch in (None, response["ETag"])
+        if Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            first, last = int(first), min(int(last or len(data) - 1), len(data) - 1)
+            response["ContentRange"] = f"bytes {first}-{last}/{len(data)}"
+            data = data[first:last + 1]
+        self.bytes_sent += len(data)
+        time.sleep(self.latency + len(data) / self.bytes_per_second)
+        response["Body"] = Body(data)
+        return response
+
+
+def naive_page(client, keys):
+    thumbnails = []
+    for key in keys:
+        image = Image.open(io.BytesIO(client.get_object(Bucket="b", Key=key)["Body"].read()))
+        image.thumbnail((256, 256))
+        thumbnails.append(encode(image.convert("RGB"), "JPEG", quality=80))
+    return thumbnails
+
+
+def measure(name, client, pages, show_page):
+    client.requests = client.bytes_sent = 0
+    placeholders = 0
+    start = time.perf_counter()
+    for keys in pages:
+        placeholders += sum(thumbnail is None for thumbnail in show_page(keys))
+    seconds = (time.perf_counter() - start) / len(pages)
+    print(f"{name:>22}: {seconds * 1000:7.0f} ms/page  {client.requests / len(pages):5.1f} GETs/page  "
+          f"{client.bytes_sent / len(pages) / 1e6:7.2f} MB/page  placeholders/page={placeholders / len(pages):4.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-size", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=40.0)
+    parser.add_argument("--mbps", type=float, default=200.0, help="download bandwidth, megabits per second")
+    args = parser.parse_args()
+
+    templates = make_templates()
+    suffixes = list(templates)
+    objects = {}
+    for i in range(args.page_size * args.pages):
+        suffix = suffixes[i % len(suffixes)]
+        objects[f"intake/license-{i:04d}{suffix}"] = templates[suffix]
+    keys = list(objects)
+    pages = [keys[i:i + args.page_size] for i in range(0, len(keys), args.page_size)]
+    client = StubS3(objects, args.latency_ms / 1000, args.mbps * 1e6 / 8)
+    print("object sizes: " + ", ".join(f"{suffix} {len(data) / 1e6:.2f} MB" for suffix, data in templates.items()))
+
+    measure("full GETs, serial", client, pages, lambda page: naive_page(client, page))
+
+    disk_dir = tempfile.mkdtemp(prefix="thumbnails-bench-")
+    try:
+        etags = {key: etag_of(data) for key, data in objects.items()}
+        cache = ThumbnailCache(client, disk_dir=None)
+        measure("cold, no stored thumbs", client, pages,
+                lambda page: cache.get_many("b", [(key, etags[key]) for key in page]))
+        print(f"{'':>22}  ranged previews={cache.stats['ranged']}  full fetches={cache.stats['full']}  "
+              f"placeholders={cache.stats['placeholders']}")
+
+        # The same images uploaded through the app, which stores a thumbnail next to each
+        for key in keys:
+            ThumbnailCache(client, disk_dir=None).store("b", key, objects[key])
+        cache = ThumbnailCache(client, disk_dir=disk_dir)
+        measure("cold, stored thumbs", client, pages,
+                lambda page: cache.get_many("b", [(key, etags[key]) for key in page]))
+        print(f"{'':>22}  stored thumbnails={cache.stats['stored']}  full fetches={cache.stats['full']}")
+        measure("cache warm memory", client, pages, lambda page: cache.get_many("b", [(key, etags[key]) for key in page]))
+        restarted = ThumbnailCache(client, disk_dir=disk_dir)
+        measure("cache warm disk", client, pages,
+                lambda page: restarted.get_many("b", [(key, etags[key]) for key in page]))
+    finally:
+        shutil.rmtree(disk_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Toxicity detection latency: one DetectToxicContent call per segment in
+# series (the old healthcare loop) versus full batches of 10 sent
+# concurrently. The Comprehend client is a stub that sleeps for --latency
+# seconds per request, so no AWS access is needed.
+#
+#   python benchmarks/bench_toxicity.py --segments 5 25 100 --latency 0.15
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from toxicity import detect_toxic_segments
+
+
+class SlowComprehend:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def detect_toxic_content(self, TextSegments, LanguageCode):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {"ResultList": [{"Toxicity": 0.01, "Labels": []} for _ in TextSegments]}
+
+
+def sequential(client, segments):
+    results = []
+    for segment in segments:
+        results.extend(client.detect_toxic_content(TextSegments=[segment], LanguageCode='en')['ResultList'])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, nargs="+", default=[5, 25, 100])
+    parser.add_argument("--latency", type=float, default=0.15)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    for count in args.segments:
+        segments = [{"Text": f"Segment number {i}."} for i in range(count)]
+
+        client = SlowComprehend(args.latency)
+        start = time.perf_counter()
+        sequential(client, segments)
+        old_time, old_calls = time.perf_counter() - start, client.calls
+
+        client = SlowComprehend(args.latency)
+        start = time.perf_counter()
+        report = detect_toxic_segments(client, segments, max_workers=args.workers)
+        new_time, new_calls = time.perf_counter() - start, client.calls
+        assert len(report.result_list()) == count
+
+        print(f"{count:>4} segments  sequential={old_time:6.2f} s ({old_calls} calls)  "
+              f"batched={new_time:6.2f} s ({new_calls} calls)")
+
+
+if __name__ == "__main__":
+    main()
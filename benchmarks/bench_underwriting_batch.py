@@ -0,0 +1,130 @@
+# Wall time, throughput and Step Functions calls for a day's intake of
+# license images: one image at a time (what the page did per click) versus
+# underwriting_batch.UnderwritingBatch polling each execution with
+# describe_execution, versus the same batch using list_executions for bulk
+# status. Runs against a stub Step Functions client on a simulated clock (no
+# waiting, no AWS); execution durations are log-normal around --median
+# seconds and other users' executions are interleaved in list_executions.
+#
+#   python benchmarks/bench_underwriting_batch.py --images 300 --concurrency 10 --median 20
+import argparse
+import json
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_tracker import ExecutionTracker
+from rate_limit import RateLimiter
+from underwriting_batch import UnderwritingBatch
+
+STATE_MACHINE = "arn:aws:states:us-east-1:000000000000:stateMachine:UnderwritingValidationStateMachine"
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# Step Functions stub; every key has a fixed duration and the decision
+# names the key, so results can be checked against their inputs
+class StubStepFunctions:
+    def __init__(self, clock, durations, others_per_execution):
+        self.clock = clock
+        self.durations = durations
+        self.others_per_execution = others_per_execution
+        self.executions = []
+        self.calls = Counter()
+
+    def describe_state_machine(self, stateMachineArn):
+        self.calls["describe_state_machine"] += 1
+        return {"type": "STANDARD"}
+
+    def _add(self, key, duration):
+        arn = f"{STATE_MACHINE}:execution-{len(self.executions)}"
+        self.executions.append({"executionArn": arn, "key": key, "started": self.clock(), "duration": duration})
+        return arn
+
+    def start_execution(self, stateMachineArn, input):
+        self.calls["start_execution"] += 1
+        for _ in range(self.others_per_execution):
+            self._add(None, 5.0)
+        key = json.loads(input)["detail"]["s3_key"]
+        return {"executionArn": self._add(key, self.durations[key])}
+
+    def _status(self, execution):
+        return "SUCCEEDED" if self.clock() >= execution["started"] + execution["duration"] else "RUNNING"
+
+    def describe_execution(self, executionArn):
+        self.calls["describe_execution"] += 1
+        execution = self.executions[int(executionArn.rsplit("-", 1)[1])]
+        response = {"executionArn": executionArn, "status": self._status(execution)}
+        if response["status"] == "SUCCEEDED":
+            text = f"<decision>Approve {execution['key']}</decision><rationale>valid license</rationale>"
+            response["output"] = json.dumps({"Body": {"content": [{"text": text}]}})
+        return response
+
+    def list_executions(self, stateMachineArn, maxResults, nextToken=None):
+        self.calls["list_executions"] += 1
+        start = int(nextToken or 0)
+        newest_first = self.executions[::-1][start:start + maxResults]
+        response = {"executions": [{"executionArn": execution["executionArn"], "status": self._status(execution)}
+                                   for execution in newest_first]}
+        if start + maxResults < len(self.executions):
+            response["nextToken"] = str(start + maxResults)
+        return response
+
+
+def report(name, client, clock, images, latencies):
+    calls = ", ".join(f"{op}={count}" for op, count in sorted(client.calls.items()))
+    latencies = sorted(latencies)
+    print(f"{name:>22}: wall={clock() / 60:6.1f} min  throughput={images / clock() * 60:6.1f}/min  "
+          f"latency p50={latencies[len(latencies) // 2]:5.1f} s p95={latencies[int(len(latencies) * 0.95)]:5.1f} s")
+    print(f"{'':>22}  {sum(client.calls.values()) / images:5.2f} calls/image ({calls})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--median", type=float, default=20.0, help="median execution duration, seconds")
+    parser.add_argument("--start-rate", type=float, default=5.0, help="StartExecution calls per second")
+    parser.add_argument("--others", type=int, default=2, help="other users' executions per batch execution")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    keys = [f"intake/license-{i:04d}.jpg" for i in range(args.images)]
+    durations = {key: rng.lognormvariate(0, 0.4) * args.median for key in keys}
+
+    # One image at a time, as the single-image page does per click
+    clock = SimulatedClock()
+    client = StubStepFunctions(clock, durations, args.others)
+    tracker = ExecutionTracker(client, clock=clock, sleep=clock.sleep)
+    latencies = []
+    for key in keys:
+        execution = tracker.wait(tracker.start(STATE_MACHINE, {"detail": {"s3_bucket": "b", "s3_key": key}}))
+        latencies.append(execution.elapsed(clock()))
+    report("one at a time", client, clock, args.images, latencies)
+
+    for name, bulk_status_min in (("batch, describe each", 10 ** 9), ("batch, list_executions", 5)):
+        clock = SimulatedClock()
+        client = StubStepFunctions(clock, durations, args.others)
+        tracker = ExecutionTracker(client, bulk_status_min=bulk_status_min, clock=clock, sleep=clock.sleep)
+        rate_limiter = RateLimiter(args.start_rate, burst=int(args.start_rate), clock=clock, sleep=clock.sleep)
+        batch = UnderwritingBatch(tracker, STATE_MACHINE, "b", keys, args.concurrency, rate_limiter).run()
+
+        results = batch.results()
+        assert all(row["status"] == "SUCCEEDED" and row["decision"] == f"Approve {row['s3_key']}" for row in results)
+        report(name, client, clock, args.images, [row["latency_s"] for row in results])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# PUT requests and upload time for underwriting images: the old
+# upload_fileobj under the original file name on every rerun versus
+# s3_upload.DedupingUploader. A real boto3 client talks to a local S3
+# stand-in (a small HTTP server implementing PutObject, HeadObject,
+# ListObjectsV2 and multipart uploads in memory), so TransferConfig's
+# multipart path runs for real and every PUT is an actual request. The
+# uploader's behaviour is tested in tests/test_s3_upload.py.
+#
+#   python benchmarks/bench_upload_dedupe.py --images 20 --reruns 5 --large-mb 40
+import argparse
+import hashlib
+import io
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+import boto3
+from botocore.config import Config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from s3_upload import DedupingUploader
+
+BUCKET = "underwriting-bench"
+
+
+class StandInS3(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.objects = {}
+        self.parts = {}
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+
+# Path-style S3 requests: /<bucket>/<key>?<query>
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _parse(self, operation):
+        url = urlparse(self.path)
+        _, _, key = url.path.lstrip("/").partition("/")
+        query = {name: values[0] for name, values in parse_qs(url.query, keep_blank_values=True).items()}
+        with self.server.lock:
+            self.server.requests[operation(query)] += 1
+        return unquote(key), query
+
+    def _body(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            decoded, rest = b"", body
+            while True:
+                size_line, _, rest = rest.partition(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    return decoded
+                decoded, rest = decoded + rest[:size], rest[size + 2:]
+        return body
+
+    def _send(self, status=200, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        key, _ = self._parse(lambda query: "HeadObject")
+        stored = self.server.objects.get(key)
+        if stored is None:
+            self._send(404)
+        else:
+            self.send_response(200)
+            self.send_header("ETag", f'"{hashlib.md5(stored).hexdigest()}"')
+            self.send_header("Content-Length", str(len(stored)))
+            self.end_headers()
+
+    def do_GET(self):
+        _, query = self._parse(lambda query: "ListObjectsV2")
+        prefix = query.get("prefix", "")
+        keys = sorted(key for key in self.server.objects if key.startswith(prefix))[:int(query.get("max-keys", 1000))]
+        contents = "".join(f"<Contents><Key>{escape(key)}</Key><Size>{len(self.server.objects[key])}</Size>"
+                           f"<LastModified>2024-01-01T00:00:00.000Z</LastModified></Contents>" for key in keys)
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{BUCKET}</Name>'
+                f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(keys)}</KeyCount>"
+                f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>").encode()
+        self._send(200, body, {"Content-Type": "application/xml"})
+
+    def do_PUT(self):
+        key, query = self._parse(lambda query: "UploadPart" if "partNumber" in query else "PutObject")
+        body = self._body()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        with self.server.lock:
+            if "partNumber" in query:
+                self.server.parts.setdefault(query["uploadId"], {})[int(query["partNumber"])] = body
+            else:
+                self.server.objects[key] = body
+        self._send(200, headers={"ETag": etag})
+
+    def do_POST(self):
+        key, query = self._parse(lambda query: "CreateMultipartUpload" if "uploads" in query
+                                 else "CompleteMultipartUpload")
+        self._body()
+        if "uploads" in query:
+            upload_id = os.urandom(8).hex()
+            body = (f"<InitiateMultipartUploadResult><Bucket>{BUCKET}</Bucket><Key>{escape(key)}</Key>"
+                    f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        else:
+            with self.server.lock:
+                parts = self.server.parts.pop(query["uploadId"])
+                self.server.objects[key] = b"".join(parts[number] for number in sorted(parts))
+            body = (f"<CompleteMultipartUploadResult><Bucket>{BUCKET}</Bucket><Key>{escape(key)}</Key>"
+                    f'<ETag>"{len(parts)}"</ETag></CompleteMultipartUploadResult>')
+        self._send(200, body.encode(), {"Content-Type": "application/xml"})
+
+
+def make_client(endpoint):
+    return boto3.client("s3", endpoint_url=endpoint, region_name="us-east-1", aws_access_key_id="bench",
+                        aws_secret_access_key="bench",
+                        config=Config(s3={"addressing_style": "path"}, max_pool_connections=50))
+
+
+# Function to make (file name, bytes) pairs: distinct images, some sharing a
+# file name with other content, plus one large scan
+def make_images(count, large_mb, rng):
+    images = [(f"license-{i % max(1, count // 2)}.jpg", rng.randbytes(200 * 1024)) for i in range(count)]
+    images.append(("full-scan.png", rng.randbytes(large_mb * 1024 * 1024)))
+    return images
+
+
+def run(server, name, images, reruns, upload):
+    server.objects.clear()
+    server.requests.clear()
+    start = time.perf_counter()
+    for _ in range(reruns):
+        for file_name, data in images:
+            upload(io.BytesIO(data), file_name)
+    elapsed = time.perf_counter() - start
+    puts = server.requests["PutObject"] + server.requests["UploadPart"]
+    distinct = len({hashlib.sha256(data).digest() for _, data in images})
+    print(f"{name:>11}: {elapsed:6.2f} s  PUTs={puts:4d}  objects={len(server.objects)} for {distinct} distinct "
+          f"images  ({', '.join(f'{op}={count}' for op, count in sorted(server.requests.items()))})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--reruns", type=int, default=5, help="script reruns with every file still in the uploader")
+    parser.add_argument("--large-mb", type=int, default=40)
+    args = parser.parse_args()
+
+    server = StandInS3()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = make_client(f"http://127.0.0.1:{server.server_address[1]}")
+    images = make_images(args.images, args.large_mb, random.Random(7))
+
+    # Before: every rerun uploads again, under the file name as given
+    run(server, "legacy", images, args.reruns,
+        lambda fileobj, file_name: client.upload_fileobj(fileobj, BUCKET, file_name))
+
+    # After, with a fresh uploader per session (no memory of earlier sessions)
+    uploader = DedupingUploader(client, BUCKET)
+    run(server, "dedupe", images, args.reruns, lambda fileobj, file_name: uploader.upload(fileobj, file_name))
+
+    # A second process sees the content already in the bucket
+    server.requests.clear()
+    other = DedupingUploader(client, BUCKET)
+    start = time.perf_counter()
+    for file_name, data in images:
+        other.upload(io.BytesIO(data), file_name)
+    elapsed = time.perf_counter() - start
+    print(f"{'new process':>11}: {elapsed:6.2f} s  PUTs={server.requests['PutObject'] + server.requests['UploadPart']}  "
+          f"ListObjectsV2={server.requests['ListObjectsV2']}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
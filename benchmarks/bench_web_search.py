@@ -0,0 +1,162 @@
+# Fact-check search latency against a local stub of the Google Custom Search
+# API: the old bare requests.get per search versus web_search.WebSearch with
+# a pooled session and cache, searching the statement as written (the
+# default, SEARCH_FAN_OUT=1) and with an explicit fan-out over three
+# reformulations, as SEARCH_FAN_OUT=3 would run it. The stub
+# answers after --latency-ms, can fail the first request of each query with
+# a 503, and has a /hang endpoint that never answers, to show the timeout.
+# Query building, caching and retries are tested in tests/test_web_search.py.
+#
+#   python benchmarks/bench_web_search.py --statements 20 --latency-ms 150
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_search import GoogleCustomSearch, WebSearch, build_session, reformulate
+
+STATEMENTS = [
+    "Lisbon is one of the sunniest capitals in Europe. Trams are the easiest way to see the old town.",
+    "The cheapest flights are usually booked six to eight weeks ahead. Tuesday departures often cost less.",
+    "Kyoto has more than a thousand temples. Spring cherry blossom season is the busiest time to visit.",
+    "Travel insurance rarely covers pre-existing conditions. Always check the policy before you book.",
+]
+# Phrasings per statement for the fan-out rows, as SEARCH_FAN_OUT=3 would run
+FAN_OUT = 3
+
+
+class StubSearch(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, flaky):
+        super().__init__(("127.0.0.1", 0), StubSearchHandler)
+        self.latency = latency
+        self.flaky = flaky
+        self.requests = 0
+        self.connections = 0
+        self.failed_once = set()
+        self.lock = threading.Lock()
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle and
+    # delayed ACKs add ~40 ms to every request on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/hang":
+            time.sleep(30)
+            return
+        query = parse_qs(url.query).get("q", [""])[0]
+        with self.server.lock:
+            self.server.requests += 1
+            fail = self.server.flaky and query not in self.server.failed_once
+            self.server.failed_once.add(query)
+        time.sleep(self.server.latency)
+        if fail:
+            body, status = b'{"error": {"code": 503}}', 503
+        else:
+            # Results overlap across phrasings, as real ones do
+            words = sorted(set(query.lower().split()))[:4]
+            items = [{"title": f"About {word}", "link": f"https://travel.example/{word}/{rank}",
+                      "snippet": f"Guide to {word}, part {rank}."} for word in words for rank in range(2)]
+            body, status = json.dumps({"items": items[:5]}).encode(), 200
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# search_google as it was, pointed at the stub
+def legacy_search(endpoint, query):
+    response = requests.get(endpoint, params={"key": "k", "cx": "c", "q": query, "num": 5})
+    return response.json().get("items", [])
+
+
+def timed(name, server, statements, search):
+    server.requests = server.connections = 0
+    seconds, found = [], 0
+    for statement in statements:
+        start = time.perf_counter()
+        found += len(search(statement))
+        seconds.append(time.perf_counter() - start)
+    print(f"{name:>32}: mean {statistics.mean(seconds) * 1000:6.0f} ms  total {sum(seconds):5.2f} s  "
+          f"requests={server.requests:3d}  connections={server.connections:3d}  results/statement={found / len(statements):4.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statements", type=int, default=20, help="fact-checks, cycling over a few statements")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    server = StubSearch(args.latency_ms / 1000, flaky=False)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    endpoint = base + "/customsearch/v1"
+    statements = [STATEMENTS[i % len(STATEMENTS)] for i in range(args.statements)]
+
+    timed("legacy, one query", server, statements, lambda statement: legacy_search(endpoint, statement))
+    timed("legacy, 3 phrasings serially", server, statements,
+          lambda statement: [item for query in reformulate(statement, limit=FAN_OUT)
+                             for item in legacy_search(endpoint, query)])
+
+    # By default the statement is searched as written, like the legacy call
+    backend = GoogleCustomSearch("k", "c", endpoint=endpoint)
+    single = WebSearch(backend, ttl_seconds=0)
+    timed("pooled, one query (default)", server, statements,
+          lambda statement: single.search_many(reformulate(statement)))
+    uncached = WebSearch(backend, ttl_seconds=0, max_workers=FAN_OUT)
+    timed("pooled, 3 phrasings in parallel", server, statements,
+          lambda statement: uncached.search_many(reformulate(statement, limit=FAN_OUT)))
+    cached = WebSearch(backend, max_workers=FAN_OUT)
+    timed("pooled + cache, 3 phrasings", server, statements,
+          lambda statement: cached.search_many(reformulate(statement, limit=FAN_OUT)))
+    print(f"{'':>32}  cache hits={cached.stats['hits']} misses={cached.stats['misses']}")
+
+    # Transient 503s: the legacy call returns the error body, the pooled one retries
+    server.flaky = True
+    server.failed_once.clear()
+    start = time.perf_counter()
+    legacy_found = len(legacy_search(endpoint, "lisbon trams"))
+    legacy_seconds = time.perf_counter() - start
+    flaky = WebSearch(GoogleCustomSearch("k", "c", endpoint=endpoint), ttl_seconds=0)
+    server.requests = 0
+    start = time.perf_counter()
+    pooled_found = len(flaky.search("lisbon sunshine"))
+    pooled_seconds = time.perf_counter() - start
+    print(f"{'503 on first try':>32}: legacy {legacy_seconds * 1000:4.0f} ms, {legacy_found} results; "
+          f"pooled {pooled_seconds * 1000:4.0f} ms, {pooled_found} results after {server.requests} requests")
+
+    # A server that never answers: the legacy call has no timeout at all
+    hanging = GoogleCustomSearch("k", "c", session=build_session(retries=0), endpoint=base + "/hang", timeout=(1, 1))
+    start = time.perf_counter()
+    try:
+        hanging.search("anything")
+    except requests.RequestException as e:
+        print(f"{'hung endpoint':>32}: gave up after {time.perf_counter() - start:.1f} s ({type(e).__name__})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import re
+
+# Card-shaped digit sequences: 13-19 contiguous digits, or the 4-4-4-4,
+# 4-4-4-4-3 and 4-6-5 groupings joined by one separator (1-3 spaces/hyphens)
+# used throughout. A candidate starts at a group boundary and may not run on
+# into letters or more digits, so every attempt is bounded and a search never
+# backtracks more than a few characters.
+CARD_CANDIDATE = re.compile(
+    r'(?<!\w)'
+    r'(?:[0-9]{13,19}'
+    r'|[0-9]{4}(?P<sep>[ -]{1,3})'
+    r'(?:[0-9]{4}(?P=sep)[0-9]{4}(?P=sep)[0-9]{4}(?:(?P=sep)[0-9]{3})?|[0-9]{6}(?P=sep)[0-9]{5}))'
+    r'(?!\w)'
+)
+# Separator followed by another digit group, i.e. the run goes on
+NEXT_GROUP = re.compile(r'([ -]{1,3})[0-9]')
+DIGITS = frozenset('0123456789')
+SEPARATORS = frozenset(' -')
+MAX_CARD_DIGITS = 19
+MAX_SEPARATOR = 3
+# Most groups a candidate spans; one more group decides whether it is complete
+MAX_CARD_GROUPS = 5
+# Input characters before a chunk needed to tell which group it continues
+CONTEXT_CHARS = MAX_SEPARATOR + 1
+MASK_DIGITS = str.maketrans('0123456789', 'X' * 10)
+# ASCII digit -> Luhn value of that digit in a doubled position
+LUHN_DOUBLED = bytes.maketrans(b'0123456789', bytes([0, 2, 4, 6, 8, 1, 3, 5, 7, 9]))
+
+
+# Function to apply the Luhn checksum to a string of digits. Slicing and
+# summing bytes keeps the per-digit work in C.
+def luhn_valid(digits):
+    encoded = digits.encode('ascii')
+    plain = encoded[-1::-2]
+    total = sum(plain) - 48 * len(plain) + sum(encoded[-2::-2].translate(LUHN_DOUBLED))
+    return total % 10 == 0
+
+
+# Function to return the separator joining the digit group that ends before
+# `start` to the one starting there, or None if no group precedes it
+def _separator_before(text, start):
+    cursor = start
+    while cursor > 0 and start - cursor <= MAX_SEPARATOR and text[cursor - 1] in SEPARATORS:
+        cursor -= 1
+    if cursor == start or start - cursor > MAX_SEPARATOR or cursor == 0 or text[cursor - 1] not in DIGITS:
+        return None
+    return text[cursor:start]
+
+
+# Function to decide whether a candidate is a card number. A grouped
+# candidate must be the whole grouping: the same separator may not join it to
+# a digit group on either side, so a window never reaches into a longer list
+# of 4-digit groups. The digits must then pass Luhn.
+def _is_card(text, match):
+    separator = match.group('sep')
+    if separator is None:
+        return luhn_valid(match.group())
+    if _separator_before(text, match.start()) == separator:
+        return False
+    following = NEXT_GROUP.match(text, match.end())
+    if following is not None and following.group(1) == separator:
+        return False
+    return luhn_valid(match.group().replace(separator, ''))
+
+
+# Function to find where a trailing run of digit groups that the next chunk
+# could still extend starts to matter. Candidates starting MAX_CARD_GROUPS or
+# more groups back, or ending at a group too long to be part of a card, are
+# already decided, so at most a few short groups are held back.
+def _hold_from(text):
+    cursor = len(text)
+    while cursor > 0 and len(text) - cursor <= MAX_SEPARATOR and text[cursor - 1] in SEPARATORS:
+        cursor -= 1
+    if len(text) - cursor > MAX_SEPARATOR or cursor == 0 or text[cursor - 1] not in DIGITS:
+        return len(text)
+    for _ in range(MAX_CARD_GROUPS):
+        group_end = cursor
+        while cursor > 0 and text[cursor - 1] in DIGITS:
+            cursor -= 1
+            if group_end - cursor > MAX_CARD_DIGITS:
+                return group_end
+        separator_end = cursor
+        while cursor > 0 and separator_end - cursor <= MAX_SEPARATOR and text[cursor - 1] in SEPARATORS:
+            cursor -= 1
+        if cursor == separator_end or separator_end - cursor > MAX_SEPARATOR or cursor == 0 \
+                or text[cursor - 1] not in DIGITS:
+            return separator_end
+    return separator_end
+
+
+# Function to redact text and return (redacted, held back). `before` is the
+# input just ahead of text, so a chunk is read in context. Unless `final`, a
+# trailing run that the next chunk could extend is held back.
+def _redact(text, before='', final=True):
+    scan = before + text
+    offset = len(before)
+    hold = len(scan) if final else offset + _hold_from(text)
+    pieces = []
+    cursor = position = offset
+    while True:
+        match = CARD_CANDIDATE.search(scan, position)
+        if match is None or match.start() >= hold:
+            break
+        if not _is_card(scan, match):
+            position = match.start() + 1
+            continue
+        pieces.append(scan[cursor:match.start()])
+        pieces.append(match.group().translate(MASK_DIGITS))
+        cursor = position = match.end()
+    hold = max(hold, cursor)
+    pieces.append(scan[cursor:hold])
+    return ''.join(pieces), scan[hold:]
+
+
+# Function to mask every Luhn-valid, card-shaped number in text
+def redact_card_numbers(text):
+    return _redact(text)[0]
+
+
+# Streaming redaction: feed() returns the redacted text that is settled so
+# far and holds back at most a short trailing run of digit groups, so chunks
+# can be shown as they arrive. The concatenated output equals
+# redact_card_numbers() of the concatenated input.
+class CardNumberRedactor:
+    def __init__(self):
+        self._held = ''
+        self._before = ''
+
+    def feed(self, chunk):
+        text = self._held + chunk
+        redacted, self._held = _redact(text, self._before, final=False)
+        settled = len(text) - len(self._held)
+        if settled:
+            self._before = (self._before + text[:settled])[-CONTEXT_CHARS:]
+        return redacted
+
+    def flush(self):
+        redacted = _redact(self._held, self._before)[0]
+        self._held = ''
+        return redacted
+
+
+# Generator redacting an iterable of text chunks
+def iter_redacted(chunks):
+    redactor = CardNumberRedactor()
+    for chunk in chunks:
+        redacted = redactor.feed(chunk)
+        if redacted:
+            yield redacted
+    tail = redactor.flush()
+    if tail:
+        yield tail
@@ -1,5 +1,5 @@
 import streamlit as st
-import os
+from app_registry import render_app
 
 # List of app files
 app_files = {
@@ -17,8 +17,9 @@ app_choice = st.sidebar.radio("Choose an app", list(app_files.keys()))
 # Display the selected app
 if app_choice:
     file_path = app_files[app_choice]
-    
-    # Read and execute the selected app
-    with open(file_path, 'r') as f:
-        code = f.read()
-        exec(code, globals())
+
+    # Import the selected app once per process, then render it
+    render_app(file_path)
+
+    from inference_cache import summary_caption
+    st.sidebar.caption(summary_caption())
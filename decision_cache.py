@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import threading
+import time
+import streamlit as st
+
+# SQLite file holding past underwriting decisions
+DECISION_CACHE_DB = os.environ.get("DECISION_CACHE_DB", "underwriting_decisions.db")
+DECISION_CACHE_TTL = float(os.environ.get("DECISION_CACHE_TTL", str(7 * 24 * 60 * 60)))
+
+
+# A stored decision and where it came from
+class CachedDecision:
+    def __init__(self, decision, rationale, execution_arn, created_at):
+        self.decision = decision
+        self.rationale = rationale
+        self.execution_arn = execution_arn
+        self.created_at = created_at
+
+
+# Underwriting decisions keyed by the image content (its S3 ETag) and the
+# state machine that produced them, so the same image run through the same
+# workflow is answered from disk. Entries older than the TTL are ignored and
+# can be purged; invalidate() drops them on demand.
+class DecisionCache:
+    def __init__(self, db_path=DECISION_CACHE_DB, ttl_seconds=DECISION_CACHE_TTL, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS underwriting_decisions (state_machine_arn TEXT NOT NULL, content_id TEXT NOT NULL, "
+            "decision TEXT, rationale TEXT, execution_arn TEXT, created_at REAL NOT NULL, "
+            "PRIMARY KEY (state_machine_arn, content_id))"
+        )
+        self._db.commit()
+
+    def get(self, state_machine_arn, content_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT decision, rationale, execution_arn, created_at FROM underwriting_decisions "
+                "WHERE state_machine_arn = ? AND content_id = ? AND created_at >= ?",
+                (state_machine_arn, content_id, self.clock() - self.ttl_seconds)
+            ).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        return CachedDecision(*row) if row else None
+
+    def put(self, state_machine_arn, content_id, decision, rationale, execution_arn=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO underwriting_decisions "
+                "(state_machine_arn, content_id, decision, rationale, execution_arn, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (state_machine_arn, content_id, decision, rationale, execution_arn, self.clock())
+            )
+            self._db.commit()
+
+    # Function to drop the decision for one image, or every decision of a
+    # state machine when content_id is None. Returns the number removed.
+    def invalidate(self, state_machine_arn, content_id=None):
+        with self._lock:
+            if content_id is None:
+                cursor = self._db.execute("DELETE FROM underwriting_decisions WHERE state_machine_arn = ?",
+                                          (state_machine_arn,))
+            else:
+                cursor = self._db.execute(
+                    "DELETE FROM underwriting_decisions WHERE state_machine_arn = ? AND content_id = ?",
+                    (state_machine_arn, content_id)
+                )
+            self._db.commit()
+            return cursor.rowcount
+
+    def purge_expired(self):
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM underwriting_decisions WHERE created_at < ?",
+                                      (self.clock() - self.ttl_seconds,))
+            self._db.commit()
+            return cursor.rowcount
+
+
+# Process-wide decision cache, shared by every browser session
+@st.cache_resource
+def get_decision_cache():
+    return DecisionCache()
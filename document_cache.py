@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import streamlit as st
+from botocore.exceptions import ClientError
+from aws_clients import get_client
+
+# How long a cached document is trusted before it is revalidated against S3
+DOCUMENT_CACHE_TTL = float(os.environ.get("DOCUMENT_CACHE_TTL", "300"))
+# Optional on-disk tier; unset keeps the cache in memory only
+DOCUMENT_CACHE_DIR = os.environ.get("DOCUMENT_CACHE_DIR")
+
+
+# A cached S3 object: decoded text, its ETag and when S3 last confirmed it
+class CachedDocument:
+    def __init__(self, text, etag, checked_at=0.0):
+        self.text = text
+        self.etag = etag
+        self.checked_at = checked_at
+
+
+# Function to tell whether a ClientError is S3 answering 304 Not Modified
+def is_not_modified(error):
+    code = error.response.get("Error", {}).get("Code")
+    status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("304", "NotModified") or status == 304
+
+
+# Read-through cache for S3 reference documents. Within the TTL a read costs
+# nothing; after it, a conditional GET (IfNoneMatch) costs a round trip but
+# no body transfer unless the object actually changed.
+class DocumentCache:
+    def __init__(self, s3_client, ttl_seconds=DOCUMENT_CACHE_TTL, disk_dir=DOCUMENT_CACHE_DIR, clock=time.monotonic):
+        self.s3_client = s3_client
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.clock = clock
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidated": 0,
+            "not_modified": 0,
+            "disk_hits": 0,
+            "bytes_downloaded": 0
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _key_lock(self, cache_key):
+        with self._lock:
+            return self._key_locks.setdefault(cache_key, threading.Lock())
+
+    def _disk_path(self, bucket, key):
+        digest = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.disk_dir, digest)
+
+    def _read_disk(self, bucket, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(bucket, key)
+        try:
+            with open(path + ".json", "r") as f:
+                meta = json.load(f)
+            with open(path + ".body", "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, ValueError):
+            return None
+        # Disk copies may be arbitrarily old, so always revalidate them once
+        return CachedDocument(text, meta["etag"], checked_at=float("-inf"))
+
+    def _write_disk(self, bucket, key, document):
+        if not self.disk_dir:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._disk_path(bucket, key)
+        for suffix, content in ((".body", document.text), (".json", json.dumps({"etag": document.etag}))):
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path + suffix)
+
+    def _fetch(self, bucket, key, etag=None, encoding="utf-8"):
+        params = {"Bucket": bucket, "Key": key}
+        if etag:
+            params["IfNoneMatch"] = etag
+        response = self.s3_client.get_object(**params)
+        body = response["Body"].read()
+        self._count("bytes_downloaded", len(body))
+        return CachedDocument(body.decode(encoding), response["ETag"], checked_at=self.clock())
+
+    def get(self, bucket, key, encoding="utf-8"):
+        cache_key = (bucket, key)
+        document = self._entries.get(cache_key)
+        if document is not None and self.clock() - document.checked_at < self.ttl_seconds:
+            self._count("hits")
+            return document
+
+        with self._key_lock(cache_key):
+            # Another session may have refreshed it while we waited
+            document = self._entries.get(cache_key)
+            if document is not None and self.clock() - document.checked_at < self.ttl_seconds:
+                self._count("hits")
+                return document
+
+            if document is None:
+                document = self._read_disk(bucket, key)
+                if document is not None:
+                    self._count("disk_hits")
+
+            if document is None:
+                self._count("misses")
+                document = self._fetch(bucket, key, encoding=encoding)
+                self._write_disk(bucket, key, document)
+            else:
+                self._count("revalidated")
+                try:
+                    fresh = self._fetch(bucket, key, etag=document.etag, encoding=encoding)
+                except ClientError as e:
+                    if not is_not_modified(e):
+                        raise
+                    self._count("not_modified")
+                    document = CachedDocument(document.text, document.etag, checked_at=self.clock())
+                else:
+                    document = fresh
+                    self._write_disk(bucket, key, document)
+
+            self._entries[cache_key] = document
+            return document
+
+    def get_text(self, bucket, key, encoding="utf-8"):
+        return self.get(bucket, key, encoding).text
+
+    def invalidate(self, bucket, key):
+        with self._lock:
+            self._entries.pop((bucket, key), None)
+
+
+# Process-wide document cache, shared by every browser session
+@st.cache_resource
+def get_document_cache(region_name=None):
+    return DocumentCache(get_client('s3', region_name))
@@ -0,0 +1,145 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+import streamlit as st
+from botocore.exceptions import BotoCoreError, ClientError
+from aws_clients import get_client
+
+ENRICHMENT_FUNCTION_NAME = 'Enriched-Comprehend-Medical-CallCMandCustomCode-CTKtvFTHo2KT'
+# Largest request body Lambda accepts for an asynchronous ('Event') invoke
+MAX_EVENT_PAYLOAD_BYTES = int(os.environ.get("ENRICHMENT_MAX_PAYLOAD_BYTES", str(256 * 1024)))
+# Lambda errors that no retry can fix
+PERMANENT_ERROR_CODES = ("RequestTooLargeException", "InvalidRequestContentException")
+
+
+# Raised by submit() for a payload over the asynchronous invoke limit
+class PayloadTooLarge(ValueError):
+    pass
+
+
+class EnrichmentJob:
+    def __init__(self, payload, body, enqueued_at):
+        self.payload = payload
+        self.body = body
+        self.enqueued_at = enqueued_at
+        self.attempts = 0
+        self.retry_at = 0.0
+
+
+# Background dispatch of enrichment payloads to Lambda. submit() only enqueues,
+# so the page returns as soon as classification is done. A worker thread
+# takes up to `jobs_per_wake` queued payloads at a time and sends each as its
+# own asynchronous ('Event') invoke; Lambda has no batch invoke. Failed sends
+# are retried with exponential backoff and end up in `failures` once retries
+# run out; errors no retry can fix go there straight away.
+class EnrichmentDispatcher:
+    def __init__(self, lambda_client, function_name=ENRICHMENT_FUNCTION_NAME, jobs_per_wake=10, max_queue=1000,
+                 max_attempts=4, backoff_seconds=0.5, poll_interval=0.5, clock=time.monotonic):
+        self.lambda_client = lambda_client
+        self.function_name = function_name
+        self.jobs_per_wake = jobs_per_wake
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.failures = deque(maxlen=100)
+        self.stats = {"submitted": 0, "sent": 0, "retried": 0, "failed": 0, "dropped": 0, "too_large": 0,
+                      "last_lag": 0.0, "max_lag": 0.0}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="enrichment-dispatch", daemon=True)
+                self._worker.start()
+
+    # Function to queue a payload; returns False when the queue is full and
+    # raises PayloadTooLarge, without queueing, for a payload Lambda would reject
+    def submit(self, payload):
+        body = json.dumps(payload)
+        size = len(body.encode('utf-8'))
+        if size > MAX_EVENT_PAYLOAD_BYTES:
+            with self._lock:
+                self.stats["too_large"] += 1
+            raise PayloadTooLarge(f"payload is {size} bytes; asynchronous invokes take at most {MAX_EVENT_PAYLOAD_BYTES}")
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(EnrichmentJob(payload, body, self.clock()))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return False
+        with self._lock:
+            self.stats["submitted"] += 1
+        return True
+
+    def _due_retries(self):
+        now = self.clock()
+        with self._lock:
+            due = [job for job in self._retries if job.retry_at <= now]
+            self._retries = [job for job in self._retries if job.retry_at > now]
+        return due
+
+    def _next_jobs(self):
+        jobs = self._due_retries()
+        if len(jobs) < self.jobs_per_wake:
+            try:
+                jobs.append(self._queue.get(timeout=self.poll_interval))
+            except queue.Empty:
+                return jobs
+            while len(jobs) < self.jobs_per_wake:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        return jobs
+
+    def _dispatch(self, job):
+        job.attempts += 1
+        try:
+            response = self.lambda_client.invoke(
+                FunctionName=self.function_name,
+                InvocationType='Event',
+                Payload=job.body
+            )
+            if response.get('StatusCode') != 202:
+                raise RuntimeError(f"Lambda returned status {response.get('StatusCode')}")
+        except (ClientError, BotoCoreError, RuntimeError) as e:
+            permanent = isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') in PERMANENT_ERROR_CODES
+            with self._lock:
+                if job.attempts < self.max_attempts and not permanent:
+                    job.retry_at = self.clock() + self.backoff_seconds * 2 ** (job.attempts - 1)
+                    self._retries.append(job)
+                    self.stats["retried"] += 1
+                else:
+                    self.failures.append({"payload": job.payload, "error": str(e), "attempts": job.attempts})
+                    self.stats["failed"] += 1
+            return
+
+        lag = self.clock() - job.enqueued_at
+        with self._lock:
+            self.stats["sent"] += 1
+            self.stats["last_lag"] = lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+
+    def _run(self):
+        while True:
+            for job in self._next_jobs():
+                self._dispatch(job)
+
+    # Function to report queue depth, retry backlog and dispatch lag
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, queue_depth=self._queue.qsize(), retry_backlog=len(self._retries))
+
+
+# Process-wide dispatcher, shared by every browser session
+@st.cache_resource
+def get_enrichment_dispatcher():
+    return EnrichmentDispatcher(get_client('lambda'))
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from collections import deque
+import streamlit as st
+from botocore.exceptions import ClientError
+from aws_clients import get_client
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED")
+# Local status for an execution still running when our deadline passed; the
+# execution itself carries on in Step Functions
+DEADLINE_EXCEEDED = "DEADLINE_EXCEEDED"
+# list_executions pages read per bulk status check; executions not found in
+# them are described one by one
+BULK_STATUS_MAX_PAGES = 5
+
+
+# One Step Functions execution as seen by the tracker
+class TrackedExecution:
+    def __init__(self, execution_arn, started_at):
+        self.execution_arn = execution_arn
+        self.started_at = started_at
+        self.status = "RUNNING"
+        self.output = None
+        self.error = None
+        self.polls = 0
+        self.next_poll_at = started_at
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATUSES or self.status == DEADLINE_EXCEEDED
+
+    def elapsed(self, now):
+        return (self.finished_at or now) - self.started_at
+
+
+# Tracks Step Functions executions without a fixed sleep. poll() makes at most
+# one describe_execution call and only when it is due, so a UI can call it on
+# every refresh. The delay until the next call adapts to past executions: the
+# first call waits until the earliest typical finish (the 5th percentile of
+# recent durations), then calls are spaced at min_delay, growing with the time
+# since up to max_delay. Express state machines skip polling via
+# start_sync_execution. poll_many() checks a batch of executions of one state
+# machine with one list_executions call once bulk_status_min of them are
+# running.
+class ExecutionTracker:
+    def __init__(self, client, min_delay=1.0, max_delay=2.0, backoff_ratio=0.1, timeout=600.0,
+                 bulk_status_min=5, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff_ratio = backoff_ratio
+        self.timeout = timeout
+        self.bulk_status_min = bulk_status_min
+        self.clock = clock
+        self.sleep = sleep
+        # Durations of recent successful executions, in seconds
+        self.durations = deque(maxlen=200)
+        self._machine_types = {}
+        self._lock = threading.Lock()
+
+    # Function to tell whether a state machine is an Express workflow. Without
+    # permission to describe it, assume Standard and poll.
+    def is_express(self, state_machine_arn):
+        if state_machine_arn not in self._machine_types:
+            try:
+                response = self.client.describe_state_machine(stateMachineArn=state_machine_arn)
+                self._machine_types[state_machine_arn] = response["type"]
+            except ClientError:
+                self._machine_types[state_machine_arn] = "STANDARD"
+        return self._machine_types[state_machine_arn] == "EXPRESS"
+
+    def start(self, state_machine_arn, input_data):
+        started_at = self.clock()
+        response = self.client.start_execution(stateMachineArn=state_machine_arn, input=json.dumps(input_data))
+        execution = TrackedExecution(response["executionArn"], started_at)
+        execution.next_poll_at = started_at + self.next_delay(0.0)
+        return execution
+
+    # Function to run an Express workflow to completion in one call
+    def run_sync(self, state_machine_arn, input_data):
+        started_at = self.clock()
+        response = self.client.start_sync_execution(stateMachineArn=state_machine_arn, input=json.dumps(input_data))
+        execution = TrackedExecution(response["executionArn"], started_at)
+        self._finish(execution, response)
+        return execution
+
+    # Function to estimate how soon an execution can finish, once a few have
+    def earliest_finish(self):
+        with self._lock:
+            if len(self.durations) < 5:
+                return None
+            ordered = sorted(self.durations)
+        return ordered[len(ordered) // 20]
+
+    def next_delay(self, elapsed):
+        earliest = self.earliest_finish()
+        if earliest is not None and elapsed < earliest:
+            return max(self.min_delay, earliest - elapsed)
+        delay = self.backoff_ratio * (elapsed - (earliest or 0.0))
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def _finish(self, execution, response):
+        execution.status = response["status"]
+        execution.finished_at = self.clock()
+        if execution.status == "SUCCEEDED":
+            execution.output = json.loads(response["output"]) if response.get("output") else None
+            if response.get("startDate") and response.get("stopDate"):
+                duration = (response["stopDate"] - response["startDate"]).total_seconds()
+            else:
+                duration = execution.finished_at - execution.started_at
+            with self._lock:
+                self.durations.append(duration)
+        else:
+            execution.error = response.get("error") or response.get("cause")
+
+    # Function to check an execution if its next poll is due. Never sleeps.
+    def poll(self, execution):
+        now = self.clock()
+        if execution.done or now < execution.next_poll_at:
+            return execution
+
+        response = self.client.describe_execution(executionArn=execution.execution_arn)
+        execution.polls += 1
+        if response["status"] in TERMINAL_STATUSES:
+            self._finish(execution, response)
+        else:
+            self._reschedule(execution)
+        return execution
+
+    # Function to set the next poll of a running execution, or give up on it
+    # at the deadline
+    def _reschedule(self, execution):
+        now = self.clock()
+        deadline = execution.started_at + self.timeout
+        if now >= deadline:
+            execution.status = DEADLINE_EXCEEDED
+            execution.finished_at = now
+        else:
+            execution.next_poll_at = min(deadline, now + self.next_delay(now - execution.started_at))
+
+    # Function to read the status of the given executions from list_executions,
+    # newest first. Returns {execution_arn: status} for those found.
+    def list_statuses(self, state_machine_arn, execution_arns):
+        wanted = set(execution_arns)
+        statuses = {}
+        kwargs = {"stateMachineArn": state_machine_arn, "maxResults": 1000}
+        for _ in range(BULK_STATUS_MAX_PAGES):
+            response = self.client.list_executions(**kwargs)
+            for listed in response["executions"]:
+                if listed["executionArn"] in wanted:
+                    statuses[listed["executionArn"]] = listed["status"]
+            if len(statuses) == len(wanted) or not response.get("nextToken"):
+                break
+            kwargs["nextToken"] = response["nextToken"]
+        return statuses
+
+    # Function to poll many executions of one state machine together. Once any
+    # is due and bulk_status_min or more are running, one list_executions call
+    # covers them all and only the finished ones are described, for their
+    # output. Never sleeps.
+    def poll_many(self, state_machine_arn, executions):
+        running = [execution for execution in executions if not execution.done]
+        now = self.clock()
+        if not any(now >= execution.next_poll_at for execution in running):
+            return executions
+        if len(running) < self.bulk_status_min:
+            for execution in running:
+                self.poll(execution)
+            return executions
+
+        statuses = self.list_statuses(state_machine_arn, [execution.execution_arn for execution in running])
+        for execution in running:
+            status = statuses.get(execution.execution_arn)
+            if status == "RUNNING":
+                self._reschedule(execution)
+            else:
+                # Finished, or too old to be listed: describe it
+                execution.next_poll_at = now
+                self.poll(execution)
+        return executions
+
+    # Function to block until an execution finishes or the deadline passes
+    def wait(self, execution):
+        while not self.poll(execution).done:
+            self.sleep(max(0.0, execution.next_poll_at - self.clock()))
+        return execution
+
+
+# Process-wide tracker, so every session learns from the same durations
+@st.cache_resource
+def get_execution_tracker(region_name):
+    return ExecutionTracker(get_client('stepfunctions', region_name))
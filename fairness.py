@@ -0,0 +1,149 @@
+import warnings
+import numpy as np
+
+# Function to map one or more protected attribute columns to a compact group
+# code per row. Several columns give intersectional groups (e.g. age x race x
+# gender); the labels are tuples of attribute values.
+def encode_groups(*attributes):
+    codes = np.zeros(len(attributes[0]), dtype=np.int64)
+    value_lists = []
+    for column in attributes:
+        values, inverse = np.unique(np.asarray(column), return_inverse=True)
+        codes = codes * len(values) + inverse.reshape(-1)
+        value_lists.append(values)
+
+    used, codes = np.unique(codes, return_inverse=True)
+    labels = []
+    for code in used:
+        label = []
+        for values in reversed(value_lists):
+            code, index = divmod(int(code), len(values))
+            value = values[index]
+            label.append(value.item() if isinstance(value, np.generic) else value)
+        labels.append(tuple(reversed(label)))
+    return codes.reshape(-1), labels
+
+
+# Function to count every (group, prediction, label) cell in one pass.
+# Result has shape (groups, 2, 2), indexed [group, predicted, actual].
+def confusion_by_group(group_codes, predictions, labels, n_groups):
+    cells = (np.asarray(group_codes, dtype=np.int64) * 2 + np.asarray(predictions, dtype=np.int64)) * 2 \
+        + np.asarray(labels, dtype=np.int64)
+    return np.bincount(cells, minlength=n_groups * 4).reshape(n_groups, 2, 2)
+
+
+# Function to compute per-group rates and fairness metrics from counts alone.
+# Works on any leading batch shape (..., groups, 2, 2); metrics compare each
+# group with the privileged one, and empty denominators give NaN.
+def metrics_from_counts(counts, privileged):
+    counts = np.asarray(counts, dtype=np.float64)
+    tn, fn = counts[..., 0, 0], counts[..., 0, 1]
+    fp, tp = counts[..., 1, 0], counts[..., 1, 1]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        selection = (tp + fp) / (tp + fp + tn + fn)
+        tpr = tp / (tp + fn)
+        fpr = fp / (fp + tn)
+        selection_priv = selection[..., privileged, None]
+        tpr_priv = tpr[..., privileged, None]
+        fpr_priv = fpr[..., privileged, None]
+        return {
+            "Selection Rate": selection,
+            "True Positive Rate": tpr,
+            "False Positive Rate": fpr,
+            "Disparate Impact": selection / selection_priv,
+            "Statistical Parity Difference": selection - selection_priv,
+            "Equal Opportunity Difference": tpr - tpr_priv,
+            "Average Odds Difference": 0.5 * ((fpr - fpr_priv) + (tpr - tpr_priv))
+        }
+
+
+# Function to compare one privileged group (rows marked 1) with everyone else.
+# As in the original two-group calculation, rates with an empty denominator
+# count as 0; Disparate Impact is 0 when the privileged group has no
+# favorable predictions.
+def binary_split_metrics(privileged_rows, predictions, labels):
+    counts = confusion_by_group(privileged_rows, predictions, labels, 2)
+    rates = metrics_from_counts(counts, privileged=1)
+    tpr_unpriv, tpr_priv = np.nan_to_num(rates["True Positive Rate"], nan=0.0)
+    rate_unpriv, rate_priv = np.nan_to_num(rates["Selection Rate"], nan=0.0)
+    return {
+        "Disparate Impact": float(rate_unpriv / rate_priv) if rate_priv > 0 else 0.0,
+        "Equal Opportunity Difference": float(tpr_unpriv - tpr_priv)
+    }
+
+
+# Function to bootstrap confidence intervals for every metric. Resampling rows
+# with replacement only changes the cell counts, which follow a multinomial
+# over the observed cells, so all resamples are drawn as one
+# (n_boot, cells) array. The cost depends on the number of cells, not rows.
+def bootstrap_intervals(counts, privileged, n_boot=1000, confidence=0.95, seed=None):
+    counts = np.asarray(counts)
+    total = int(counts.sum())
+    if total == 0:
+        return {}
+    rng = np.random.default_rng(seed)
+    draws = rng.multinomial(total, counts.reshape(-1) / total, size=n_boot).reshape((n_boot,) + counts.shape)
+    sampled = metrics_from_counts(draws, privileged)
+    tail = (1 - confidence) / 2 * 100
+    intervals = {}
+    for name, values in sampled.items():
+        with warnings.catch_warnings():
+            # Groups with no rows give all-NaN columns; their interval stays NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            low, high = np.nanpercentile(values, [tail, 100 - tail], axis=0)
+        intervals[name] = (low, high)
+    return intervals
+
+
+def _clean(value):
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+
+# Per-group counts, metrics and intervals from one audit
+class FairnessReport:
+    def __init__(self, groups, counts, privileged, metrics, intervals):
+        self.groups = groups
+        self.counts = counts
+        self.privileged = privileged
+        self.metrics = metrics
+        self.intervals = intervals
+
+    def group_metrics(self, group):
+        index = self.groups.index(group)
+        return {name: _clean(values[index]) for name, values in self.metrics.items()}
+
+    # JSON-ready summary; NaN and infinity become None
+    def to_dict(self):
+        summary = {"Privileged Group": " / ".join(map(str, self.groups[self.privileged])), "Groups": {}}
+        for index, group in enumerate(self.groups):
+            entry = {"Count": int(self.counts[index].sum())}
+            for name, values in self.metrics.items():
+                entry[name] = _clean(values[index])
+                if name in self.intervals:
+                    low, high = self.intervals[name]
+                    entry[f"{name} CI"] = [_clean(low[index]), _clean(high[index])]
+            summary["Groups"][" / ".join(map(str, group))] = entry
+        return summary
+
+
+# Function to build a report from per-group counts. The privileged group is
+# given by its label tuple; by default it is the group with the most rows.
+def report_from_counts(groups, counts, privileged=None, n_boot=0, confidence=0.95, seed=None):
+    counts = np.asarray(counts)
+    if privileged is None:
+        privileged_index = int(np.argmax(counts.sum(axis=(1, 2))))
+    else:
+        privileged_index = groups.index(tuple(privileged))
+    metrics = metrics_from_counts(counts, privileged_index)
+    intervals = bootstrap_intervals(counts, privileged_index, n_boot, confidence, seed) if n_boot else {}
+    return FairnessReport(groups, counts, privileged_index, metrics, intervals)
+
+
+# Function to audit binary predictions against labels for any number of
+# protected attribute columns
+def audit(predictions, labels, *attributes, privileged=None, n_boot=0, confidence=0.95, seed=None):
+    group_codes, groups = encode_groups(*attributes)
+    counts = confusion_by_group(group_codes, predictions, labels, len(groups))
+    return report_from_counts(groups, counts, privileged, n_boot, confidence, seed)
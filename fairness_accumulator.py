@@ -0,0 +1,171 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+import zipfile
+import numpy as np
+import streamlit as st
+from fairness import report_from_counts
+
+# Where running counts are snapshotted between restarts
+FAIRNESS_COUNTS_PATH = os.environ.get("FAIRNESS_COUNTS_PATH", "fairness_counts.npz")
+# Outcome slots allocated up front; the outcome axis doubles when they run out
+OUTCOME_CAPACITY = 64
+# A background snapshot is taken once this many classifications are unsaved,
+# and otherwise every this many seconds while any are
+FAIRNESS_SNAPSHOT_EVERY = int(os.environ.get("FAIRNESS_SNAPSHOT_EVERY", "100"))
+FAIRNESS_SNAPSHOT_SECONDS = float(os.environ.get("FAIRNESS_SNAPSHOT_SECONDS", "10"))
+# Without ground truth only these metrics mean anything
+SELECTION_METRICS = ("Selection Rate", "Disparate Impact", "Statistical Parity Difference")
+
+logger = logging.getLogger(__name__)
+
+
+# Running per-group outcome counts in one integer array of shape
+# (values of attribute 1, ..., values of attribute k, outcome slots).
+# Recording a classification is a single increment, memory grows only with
+# the number of distinct outcomes, never with traffic, and metrics are
+# recomputed from the counts alone; no records are kept. Snapshots are
+# written by a background thread, off the request path.
+class FairnessAccumulator:
+    def __init__(self, attributes, path=FAIRNESS_COUNTS_PATH, outcome_capacity=OUTCOME_CAPACITY,
+                 snapshot_every=FAIRNESS_SNAPSHOT_EVERY, snapshot_seconds=FAIRNESS_SNAPSHOT_SECONDS):
+        self.attribute_names = list(attributes)
+        self.attribute_values = [list(values) for values in attributes.values()]
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.snapshot_seconds = snapshot_seconds
+        self.counts = np.zeros([len(values) for values in self.attribute_values] + [max(1, outcome_capacity)],
+                               dtype=np.int64)
+        self.outcomes = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Held from copying the counts to the rename, so snapshots land in order
+        self._snapshot_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker = None
+        self._load()
+
+    # Function to keep an unusable snapshot under another name rather than
+    # let the next snapshot overwrite it
+    def _move_aside(self, reason):
+        aside = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}.{reason}"
+        os.replace(self.path, aside)
+        return aside
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as snapshot:
+                counts = snapshot["counts"].copy()
+                outcomes = [str(name) for name in snapshot["outcomes"]]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as e:
+            # Truncated or corrupt, e.g. a disk that filled up mid-write
+            aside = self._move_aside("corrupt")
+            logger.warning("Could not read fairness counts from %s (%s); moved to %s and starting from zero",
+                           self.path, e, aside)
+            return
+        if counts.shape[:-1] == self.counts.shape[:-1] and len(outcomes) <= counts.shape[-1]:
+            self.counts = counts
+            self.outcomes = outcomes
+            return
+        # Taken with different attribute values, so not comparable
+        aside = self._move_aside("mismatch")
+        logger.warning("Fairness counts in %s have group shape %s, expected %s; moved to %s and starting from zero",
+                       self.path, counts.shape[:-1], self.counts.shape[:-1], aside)
+
+    # Function to write the counts atomically: readers see the old or the new
+    # snapshot, never a partial one
+    def snapshot(self):
+        if not self.path:
+            return
+        with self._snapshot_lock:
+            with self._lock:
+                counts = self.counts.copy()
+                outcomes = np.array(self.outcomes, dtype=str)
+                self._pending = 0
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, counts=counts, outcomes=outcomes)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="fairness-snapshots", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.snapshot_seconds)
+            self._wake.clear()
+            with self._lock:
+                pending = self._pending
+            if pending:
+                try:
+                    self.snapshot()
+                except OSError as e:
+                    logger.warning("Could not snapshot fairness counts to %s: %s", self.path, e)
+
+    def _outcome_index(self, outcome):
+        if outcome in self.outcomes:
+            return self.outcomes.index(outcome)
+        if len(self.outcomes) == self.counts.shape[-1]:
+            self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)], axis=-1)
+        self.outcomes.append(outcome)
+        return len(self.outcomes) - 1
+
+    # Function to count one classification for a group (one value per attribute)
+    def record(self, group, outcome):
+        index = tuple(values.index(value) for values, value in zip(self.attribute_values, group))
+        with self._lock:
+            # May grow (and replace) the array, so look it up before indexing
+            outcome_index = self._outcome_index(outcome)
+            self.counts[index + (outcome_index,)] += 1
+            self._pending += 1
+            due = self._pending >= self.snapshot_every
+        if self.path:
+            self._ensure_worker()
+            if due:
+                self._wake.set()
+
+    def total(self):
+        return int(self.counts.sum())
+
+    # Function to report how often `outcome` is predicted per group. Groups
+    # are intersections of the attributes named in `by` (all by default);
+    # other attributes are summed out. There are no ground-truth labels
+    # online, so only selection-rate metrics are reported.
+    def report(self, outcome, by=None, privileged=None):
+        by = by or self.attribute_names
+        keep = sorted(self.attribute_names.index(name) for name in by)
+        drop = tuple(axis for axis in range(len(self.attribute_names)) if axis not in keep)
+        with self._lock:
+            counts = self.counts.sum(axis=drop) if drop else self.counts.copy()
+            outcome_index = self.outcomes.index(outcome) if outcome in self.outcomes else None
+
+        totals = counts.sum(axis=-1).reshape(-1)
+        selected = counts[..., outcome_index].reshape(-1) if outcome_index is not None else np.zeros_like(totals)
+        groups = [tuple(self.attribute_values[axis][i] for axis, i in zip(keep, position))
+                  for position in np.ndindex(*counts.shape[:-1])]
+
+        # Predicted/not predicted, with every row in the "actual negative" column
+        confusion = np.zeros((len(groups), 2, 2), dtype=np.int64)
+        confusion[:, 1, 0] = selected
+        confusion[:, 0, 0] = totals - selected
+        report = report_from_counts(groups, confusion, privileged)
+        report.metrics = {name: report.metrics[name] for name in SELECTION_METRICS}
+        return report
+
+
+# Process-wide accumulator shared by every browser session
+@st.cache_resource
+def get_fairness_accumulator(attributes_key):
+    return FairnessAccumulator(dict(attributes_key))
@@ -1,13 +1,17 @@
 import streamlit as st
-import boto3
 import json
 import hmac
 import hashlib
 import base64
 from botocore.exceptions import ClientError
-import nltk
-from nltk.tokenize import sent_tokenize
-import pandas as pd
+from aws_clients import get_client
+from document_cache import get_document_cache
+from inference_cache import memoized
+from segmenter import iter_segments
+from toxicity import detect_toxic_segments
+from identity_cache import IdentityCache, SessionExpired
+from post_checks import PostCheck, run_post_checks
+from bedrock_streaming import BEDROCK_STREAMING, anthropic_messages_text, invoke_model_stream, render_stream
 
 # AWS configurations
 REGION_NAME = "us-west-2"
@@ -23,13 +27,13 @@ GUARDRAIL_IDS = {
 MAX_TOKENS = 1000
 GUARDRAIL_VERSION = "DRAFT"
 S3_BUCKET_NAME = "healthcare-guardrail-data"
+DATA_FILE_KEY = "Unique_Healthcare_Data_200.txt"
 
-# Initialize AWS clients
-session = boto3.Session(region_name=REGION_NAME)
-cognito_client = session.client('cognito-idp')
-bedrock_client = session.client('bedrock-runtime')
-s3_client = session.client('s3')
-comprehend_client = session.client('comprehend')
+# Shared AWS clients
+cognito_client = get_client('cognito-idp', REGION_NAME)
+bedrock_client = get_client('bedrock-runtime', REGION_NAME)
+s3_client = get_client('s3', REGION_NAME)
+comprehend_client = get_client('comprehend', REGION_NAME)
 
 """def get_secret_hash(username):
     msg = username + CLIENT_ID
@@ -53,28 +57,37 @@ def authenticate_user(username, password):
         st.error(f"Authentication failed: {e}")
         return None
 
+# Function to get this browser session's cached Cognito identity
+def identity_cache():
+    return IdentityCache(cognito_client, USER_POOL_ID, CLIENT_ID, st.session_state)
+
 def get_user_group(username):
     try:
-        response = cognito_client.admin_list_groups_for_user(
-            Username=username,
-            UserPoolId=USER_POOL_ID
-        )
-        groups = [group['GroupName'] for group in response['Groups']]
+        # Cached per session until the tokens expire; no Cognito call on most reruns
+        groups = identity_cache().groups(username)
         return groups[0] if groups else None
+    except SessionExpired:
+        # The tokens could not be refreshed; back to the login form
+        st.session_state.auth_status = False
+        st.session_state.session_expired = True
+        st.rerun()
     except ClientError as e:
         st.error(f"Failed to get user group: {e}")
         return None
 
-def load_data_from_s3():
+# Function to get the healthcare data as a CachedDocument (its text and
+# ETag), or None if S3 could not be read
+def load_document_from_s3():
     try:
-        response = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key='Unique_Healthcare_Data_200.txt')
-        data = response['Body'].read().decode('utf-8')
-        return data
+        # Served from the shared cache; S3 is only asked again once the TTL lapses
+        return get_document_cache(REGION_NAME).get(S3_BUCKET_NAME, DATA_FILE_KEY)
     except ClientError as e:
         st.error(f"Failed to load data from S3: {e}")
         return None
 
-def generate_analysis(prompt, guardrail_id, data):
+@memoized("bedrock.invoke_model", phi=True, model_id=MODEL_ID, guardrail_version=GUARDRAIL_VERSION,
+          max_tokens=MAX_TOKENS)
+def generate_analysis(prompt, guardrail_id, data, stream=False):
     context = f"Based on the following healthcare data:\n\n{data}\n\n"
     full_prompt = context + prompt
 
@@ -94,63 +107,96 @@ def generate_analysis(prompt, guardrail_id, data):
         ]
     }
 
+    request = {
+        "body": json.dumps(payload),
+        "modelId": MODEL_ID,
+        "contentType": "application/json",
+        "accept": "application/json",
+        "guardrailIdentifier": guardrail_id,
+        "guardrailVersion": GUARDRAIL_VERSION
+    }
+
     try:
-        response = bedrock_client.invoke_model(
-            body=json.dumps(payload),
-            modelId=MODEL_ID,
-            contentType="application/json",
-            accept="application/json",
-            guardrailIdentifier=guardrail_id,
-            guardrailVersion=GUARDRAIL_VERSION
-        )
+        if stream:
+            return invoke_model_stream(bedrock_client, anthropic_messages_text, **request)
+        response = bedrock_client.invoke_model(**request)
         response_body = json.loads(response['body'].read())
         return response_body['content'][0]['text']
     except ClientError as e:
         st.error(f"Failed to generate analysis: {e}")
         return None
 
+# Runs as a post-check on a worker thread: a ClientError is raised and shown
+# by run_post_checks in this check's section
+@memoized("comprehend.detect_sentiment", phi=True, language_code='en')
 def perform_sentiment_analysis(text):
-    try:
-        sentiment_response = comprehend_client.detect_sentiment(
-            LanguageCode='en',
-            Text=text
-        )
-        return sentiment_response
-    except ClientError as e:
-        st.error(f"Error performing sentiment analysis: {e}")
-        return None
+    return comprehend_client.detect_sentiment(
+        LanguageCode='en',
+        Text=text
+    )
+
+# Runs as a post-check on a worker thread: failed batches are returned in
+# "Errors" for render_toxicity to show next to the segments that were scored
+def detect_toxicity(segmented_text):
+    # Segments go out in batches of 10, several batches concurrently
+    report = detect_toxic_segments(comprehend_client, segmented_text)
+    scored = report.scored()
+    return {
+        "ResultList": [result for _, result in scored],
+        "Segments": [segment for segment, _ in scored],
+        "Errors": report.errors
+    }
 
-def convert_to_segments(text, max_bytes=1000):
-    segments = []
-    current_segment = ""
+# Function to lay out per-segment toxicity scores as a table
+def toxicity_table(toxic_content):
+    import pandas as pd
 
-    for sentence in sent_tokenize(text):
-        if len((current_segment + " " + sentence).encode('utf-8')) <= max_bytes:
-            current_segment += " " + sentence
-        else:
-            segments.append({"Text": current_segment.strip()})
-            current_segment = sentence
+    results = toxic_content['ResultList']
 
-    if current_segment:
-        segments.append({"Text": current_segment.strip()})
+    toxicity_list = []
+    labels_list = []
 
-    return segments
+    for result in results:
+        toxicity_list.append(result['Toxicity'])
+        labels_list.append({label['Name']: label['Score'] for label in result['Labels']})
 
-def detect_toxicity(segmented_text):
-    toxicity_results = []
-    
-    for segment in segmented_text:
-        try:
-            toxic = comprehend_client.detect_toxic_content(
-                TextSegments=[segment],
-                LanguageCode='en'
-            )
-            toxicity_results.extend(toxic['ResultList'])
-        except ClientError as e:
-            st.error(f"Error detecting toxicity: {e}")
-            return None
-    
-    return {"ResultList": toxicity_results}
+    df1 = pd.DataFrame(labels_list)
+    df1['TOXICITY'] = toxicity_list
+
+    text_list = []
+    for segment in toxic_content['Segments']:
+        text_list.append(segment['Text'])
+
+    df1['SEGMENT'] = text_list
+
+    new_column_order = ['SEGMENT', 'PROFANITY', 'HATE_SPEECH', 'INSULT', 'GRAPHIC', 'HARASSMENT_OR_ABUSE', 'SEXUAL', 'VIOLENCE_OR_THREAT', 'TOXICITY']
+    df1 = df1.reindex(columns=new_column_order, fill_value='N/A')
+
+    selected_columns = ['SEGMENT', 'PROFANITY', 'HATE_SPEECH', 'INSULT', 'VIOLENCE_OR_THREAT', 'TOXICITY']
+    df2 = df1[selected_columns]
+
+    return df2
+
+# Function to show the sentiment of the answer
+def render_sentiment(sentiment_response):
+    if sentiment_response:
+        st.write("##### Sentiment Analysis")
+        st.markdown(f"""
+        - **Sentiment:** {sentiment_response["Sentiment"]}
+        - **Sentiment Score:**
+            - Positive: {sentiment_response['SentimentScore']['Positive'] * 100:.2f}%
+            - Negative: {sentiment_response['SentimentScore']['Negative'] * 100:.2f}%
+            - Neutral: {sentiment_response['SentimentScore']['Neutral'] * 100:.2f}%
+            - Mixed: {sentiment_response['SentimentScore']['Mixed'] * 100:.2f}%
+        """)
+
+# Function to show the per-segment toxicity of the answer
+def render_toxicity(toxic_content):
+    st.write("##### Toxicity Detection")
+    for error in toxic_content["Errors"]:
+        st.error(f"Error detecting toxicity: {error}")
+    if toxic_content["ResultList"]:
+        st.write(toxicity_table(toxic_content))
 
 def main():
     st.title("Healthcare Application")
@@ -161,6 +207,8 @@ def main():
 
     if not st.session_state.auth_status:
         st.subheader("Login")
+        if st.session_state.pop("session_expired", False):
+            st.info("Your session has expired. Please log in again.")
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
 
@@ -172,6 +220,7 @@ def main():
                     st.session_state.auth_response = auth_response
                     st.session_state.username = username
                 else:
+                    identity_cache().remember_login(username, auth_response['AuthenticationResult'])
                     st.session_state.auth_status = True
                     st.session_state.username = username
                     st.success("Login successful!")
@@ -192,6 +241,8 @@ def main():
                     }
                 )
                 st.success("Password updated successfully. Please log in with your new password.")
+                if 'AuthenticationResult' in challenge_response:
+                    identity_cache().remember_login(st.session_state.username, challenge_response['AuthenticationResult'])
                 st.session_state.new_password_required = False
                 st.session_state.auth_status = True
                 st.rerun()
@@ -204,62 +255,38 @@ def main():
        
         if user_group:
             st.write(f"You are in the {user_group} group.")
-            guardrail_id = GUARDRAIL_IDS.get(user_group)
+            guardrail_id = identity_cache().guardrail_id(st.session_state.username, GUARDRAIL_IDS)
            
             if guardrail_id:
                 user_prompt = st.text_input("Please enter your query:")
 
                 if st.button("Generate Answer"):
                     if user_prompt:
-                        data = load_data_from_s3()
-                        if data:
-                            response_from_llm = generate_analysis(user_prompt, guardrail_id, data)
+                        document = load_document_from_s3()
+                        if document is not None and document.text:
+                            # The whole document when it fits the model budget, else the header and the records relevant to the question
+                            from retrieval import retrieve_context
+                            data = retrieve_context(user_prompt, document, DATA_FILE_KEY)
+                            response_from_llm = generate_analysis(user_prompt, guardrail_id, data, stream=BEDROCK_STREAMING)
                             if response_from_llm:
                                 st.write("##### Response")
-                                st.write(response_from_llm)
-
-                                # Perform sentiment analysis
-                                sentiment_response = perform_sentiment_analysis(response_from_llm)
-                                if sentiment_response:
-                                    st.write("##### Sentiment Analysis")
-                                    st.markdown(f"""
-                                    - **Sentiment:** {sentiment_response["Sentiment"]}
-                                    - **Sentiment Score:**
-                                        - Positive: {sentiment_response['SentimentScore']['Positive'] * 100:.2f}%
-                                        - Negative: {sentiment_response['SentimentScore']['Negative'] * 100:.2f}%
-                                        - Neutral: {sentiment_response['SentimentScore']['Neutral'] * 100:.2f}%
-                                        - Mixed: {sentiment_response['SentimentScore']['Mixed'] * 100:.2f}%
-                                    """)
-
-                                
-                                st.write("##### Toxicity Detection")
-                                segmented_text = convert_to_segments(response_from_llm)
-                                toxic_content = detect_toxicity(segmented_text)
-                                results = toxic_content['ResultList']
-
-                                toxicity_list = []
-                                labels_list = []
-
-                                for result in results:
-                                    toxicity_list.append(result['Toxicity'])
-                                    labels_list.append({label['Name']: label['Score'] for label in result['Labels']})
-
-                                df1 = pd.DataFrame(labels_list)
-                                df1['TOXICITY'] = toxicity_list
-
-                                text_list = []
-                                for segment in segmented_text:
-                                    text_list.append(segment['Text'])
-
-                                df1['SEGMENT'] = text_list
-
-                                new_column_order = ['SEGMENT', 'PROFANITY', 'HATE_SPEECH', 'INSULT', 'GRAPHIC', 'HARASSMENT_OR_ABUSE', 'SEXUAL', 'VIOLENCE_OR_THREAT', 'TOXICITY']
-                                df1 = df1.reindex(columns=new_column_order, fill_value='N/A')
-
-                                selected_columns = ['SEGMENT', 'PROFANITY', 'HATE_SPEECH', 'INSULT', 'VIOLENCE_OR_THREAT', 'TOXICITY']
-                                df2 = df1[selected_columns]
-
-                                st.write(df2)
+                                if BEDROCK_STREAMING:
+                                    response_from_llm = render_stream(response_from_llm)
+                                else:
+                                    st.write(response_from_llm)
+
+                                # A stream can end with no text (an error, or a guardrail
+                                # intervention); Comprehend rejects empty input
+                                if not response_from_llm:
+                                    st.info("No response text was returned, so sentiment analysis and toxicity detection were skipped.")
+                                else:
+                                    # Sentiment analysis and toxicity detection run in parallel;
+                                    # segments are packed as toxicity batches are filled, and each batch goes out when full
+                                    report = run_post_checks([
+                                        PostCheck("Sentiment Analysis", lambda: perform_sentiment_analysis(response_from_llm), render_sentiment),
+                                        PostCheck("Toxicity Detection", lambda: detect_toxicity(iter_segments(response_from_llm)), render_toxicity)
+                                    ])
+                                    st.caption(report.summary())
                     else:
                         st.warning("Please enter a question for analysis.")
             else:
@@ -268,6 +295,7 @@ def main():
             st.error("Failed to retrieve user group.")
  
         if st.button("Logout"):
+            identity_cache().forget()
             st.session_state.auth_status = False
             st.rerun()
 
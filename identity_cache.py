@@ -0,0 +1,113 @@
+import os
+import time
+from botocore.exceptions import ClientError
+
+# Refresh tokens this many seconds before they expire
+REFRESH_MARGIN_SECONDS = 60
+# Lifetime of a group lookup when there are no tokens to tie it to
+GROUPS_TTL_SECONDS = float(os.environ.get("COGNITO_GROUPS_TTL", "300"))
+
+
+# Raised when the tokens expired and could not be refreshed; the cached
+# identity has been dropped and the user has to sign in again
+class SessionExpired(Exception):
+    pass
+
+
+# What we know about the signed-in user of one user pool
+class Identity:
+    def __init__(self, username):
+        self.username = username
+        self.tokens = None
+        self.expires_at = 0.0
+        self.groups = None
+        self.groups_expire_at = 0.0
+        self.guardrail_id = None
+
+
+# Per-browser-session identity cache, stored in st.session_state under a key
+# per user pool, so it survives reruns and switching sub-apps in the launcher.
+# Groups and the resolved guardrail stay valid until the tokens expire, and
+# tokens are renewed with REFRESH_TOKEN_AUTH without asking the user again.
+class IdentityCache:
+    def __init__(self, cognito_client, user_pool_id, client_id, store, clock=time.time):
+        self.cognito_client = cognito_client
+        self.user_pool_id = user_pool_id
+        self.client_id = client_id
+        self.store = store
+        self.clock = clock
+        self.key = f"identity:{user_pool_id}:{client_id}"
+
+    def get(self):
+        return self.store.get(self.key)
+
+    def forget(self):
+        self.store.pop(self.key, None)
+
+    def _apply_tokens(self, identity, auth_result):
+        refresh_token = auth_result.get("RefreshToken") or (identity.tokens or {}).get("RefreshToken")
+        identity.tokens = dict(auth_result, RefreshToken=refresh_token)
+        identity.expires_at = self.clock() + auth_result.get("ExpiresIn", 3600)
+        # Group membership is re-read with every new set of tokens
+        identity.groups = None
+        identity.guardrail_id = None
+
+    # Function to record a successful sign-in (AuthenticationResult from Cognito)
+    def remember_login(self, username, auth_result):
+        identity = Identity(username)
+        self._apply_tokens(identity, auth_result)
+        self.store[self.key] = identity
+        return identity
+
+    def _refresh_if_needed(self, identity):
+        if identity.tokens is None or self.clock() < identity.expires_at - REFRESH_MARGIN_SECONDS:
+            return
+        # Some sign-in paths (e.g. a NEW_PASSWORD_REQUIRED challenge) return
+        # no refresh token, so the user has to sign in again
+        if not identity.tokens.get("RefreshToken"):
+            self.forget()
+            raise SessionExpired("No refresh token for the expired session")
+        try:
+            response = self.cognito_client.admin_initiate_auth(
+                UserPoolId=self.user_pool_id,
+                ClientId=self.client_id,
+                AuthFlow='REFRESH_TOKEN_AUTH',
+                AuthParameters={'REFRESH_TOKEN': identity.tokens["RefreshToken"]}
+            )
+        except ClientError as e:
+            self.forget()
+            raise SessionExpired(str(e)) from e
+        self._apply_tokens(identity, response["AuthenticationResult"])
+
+    # Function to get the user's groups in the order admin_list_groups_for_user
+    # returns them (callers pick the guardrail from the first), calling Cognito
+    # only when the cached answer has expired. Raises SessionExpired if the
+    # tokens could not be refreshed, and ClientError like the underlying call.
+    def groups(self, username):
+        identity = self.get()
+        if identity is None or identity.username != username:
+            identity = Identity(username)
+            self.store[self.key] = identity
+
+        self._refresh_if_needed(identity)
+        if identity.groups is not None and self.clock() < identity.groups_expire_at:
+            return identity.groups
+
+        response = self.cognito_client.admin_list_groups_for_user(
+            Username=username,
+            UserPoolId=self.user_pool_id
+        )
+        groups = [group['GroupName'] for group in response['Groups']]
+
+        identity.groups = groups
+        identity.groups_expire_at = identity.expires_at if identity.tokens else self.clock() + GROUPS_TTL_SECONDS
+        identity.guardrail_id = None
+        return groups
+
+    # Function to resolve (and remember) the guardrail for the user's group
+    def guardrail_id(self, username, guardrail_ids):
+        groups = self.groups(username)
+        identity = self.get()
+        if identity.guardrail_id is None and groups:
+            identity.guardrail_id = guardrail_ids.get(groups[0])
+        return identity.guardrail_id
@@ -0,0 +1,67 @@
+import io
+import os
+import time
+
+# Defaults for the optional preprocessing of uploaded license photos
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", "2048"))
+IMAGE_FORMAT = os.environ.get("IMAGE_FORMAT", "JPEG")
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "85"))
+
+OUTPUT_TYPES = {"JPEG": ("image/jpeg", ".jpg"), "WEBP": ("image/webp", ".webp")}
+
+
+# The outcome of preprocessing one image
+class PreprocessedImage:
+    def __init__(self, data, file_name, content_type, original_bytes, original_size, size, seconds):
+        self.data = data
+        self.file_name = file_name
+        self.content_type = content_type
+        self.original_bytes = original_bytes
+        self.original_size = original_size
+        self.size = size
+        self.seconds = seconds
+
+    @property
+    def bytes_saved(self):
+        return self.original_bytes - len(self.data)
+
+
+# Function to upright, downscale and re-encode an image. JPEGs are decoded
+# at a reduced scale when they are far larger than needed, which is most of
+# the saving on phone photos. If the result would not be smaller and the
+# image needed no rotation or resizing, the original bytes are kept.
+def preprocess_image(data, file_name, max_side=IMAGE_MAX_SIDE, image_format=IMAGE_FORMAT, quality=IMAGE_QUALITY,
+                     content_type=None):
+    from PIL import Image, ImageOps
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    original_size = image.size
+    oriented = image.getexif().get(0x0112, 1) != 1
+    # A square box is right for either orientation of the stored pixels
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    resized = max(original_size) > max_side
+
+    image_format = image_format.upper()
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if image_format == "JPEG" and has_alpha:
+        # JPEG has no alpha; flatten transparent areas onto white
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, (255, 255, 255))
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    elif image.mode not in ("RGB", "L" if image_format == "JPEG" else "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    output = io.BytesIO()
+    image.save(output, image_format, quality=quality)
+    encoded = output.getvalue()
+    output_type, extension = OUTPUT_TYPES[image_format]
+
+    if len(encoded) >= len(data) and not (oriented or resized):
+        encoded, output_type = data, content_type
+    else:
+        file_name = os.path.splitext(file_name)[0] + extension
+    return PreprocessedImage(encoded, file_name, output_type, len(data), original_size, image.size,
+                             time.perf_counter() - start)
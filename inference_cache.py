@@ -0,0 +1,178 @@
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import streamlit as st
+from bedrock_streaming import BedrockStream
+
+INFERENCE_CACHE_ENABLED = os.environ.get("INFERENCE_CACHE_ENABLED", "1") == "1"
+# Calls marked phi=True carry patient text, and the apps promise it is deleted
+# after processing. They are not cached unless this is set, and even then
+# only in memory, never in the SQLite tier.
+INFERENCE_CACHE_PHI = os.environ.get("INFERENCE_CACHE_PHI", "0") == "1"
+# Upper bound on serialized responses kept in memory
+INFERENCE_CACHE_MAX_BYTES = int(os.environ.get("INFERENCE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Optional SQLite tier that survives restarts; unset keeps the cache in memory only
+INFERENCE_CACHE_DB = os.environ.get("INFERENCE_CACHE_DB")
+INFERENCE_CACHE_TTL = float(os.environ.get("INFERENCE_CACHE_TTL", str(24 * 60 * 60)))
+
+
+# Function to build a content address for one inference request
+def cache_key(operation, identity, request):
+    material = json.dumps([operation, identity, request], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# Failed calls come back as None or a tuple of Nones; those are never cached
+def is_failure(value):
+    if value is None:
+        return True
+    return isinstance(value, tuple) and all(item is None for item in value)
+
+
+def serialize(value):
+    return json.dumps({"tuple": isinstance(value, tuple), "value": value})
+
+
+def deserialize(payload):
+    data = json.loads(payload)
+    return tuple(data["value"]) if data["tuple"] else data["value"]
+
+
+# Two-tier response cache: a size-bounded LRU in memory in front of an
+# optional SQLite table with a TTL. Values are stored serialized, so every hit
+# hands out a fresh copy that callers may mutate freely.
+class InferenceCache:
+    def __init__(self, max_bytes=INFERENCE_CACHE_MAX_BYTES, db_path=INFERENCE_CACHE_DB, ttl_seconds=INFERENCE_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bytes_saved": 0, "evictions": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS inference_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _remember(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= len(old)
+        self._entries[key] = payload
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                self.stats["bytes_saved"] += len(payload)
+                return payload
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM inference_cache WHERE key = ? AND created_at >= ?",
+                    (key, time.time() - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    payload = row[0]
+                    self._remember(key, payload)
+                    self.stats["disk_hits"] += 1
+                    self.stats["bytes_saved"] += len(payload)
+                    return payload
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, payload, persist=True):
+        with self._lock:
+            self._remember(key, payload)
+            if persist and self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, payload, time.time())
+                )
+                self._db.commit()
+
+    def purge_expired(self):
+        if self._db is None:
+            return 0
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM inference_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._db.commit()
+            return cursor.rowcount
+
+    def hit_rate(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def summary(self):
+        with self._lock:
+            return dict(self.stats, hit_rate=self.hit_rate(), memory_bytes=self._size, entries=len(self._entries))
+
+
+# Process-wide inference cache, shared by every browser session
+@st.cache_resource
+def get_inference_cache():
+    return InferenceCache()
+
+
+# Function to describe the cache's effect in one line, for a caption
+def summary_caption():
+    if not INFERENCE_CACHE_ENABLED:
+        return "Response cache: off"
+    summary = get_inference_cache().summary()
+    lookups = summary["memory_hits"] + summary["disk_hits"] + summary["misses"]
+    return (f"Response cache: {summary['hit_rate']:.0%} hit rate over {lookups} lookups, "
+            f"{summary['bytes_saved'] / 1e6:.2f} MB saved, {summary['entries']} entries"
+            f"{'' if INFERENCE_CACHE_PHI else '; patient data is not cached'}")
+
+
+# Decorator memoizing an inference function on its arguments. `identity`
+# carries what the arguments do not: model ID or endpoint ARN, guardrail
+# version, language code. Together they fix the request body sent to AWS.
+# With stream=True a hit is replayed as a finished BedrockStream, and a miss
+# is stored once its stream has been read to the end without an error.
+# phi=True marks calls on protected health information: they bypass the
+# cache unless INFERENCE_CACHE_PHI is set, and are kept in memory only.
+def memoized(operation, phi=False, **identity):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not INFERENCE_CACHE_ENABLED or (phi and not INFERENCE_CACHE_PHI):
+                return func(*args, **kwargs)
+            cache = get_inference_cache()
+            key = cache_key(operation, identity, {"args": args, "kwargs": kwargs})
+            stream = kwargs.get("stream")
+            payload = cache.get(key)
+            if payload is not None:
+                value = deserialize(payload)
+                return BedrockStream.replay(value) if stream else value
+            value = func(*args, **kwargs)
+            if stream and isinstance(value, BedrockStream):
+                def remember(finished):
+                    if finished.text:
+                        cache.put(key, serialize(finished.snapshot()), persist=not phi)
+                value.add_done_callback(remember)
+            elif not stream and not is_failure(value):
+                cache.put(key, serialize(value), persist=not phi)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,176 @@
+# Headless bulk run of the medical classifier pipeline: moderation, credit
+# card redaction, classify_document and then the fairness audit, the same
+# steps as the Streamlit page. Rows are streamed in chunks from CSV or Parquet
+# and classified on a bounded worker pool behind a rate limiter. Every
+# finished chunk is written as its own Parquet part and checkpointed, so an
+# interrupted run resumes where it stopped.
+#
+#   python medical_batch.py notes.parquet --output runs/notes \
+#       --text-column text --group-columns age race gender --label-column specialty
+import argparse
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from fairness import audit
+from rate_limit import RateLimitedClient, RateLimiter
+
+# Results land in <output>/parts as a plain Parquet dataset
+PARTS_DIR = "parts"
+CHECKPOINT_FILE = "checkpoint.json"
+FAIRNESS_FILE = "fairness.json"
+
+
+# Function to stream an input file as DataFrame chunks, skipping rows already
+# done. Rows are counted as parsed records, not file lines, since a quoted CSV
+# field may span several lines.
+def iter_input_chunks(path, chunk_size, skip_rows=0):
+    if path.endswith(".parquet"):
+        seen = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            start = max(0, skip_rows - seen)
+            seen += batch.num_rows
+            if start < batch.num_rows:
+                yield batch.slice(start).to_pandas()
+    else:
+        seen = 0
+        for chunk in pd.read_csv(path, chunksize=chunk_size):
+            start = max(0, skip_rows - seen)
+            seen += len(chunk)
+            if start < len(chunk):
+                yield chunk.iloc[start:]
+
+
+def read_checkpoint(output_dir):
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT_FILE), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"rows_done": 0, "parts": 0}
+
+
+def write_checkpoint(output_dir, checkpoint):
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir)
+    with os.fdopen(fd, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, os.path.join(output_dir, CHECKPOINT_FILE))
+
+
+# One row through moderation -> redaction -> classification. Rate limiting
+# belongs to the Comprehend client given here and to the moderation chain's
+# (see build_pipeline), so every API call takes a token, however many calls
+# the chain makes for a row.
+class MedicalPipeline:
+    def __init__(self, comprehend_client, moderation_chain, endpoint_arn, redact):
+        self.comprehend_client = comprehend_client
+        self.moderation_chain = moderation_chain
+        self.endpoint_arn = endpoint_arn
+        self.redact = redact
+
+    def classify(self, text):
+        try:
+            moderation_result = self.moderation_chain.invoke({"input": text})
+            redacted_text = self.redact(moderation_result["output"])
+            response = self.comprehend_client.classify_document(Text=redacted_text, EndpointArn=self.endpoint_arn)
+            best = max(response["Labels"], key=lambda label: label["Score"])
+        except Exception as e:
+            # Moderation refusals, API errors and empty responses are results too, not crashes
+            return {"redacted_text": None, "predicted_label": None, "score": np.nan,
+                    "labels": None, "error": f"{type(e).__name__}: {e}"}
+
+        return {"redacted_text": redacted_text, "predicted_label": best["Name"], "score": best["Score"],
+                "labels": json.dumps(response["Labels"]), "error": None}
+
+
+# Function to classify every row of the input and write Parquet parts.
+# Returns the number of rows processed in this run.
+def run_batch(input_path, output_dir, pipeline, text_column, keep_columns=(), chunk_size=500, concurrency=8):
+    os.makedirs(os.path.join(output_dir, PARTS_DIR), exist_ok=True)
+    checkpoint = read_checkpoint(output_dir)
+    processed = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for chunk in iter_input_chunks(input_path, chunk_size, checkpoint["rows_done"]):
+            # map() keeps input order; the pool bounds how many calls are in flight
+            results = list(pool.map(pipeline.classify, chunk[text_column].fillna("").astype(str)))
+            frame = chunk[list(keep_columns)].reset_index(drop=True)
+            frame["row"] = np.arange(checkpoint["rows_done"], checkpoint["rows_done"] + len(chunk))
+            frame = pd.concat([frame, pd.DataFrame(results)], axis=1)
+
+            part_path = os.path.join(output_dir, PARTS_DIR, f"part-{checkpoint['parts']:05d}.parquet")
+            frame.to_parquet(part_path, index=False)
+            checkpoint = {"rows_done": checkpoint["rows_done"] + len(chunk), "parts": checkpoint["parts"] + 1}
+            write_checkpoint(output_dir, checkpoint)
+            processed += len(chunk)
+
+    return processed
+
+
+# Function to audit the written results. Rows with the favorable label
+# predicted count as positives; without a label column only selection
+# metrics carry meaning.
+def audit_results(output_dir, group_columns, label_column=None, favorable_label=None, privileged=None, n_boot=1000):
+    columns = ["predicted_label"] + list(group_columns) + ([label_column] if label_column else [])
+    results = pd.read_parquet(os.path.join(output_dir, PARTS_DIR), columns=columns)
+    results = results[results["predicted_label"].notna()]
+    if results.empty:
+        return None
+
+    favorable_label = favorable_label or results["predicted_label"].mode().iloc[0]
+    predictions = (results["predicted_label"] == favorable_label).to_numpy(dtype=np.int64)
+    if label_column:
+        labels = (results[label_column] == favorable_label).to_numpy(dtype=np.int64)
+    else:
+        labels = np.zeros(len(results), dtype=np.int64)
+    attributes = [results[column].astype(str).to_numpy() for column in group_columns]
+    report = audit(predictions, labels, *attributes, privileged=privileged, n_boot=n_boot)
+
+    summary = dict(report.to_dict(), **{"Favorable Label": favorable_label, "Rows": int(len(results))})
+    with open(os.path.join(output_dir, FAIRNESS_FILE), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def build_pipeline(rate):
+    # Imported here so --help works without AWS configuration
+    from medical_classifier import CLASSIFIER_ENDPOINT_ARN, build_moderation_config, comprehend_client, redact_credit_card
+    from pii_prescreen import PrescreenedModerationChain
+
+    # One limiter for every Comprehend call: the chain's PII and prompt-safety
+    # calls as well as classify_document
+    client = RateLimitedClient(comprehend_client, RateLimiter(rate, burst=max(1, int(rate or 1))))
+    moderation_chain = PrescreenedModerationChain(build_moderation_config, client=client)
+    return MedicalPipeline(client, moderation_chain, CLASSIFIER_ENDPOINT_ARN, redact_credit_card)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify a CSV/Parquet corpus and audit fairness.")
+    parser.add_argument("input", help="CSV or Parquet file with one document per row")
+    parser.add_argument("--output", required=True, help="directory for Parquet parts, checkpoint and fairness report")
+    parser.add_argument("--text-column", default="text")
+    parser.add_argument("--group-columns", nargs="+", default=[], help="protected attribute columns, e.g. age race gender")
+    parser.add_argument("--label-column", help="column with the true specialty, if known")
+    parser.add_argument("--favorable-label", help="specialty treated as the positive outcome (default: most predicted)")
+    parser.add_argument("--privileged", nargs="+", help="privileged group, one value per group column")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="Comprehend requests per second across all workers")
+    parser.add_argument("--bootstrap", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    keep_columns = list(args.group_columns) + ([args.label_column] if args.label_column else [])
+    processed = run_batch(args.input, args.output, build_pipeline(args.rate), args.text_column,
+                          keep_columns, args.chunk_size, args.concurrency)
+    print(f"Classified {processed} rows into {args.output}")
+
+    if args.group_columns:
+        summary = audit_results(args.output, args.group_columns, args.label_column, args.favorable_label,
+                                args.privileged, args.bootstrap)
+        print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,80 @@
 import streamlit as st
-import re
-import numpy as np
-from langchain_experimental.comprehend_moderation import (
-    AmazonComprehendModerationChain,
-    BaseModerationConfig,
-    ModerationPiiConfig,
-    ModerationPromptSafetyConfig
-)
-import boto3
-import json
-
-# Initialize the Amazon Comprehend Moderation Chain
-pii_config = ModerationPiiConfig(
-    labels=["SSN", "PHONE", "EMAIL"],
-    redact=True, 
-    mask_character="X"
-)
-prompt_safety_config = ModerationPromptSafetyConfig(threshold=0.8)
-
-moderation_config = BaseModerationConfig(filters=[pii_config, prompt_safety_config])
-comprehend_moderation = AmazonComprehendModerationChain(moderation_config=moderation_config)
-
-# Custom function to manually redact credit card numbers
+from aws_clients import get_client
+from inference_cache import memoized
+from enrichment_dispatch import PayloadTooLarge, get_enrichment_dispatcher
+from card_redaction import redact_card_numbers
+from pii_prescreen import PrescreenedModerationChain
+
+# Amazon Comprehend moderation settings. Built on first use: importing
+# langchain_experimental takes longer than the rest of the app's startup.
+def build_moderation_config():
+    from langchain_experimental.comprehend_moderation import (
+        BaseModerationConfig,
+        ModerationPiiConfig,
+        ModerationPromptSafetyConfig
+    )
+
+    pii_config = ModerationPiiConfig(
+        labels=["SSN", "PHONE", "EMAIL"],
+        redact=True, 
+        mask_character="X"
+    )
+    prompt_safety_config = ModerationPromptSafetyConfig(threshold=0.8)
+
+    return BaseModerationConfig(filters=[pii_config, prompt_safety_config])
+
+# Custom function to manually redact credit card numbers (Luhn-valid only,
+# separators kept in place)
 def redact_credit_card(text):
-    cc_pattern = r'\b(?:\d[ -]*?){13,16}\b'
-    return re.sub(cc_pattern, 'XXXXXXXXXXXXXXXX', text)
+    return redact_card_numbers(text)
 
-# Updated fairness metric function with only Disparate Impact and Equal Opportunity Difference
+# Fairness metrics for the favorable label, privileged vs unprivileged rows,
+# from one pass of per-group confusion counts
+# Rates with an empty denominator count as 0 (see fairness.binary_split_metrics).
+# Raises ValueError if the three sequences differ in length.
 def calculate_fairness_metrics(predictions, true_labels, protected_group, privileged_value, favorable_label):
+    import numpy as np
+    from fairness import binary_split_metrics
+
+    n = len(predictions)
+    if len(true_labels) != n or len(protected_group) != n:
+        raise ValueError(f"predictions, true_labels and protected_group differ in length "
+                         f"({n}, {len(true_labels)}, {len(protected_group)})")
     # Generate binary predictions (1 if favorable label, 0 otherwise)
-    binary_predictions = [1 if pred['Name'] == favorable_label else 0 for pred in predictions]
-    
-    # Calculate true positive, false positive, true negative, and false negative rates
-    tp = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 1 and true == 1])
-    fp = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 1 and true == 0])
-    tn = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 0 and true == 0])
-    fn = sum([1 for pred, true in zip(binary_predictions, true_labels) if pred == 0 and true == 1])
-
-    # Calculate rates for privileged and unprivileged groups
-    privileged_group_indices = [i for i, attr in enumerate(protected_group) if attr == privileged_value]
-    unprivileged_group_indices = [i for i, attr in enumerate(protected_group) if attr != privileged_value]
-    
-    def calculate_group_rates(indices):
-        tp_group = sum([1 for i in indices if binary_predictions[i] == 1 and true_labels[i] == 1])
-        fp_group = sum([1 for i in indices if binary_predictions[i] == 1 and true_labels[i] == 0])
-        tn_group = sum([1 for i in indices if binary_predictions[i] == 0 and true_labels[i] == 0])
-        fn_group = sum([1 for i in indices if binary_predictions[i] == 0 and true_labels[i] == 1])
-        
-        tpr = tp_group / (tp_group + fn_group) if tp_group + fn_group > 0 else 0
-        rate = (tp_group + fp_group) / len(indices) if len(indices) > 0 else 0
-        return tpr, rate
-   
-    tpr_priv, rate_priv = calculate_group_rates(privileged_group_indices)
-    tpr_unpriv, rate_unpriv = calculate_group_rates(unprivileged_group_indices)
-    
-    # Fairness metrics
-    # disparate_impact = rate_unpriv / rate_priv if rate_priv > 0 else float('inf')
-    equal_opportunity_diff = tpr_unpriv - tpr_priv
-    
-    return {
-        
-        "Equal Opportunity Difference": equal_opportunity_diff
-    }
+    binary_predictions = np.fromiter((pred['Name'] == favorable_label for pred in predictions), dtype=np.int64, count=n)
+    privileged_rows = (np.asarray(protected_group) == privileged_value).astype(np.int64)
+    return binary_split_metrics(privileged_rows, binary_predictions, np.asarray(true_labels))
+
+# Protected attribute values offered in the sidebar
+AGE_GROUPS = ["Young", "Middle-aged", "Elderly"]
+RACE_GROUPS = ["Asian", "Black", "White", "Other"]
+GENDER_GROUPS = ["Male", "Female", "Other"]
+FAIRNESS_ATTRIBUTES = (("Age", tuple(AGE_GROUPS)), ("Race", tuple(RACE_GROUPS)), ("Gender", tuple(GENDER_GROUPS)))
 
 # AWS Clients
-comprehend_client = boto3.client('comprehend')
-lambda_client = boto3.client('lambda')
+comprehend_client = get_client('comprehend')
+
+# Clear SSN/PHONE/EMAIL formats are redacted locally; the Amazon Comprehend
+# Moderation Chain is only built and called for ambiguous text
+comprehend_moderation = PrescreenedModerationChain(build_moderation_config, client=comprehend_client)
+
+CLASSIFIER_ENDPOINT_ARN = "arn:aws:comprehend:us-west-2:913524913171:document-classifier-endpoint/medical-specialty-classifier-endpoint"
+
+# Function to classify text with the custom medical specialty endpoint
+@memoized("comprehend.classify_document", phi=True, endpoint_arn=CLASSIFIER_ENDPOINT_ARN)
+def classify_document(text):
+    return comprehend_client.classify_document(
+        Text=text,
+        EndpointArn=CLASSIFIER_ENDPOINT_ARN
+    )
 
 # Streamlit App
-st.title("Medical Data Classifier with Responsible AI")
+def main():
+    st.title("Medical Data Classifier with Responsible AI")
 
-# Section for Responsible AI Principles
-st.header("Responsible AI Enhancements")
-st.markdown("""
+    # Section for Responsible AI Principles
+    st.header("Responsible AI Enhancements")
+    st.markdown("""
 This application follows Responsible AI principles by:
 
 1. **Privacy**: Your data is handled securely, with actions logged and data deleted after processing.
@@ -80,90 +82,102 @@ This application follows Responsible AI principles by:
 3. **Explainability**: We offer detailed explanations for AI decisions, including the context and limitations of the model's predictions.
 """)
 
-# Consent and Data Usage Transparency
-st.subheader("Data Usage Consent")
-st.markdown("By using this application, you consent to the processing of your medical data for classification and analysis purposes. Your data will be handled securely and ethically.")
-consent_given = st.checkbox("I consent to the use of my data")
+    # Consent and Data Usage Transparency
+    st.subheader("Data Usage Consent")
+    st.markdown("By using this application, you consent to the processing of your medical data for classification and analysis purposes. Your data will be handled securely and ethically.")
+    consent_given = st.checkbox("I consent to the use of my data")
 
-# Initialize session state to hold the input text
-if "input_text" not in st.session_state:
-    st.session_state.input_text = ""
+    # Initialize session state to hold the input text
+    if "input_text" not in st.session_state:
+        st.session_state.input_text = ""
 
-# Text area for patient or user data
-input_text = st.text_area("Enter medical text to check:", height=200, value=st.session_state.input_text)
+    # Text area for patient or user data
+    input_text = st.text_area("Enter medical text to check:", height=200, value=st.session_state.input_text)
 
-# Update session state when text is entered
-st.session_state.input_text = input_text
+    # Update session state when text is entered
+    st.session_state.input_text = input_text
 
-# Add sidebar for protected attribute selection
-age_group = st.sidebar.selectbox("Select Age Group", ["Young", "Middle-aged", "Elderly"])
-race_group = st.sidebar.selectbox("Select Race Group", ["Asian", "Black", "White", "Other"])
-gender_group = st.sidebar.selectbox("Select Gender Group", ["Male", "Female", "Other"])
+    # Add sidebar for protected attribute selection
+    age_group = st.sidebar.selectbox("Select Age Group", AGE_GROUPS)
+    race_group = st.sidebar.selectbox("Select Race Group", RACE_GROUPS)
+    gender_group = st.sidebar.selectbox("Select Gender Group", GENDER_GROUPS)
 
-# Button to trigger moderation checks and medical processing
-if st.button("Process Text") and consent_given:
-    if st.session_state.input_text:
-        try:
-            # Invoke the moderation chain with the correct key 'input'
-            moderation_result = comprehend_moderation.invoke({"input": st.session_state.input_text})
+    # Button to trigger moderation checks and medical processing
+    if st.button("Process Text") and consent_given:
+        if st.session_state.input_text:
+            try:
+                # Invoke the moderation chain with the correct key 'input'
+                moderation_result = comprehend_moderation.invoke({"input": st.session_state.input_text})
             
-            if moderation_result and 'output' in moderation_result:
-                moderated_text = moderation_result['output']
-                
-                # Manually redact credit card numbers
-                redacted_text = redact_credit_card(moderated_text)
+                if moderation_result and 'output' in moderation_result:
+                    moderated_text = moderation_result['output']
                 
-                st.success("Moderation and redaction successful.")
-                st.subheader("Moderated and Redacted Text")
-                st.write(redacted_text)
+                    # Manually redact credit card numbers
+                    redacted_text = redact_credit_card(moderated_text)
                 
-                # Invoke the custom Comprehend classification model
-                custom_response = comprehend_client.classify_document(
-                    Text=redacted_text,
-                    EndpointArn="arn:aws:comprehend:us-west-2:913524913171:document-classifier-endpoint/medical-specialty-classifier-endpoint"
-                )
+                    st.success("Moderation and redaction successful.")
+                    st.subheader("Moderated and Redacted Text")
+                    st.write(redacted_text)
                 
-                # Find the label with the maximum score
-                max_label = max(custom_response['Labels'], key=lambda x: x['Score'])
+                    # Invoke the custom Comprehend classification model
+                    custom_response = classify_document(redacted_text)
                 
-                st.subheader("Medical Specialty Classification")
-                st.json(custom_response)
-                st.subheader(f"**Most Likely Specialty:** {max_label['Name']} (Score: {max_label['Score']:.4f})")
+                    # Find the label with the maximum score
+                    max_label = max(custom_response['Labels'], key=lambda x: x['Score'])
                 
-                # Simulate protected attribute data 
-                simulated_true_labels = [0, 1, 0, 1]
-                simulated_race_group = [0 if race_group == "Asian" else 1 if race_group == "Black" else 2 if race_group == "White" else 3 for _ in custom_response['Labels']]
+                    st.subheader("Medical Specialty Classification")
+                    st.json(custom_response)
+                    st.subheader(f"**Most Likely Specialty:** {max_label['Name']} (Score: {max_label['Score']:.4f})")
                 
-                # Calculate and display fairness metrics
-                fairness_metrics = calculate_fairness_metrics(
-                    custom_response['Labels'], 
-                    simulated_true_labels,
-                    simulated_race_group,
-                    privileged_value=2,  # Example: "White" as privileged group
-                    favorable_label=max_label['Name'] 
-                )
-                st.subheader("Fairness Metrics")
-                st.json(fairness_metrics)
+                    # Simulate protected attribute data, one true label per returned label
+                    simulated_true_labels = [index % 2 for index in range(len(custom_response['Labels']))]
+                    simulated_race_group = [0 if race_group == "Asian" else 1 if race_group == "Black" else 2 if race_group == "White" else 3 for _ in custom_response['Labels']]
                 
+                    # Calculate and display fairness metrics
+                    fairness_metrics = calculate_fairness_metrics(
+                        custom_response['Labels'], 
+                        simulated_true_labels,
+                        simulated_race_group,
+                        privileged_value=2,  # Example: "White" as privileged group
+                        favorable_label=max_label['Name'] 
+                    )
+                    st.subheader("Fairness Metrics")
+                    st.json(fairness_metrics)
+
+                    # Running counts across all sessions, persisted between restarts
+                    from fairness_accumulator import get_fairness_accumulator
+                    fairness_accumulator = get_fairness_accumulator(FAIRNESS_ATTRIBUTES)
+                    fairness_accumulator.record((age_group, race_group, gender_group), max_label['Name'])
+                    st.subheader("Fairness Over Time")
+                    st.caption(f"How often {max_label['Name']} is predicted per race group, over {fairness_accumulator.total()} classifications")
+                    st.json(fairness_accumulator.report(max_label['Name'], by=["Race"], privileged=("White",)).to_dict())
                 
-                # Construct a lambda payload without any breast cancer-specific data
-                lambda_payload = {
-                    "input_text": redacted_text
-                }
-
-                lambda_response = lambda_client.invoke(
-                    FunctionName='Enriched-Comprehend-Medical-CallCMandCustomCode-CTKtvFTHo2KT',
-                    InvocationType='RequestResponse',
-                    Payload=json.dumps(lambda_payload)
-                )
                 
-                # Do not display the Lambda function response
+                    # Construct a lambda payload without any breast cancer-specific data
+                    lambda_payload = {
+                        "input_text": redacted_text
+                    }
+
+                    # Enrichment runs in the background; its response is never displayed
+                    enrichment = get_enrichment_dispatcher()
+                    try:
+                        if not enrichment.submit(lambda_payload):
+                            st.warning("Enrichment queue is full; this document was not sent for enrichment.")
+                    except PayloadTooLarge as e:
+                        st.warning(f"This document is too large to send for enrichment: {e}")
+                    enrichment_metrics = enrichment.metrics()
+                    st.caption(f"Enrichment queue depth: {enrichment_metrics['queue_depth']}, "
+                               f"last dispatch lag: {enrichment_metrics['last_lag']:.2f}s, "
+                               f"failed: {enrichment_metrics['failed']}")
                 
-            else:
-                st.warning("No output generated. There may be an issue with the moderation chain.")
-        except Exception as e:
-            st.error(f"Medically sensitive term Detected: {str(e)}")
-    else:
-        st.warning("Please enter some text to check.")
-elif not consent_given:
-    st.warning("Please provide your consent to proceed.")
+                else:
+                    st.warning("No output generated. There may be an issue with the moderation chain.")
+            except Exception as e:
+                st.error(f"Medically sensitive term Detected: {str(e)}")
+        else:
+            st.warning("Please enter some text to check.")
+    elif not consent_given:
+        st.warning("Please provide your consent to proceed.")
+
+if __name__ == "__main__":
+    main()
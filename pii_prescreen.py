@@ -0,0 +1,175 @@
+import os
+import re
+import threading
+
+# Formats masked locally without asking Comprehend. The lookarounds keep a
+# match from starting or ending inside a longer token (so each token is
+# scanned once) or next to a country code or area code that Comprehend would
+# include in the entity.
+LOCAL_PII_PATTERNS = {
+    "SSN": re.compile(r'(?<![\w+().-])(?<![0-9+)] )[0-9]{3}-[0-9]{2}-[0-9]{4}(?![\w-]|\.[0-9])'),
+    "PHONE": re.compile(r'(?<![\w+().-])(?<![0-9+)] )[0-9]{3}-[0-9]{3}-[0-9]{4}(?![\w-]|\.[0-9]| ?(?:x|ext)\b)'),
+    "EMAIL": re.compile(r'(?<![\w.%+-])[\w.%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}(?![\w@-]|\.\w)'),
+}
+# The SSN and PHONE formats also fit part numbers, order IDs and the like,
+# which Comprehend does not label. A match is only masked locally when a cue
+# word for its label comes shortly before it in the same sentence; a match
+# without one is left for Comprehend. Email addresses need no cue.
+PII_CUES = {
+    "SSN": re.compile(r'\b(?:ssn\b|ss#|social security\b)', re.IGNORECASE),
+    "PHONE": re.compile(r'\b(?:phone|call|called|tel|telephone|mobile|cell|fax|contact|reach)\b', re.IGNORECASE),
+}
+CUE_WINDOW = 40
+# An identifier word after the cue means the number names something else
+# ("call about order 555-123-4567"), which Comprehend does not label
+IDENTIFIER_WORDS = re.compile(
+    r'\b(?:order|part|lot|batch|invoice|ref|reference|id|account|claim|case|policy|serial|model|item|ticket|'
+    r'confirmation|tracking)\b', re.IGNORECASE
+)
+SENTENCE_END = re.compile(r'[.;!?\n](?=\s)')
+# Comprehend scores cued SSN/PHONE and well-formed EMAIL entities at least
+# this high, so a local match stands for an entity any ModerationPiiConfig
+# threshold up to this value keeps. A filter with a higher threshold may drop
+# entities Comprehend is less sure of, so its text goes through the chain.
+LOCAL_PII_MAX_THRESHOLD = float(os.environ.get("PII_PRESCREEN_MAX_THRESHOLD", "0.9"))
+# Left over after the local matches, these may still be PII in a format the
+# patterns do not cover (7+ digits with separators, a stray '@'), so the text
+# goes to Comprehend
+AMBIGUOUS_PII = re.compile(r'@|[0-9](?:[ ().+-]{0,3}[0-9]){6,}')
+PROMPT_SAFETY_ENDPOINT = "document-classifier-endpoint/prompt-safety"
+
+
+# Function to tell whether a cue word for label comes shortly before begin,
+# in the same sentence, with no identifier word between it and the match
+def has_cue(text, label, begin):
+    cue = PII_CUES.get(label)
+    if cue is None:
+        return True
+    window = text[max(0, begin - CUE_WINDOW):begin]
+    sentence_ends = [match.end() for match in SENTENCE_END.finditer(window)]
+    cues = list(cue.finditer(window, sentence_ends[-1] if sentence_ends else 0))
+    return bool(cues) and IDENTIFIER_WORDS.search(window, cues[-1].end()) is None
+
+
+# Function to find the local PII spans in text. Returns a list of
+# (label, begin, end) in text order, or None if the text needs Comprehend.
+def prescreen_pii(text, labels):
+    spans = []
+    for label in labels:
+        for match in LOCAL_PII_PATTERNS[label].finditer(text):
+            if not has_cue(text, label, match.start()):
+                return None
+            spans.append((label, match.start(), match.end()))
+    spans.sort(key=lambda span: span[1])
+
+    cursor = 0
+    for _, begin, end in spans + [(None, len(text), len(text))]:
+        if begin < cursor or AMBIGUOUS_PII.search(text, cursor, begin):
+            return None
+        cursor = end
+    return spans
+
+
+# Function to mask spans exactly as the langchain moderation chain does with
+# Comprehend's offsets, including masking one character past each entity
+def mask_spans(text, spans, mask_character):
+    for _, begin, end in spans:
+        text = text[:begin] + mask_character * (end - begin + 1) + text[end + 1:]
+    return text
+
+
+# Drop-in for AmazonComprehendModerationChain.invoke() with a local fast
+# path. Text whose SSN/PHONE/EMAIL spans are all in clear, cued formats is
+# masked here and only the prompt-safety classification goes to Comprehend.
+# Anything ambiguous, a PII filter with a threshold above
+# LOCAL_PII_MAX_THRESHOLD, and any filter other than PII redaction and prompt
+# safety go through the real chain. build_config returns the
+# BaseModerationConfig; it and the chain are built on first use, so
+# langchain_experimental is not imported until text is moderated.
+#
+# The two paths can still differ where Comprehend disagrees with the local
+# rules: a cued match that Comprehend scores below the filter's threshold or
+# does not label at all is masked here but not by the chain, and a match the
+# lookarounds accept but Comprehend extends past (an unusual prefix or
+# suffix) is masked with the shorter span. Either way the local path masks
+# at least what it matched; tests/test_pii_prescreen.py pins this down.
+class PrescreenedModerationChain:
+    def __init__(self, build_config, client):
+        self.build_config = build_config
+        self.client = client
+        self.stats = {"local": 0, "comprehend": 0}
+        self._config = None
+        self._chain = None
+        self._lock = threading.Lock()
+
+    def moderation_config(self):
+        with self._lock:
+            if self._config is None:
+                self._config = self.build_config()
+        return self._config
+
+    def chain(self):
+        moderation_config = self.moderation_config()
+        with self._lock:
+            if self._chain is None:
+                from langchain_experimental.comprehend_moderation import AmazonComprehendModerationChain
+                self._chain = AmazonComprehendModerationChain(moderation_config=moderation_config,
+                                                              client=self.client)
+        return self._chain
+
+    # Function to list the configured filters as ("pii" | "prompt_safety", config),
+    # or None if any of them needs the real chain
+    def _local_filters(self):
+        from langchain_experimental.comprehend_moderation import ModerationPiiConfig, ModerationPromptSafetyConfig
+
+        filters = []
+        for moderation_filter in self.moderation_config().filters:
+            if isinstance(moderation_filter, ModerationPiiConfig):
+                if not (moderation_filter.redact and moderation_filter.labels
+                        and set(moderation_filter.labels) <= set(LOCAL_PII_PATTERNS)
+                        and moderation_filter.threshold <= LOCAL_PII_MAX_THRESHOLD):
+                    return None
+                filters.append(("pii", moderation_filter))
+            elif isinstance(moderation_filter, ModerationPromptSafetyConfig):
+                filters.append(("prompt_safety", moderation_filter))
+            else:
+                return None
+        return filters
+
+    # Function to run the prompt-safety check the chain would run, on the same text
+    def check_prompt_safety(self, text, threshold):
+        from langchain_experimental.comprehend_moderation.base_moderation_exceptions import ModerationPromptSafetyError
+
+        endpoint_arn = f"arn:aws:comprehend:{self.client.meta.region_name}:aws:{PROMPT_SAFETY_ENDPOINT}"
+        response = self.client.classify_document(Text=text, EndpointArn=endpoint_arn)
+        if any(result["Name"] == "UNSAFE_PROMPT" and result["Score"] >= threshold for result in response["Classes"]):
+            raise ModerationPromptSafetyError
+
+    def invoke(self, inputs):
+        text = inputs["input"]
+        filters = self._local_filters()
+
+        # Filters run in order on the previous filter's output, like the chain.
+        # Every PII filter is screened before any Comprehend call is made.
+        output = text
+        safety_checks = []
+        for kind, moderation_filter in filters or []:
+            if kind == "pii":
+                spans = prescreen_pii(output, moderation_filter.labels)
+                if spans is None:
+                    filters = None
+                    break
+                output = mask_spans(output, spans, moderation_filter.mask_character)
+            else:
+                safety_checks.append((output, moderation_filter.threshold))
+
+        if filters is None:
+            with self._lock:
+                self.stats["comprehend"] += 1
+            return self.chain().invoke(inputs)
+
+        with self._lock:
+            self.stats["local"] += 1
+        for checked_text, threshold in safety_checks:
+            self.check_prompt_safety(checked_text, threshold)
+        return {"input": text, "output": output}
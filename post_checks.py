@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import streamlit as st
+
+
+# One independent check on a generated answer: `run` calls AWS on a worker
+# thread and returns a value or raises; it must not touch st.*. `render`
+# draws its section of the page from that value on the script thread, so
+# errors a check wants shown (partial failures) travel inside the value.
+class PostCheck:
+    def __init__(self, name, run, render):
+        self.name = name
+        self.run = run
+        self.render = render
+
+
+class CheckResult:
+    def __init__(self, name, value=None, error=None, elapsed=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+
+# Everything the post-generation checks produced, plus how long each took
+class PostCheckReport:
+    def __init__(self):
+        self.results = {}
+        self.total_time = 0.0
+
+    def timings(self):
+        return {name: result.elapsed for name, result in self.results.items()}
+
+    def summary(self):
+        parts = ", ".join(f"{name} {elapsed:.2f} s" for name, elapsed in self.timings().items())
+        return f"Checks finished in {self.total_time:.2f} s ({parts})"
+
+
+# Function to run the checks in parallel. Each check gets a container reserved
+# in the order given, so sections keep their place on the page while each one
+# is filled in as soon as its own result lands. Only this loop, on the script
+# thread, calls st.*; a check that raised gets its error in its own container.
+def run_post_checks(checks, max_workers=None):
+    containers = [st.container() for _ in checks]
+    report = PostCheckReport()
+    started_at = time.perf_counter()
+
+    def timed(check):
+        check_started = time.perf_counter()
+        try:
+            return CheckResult(check.name, value=check.run(), elapsed=time.perf_counter() - check_started)
+        except Exception as e:
+            return CheckResult(check.name, error=e, elapsed=time.perf_counter() - check_started)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(checks))) as pool:
+        futures = {pool.submit(timed, check): (check, container) for check, container in zip(checks, containers)}
+        for future in as_completed(futures):
+            check, container = futures[future]
+            result = future.result()
+            report.results[check.name] = result
+            with container:
+                if result.error is not None:
+                    st.error(f"{check.name} failed: {result.error}")
+                else:
+                    check.render(result.value)
+
+    report.total_time = time.perf_counter() - started_at
+    # Report in page order rather than completion order
+    report.results = {check.name: report.results[check.name] for check in checks}
+    return report
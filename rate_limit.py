@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+# Thread-safe token bucket: at most `rate` acquisitions per second on average,
+# with bursts of up to `burst`. A rate of None or 0 disables limiting.
+class RateLimiter:
+    def __init__(self, rate, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self.sleep(wait)
+
+    # Function to take a token only if one is free now, for callers that must
+    # not sleep
+    def try_acquire(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+        return False
+
+
+# A boto3 client whose API calls each take one token from a shared limiter,
+# so code that makes several calls per item (a moderation chain, say) is
+# limited per request rather than per item. Anything else is passed through.
+class RateLimitedClient:
+    def __init__(self, client, rate_limiter):
+        self._client = client
+        self._rate_limiter = rate_limiter
+        self._operations = set(client.meta.method_to_api_mapping)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in self._operations:
+            return attribute
+
+        def call(*args, **kwargs):
+            self._rate_limiter.acquire()
+            return attribute(*args, **kwargs)
+        return call
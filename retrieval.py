@@ -0,0 +1,190 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+import numpy as np
+import streamlit as st
+
+# Documents up to this many tokens go into the prompt whole, so questions
+# about every record ("how many patients...", "list all...") see them all;
+# retrieval only starts above it
+RETRIEVAL_FULL_DOCUMENT_TOKENS = int(os.environ.get("RETRIEVAL_FULL_DOCUMENT_TOKENS", "100000"))
+# How many records a retrieved prompt may carry, and roughly how many tokens they may use
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "20"))
+RETRIEVAL_TOKEN_BUDGET = int(os.environ.get("RETRIEVAL_TOKEN_BUDGET", "4000"))
+# Rough English average for Claude tokenizers; only used for budgeting
+CHARS_PER_TOKEN = 4
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# Function to split a reference document into records: blank-line separated
+# blocks when the file has them, otherwise one record per non-empty line
+def split_records(text):
+    blocks = [block.strip() for block in re.split(r"\n\s*\n", text) if block.strip()]
+    if len(blocks) > 1:
+        return blocks
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+# Function to take the column header off line records: the first record
+# counts as one when it splits into the same number of fields as the next,
+# on a delimiter both share, and none of its fields is a number. Returns
+# (header or None, the remaining records).
+def split_header(records):
+    if len(records) < 2:
+        return None, records
+    first, second = records[0], records[1]
+    for delimiter in (",", "\t", "|", ";"):
+        fields = first.split(delimiter)
+        if len(fields) > 1 and len(fields) == len(second.split(delimiter)):
+            if not any(re.fullmatch(r"[-+]?[0-9.]+", field.strip().strip('"')) for field in fields):
+                return first, records[1:]
+            return None, records
+    return None, records
+
+
+# BM25 index over a list of records. Postings are stored term-major in flat
+# NumPy arrays with each posting's BM25 weight precomputed, so scoring a query
+# is a few slices and one np.bincount over the matching postings.
+class RetrievalIndex:
+    def __init__(self, records, term_counts=None, etag=None, header=None):
+        self.records = records
+        self.etag = etag
+        self.header = header
+        if term_counts is None:
+            term_counts = [Counter(tokenize(record)) for record in records]
+        # Kept so the next build can skip re-tokenising unchanged records
+        self.term_counts_by_record = dict(zip(records, term_counts))
+
+        self.vocab = {}
+        doc_ids = []
+        term_ids = []
+        frequencies = []
+        lengths = np.zeros(len(records), dtype=np.float64)
+        for doc_id, counts in enumerate(term_counts):
+            lengths[doc_id] = sum(counts.values())
+            for term, count in counts.items():
+                term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                doc_ids.append(doc_id)
+                frequencies.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        sorted_terms = term_ids[order]
+        self.posting_docs = np.asarray(doc_ids, dtype=np.int64)[order]
+        frequencies = np.asarray(frequencies, dtype=np.float64)[order]
+
+        doc_freq = np.bincount(term_ids, minlength=len(self.vocab))
+        self.term_offsets = np.concatenate(([0], np.cumsum(doc_freq)))
+        n_docs = len(records)
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = lengths.mean() if n_docs else 0.0
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / (avg_length or 1.0))
+        self.posting_weights = idf[sorted_terms] * frequencies * (BM25_K1 + 1) / (
+            frequencies + length_norm[self.posting_docs])
+
+        self.token_counts = np.fromiter((estimate_tokens(record) for record in records),
+                                        dtype=np.int64, count=n_docs)
+
+    def __len__(self):
+        return len(self.records)
+
+    def score(self, query):
+        term_ids = [self.vocab[term] for term in set(tokenize(query)) if term in self.vocab]
+        if not term_ids:
+            return np.zeros(len(self.records))
+        spans = [slice(self.term_offsets[t], self.term_offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.posting_docs[span] for span in spans])
+        weights = np.concatenate([self.posting_weights[span] for span in spans])
+        return np.bincount(docs, weights=weights, minlength=len(self.records))
+
+    # Function to return the best matching records, best first, within budget
+    def search(self, query, top_k=RETRIEVAL_TOP_K, token_budget=RETRIEVAL_TOKEN_BUDGET):
+        scores = self.score(query)
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        selected = []
+        used_tokens = 0
+        for doc_id in candidates:
+            cost = int(self.token_counts[doc_id])
+            if token_budget is not None and used_tokens + cost > token_budget:
+                continue
+            selected.append(self.records[doc_id])
+            used_tokens += cost
+        return selected
+
+    def search_leading(self, top_k=RETRIEVAL_TOP_K, token_budget=RETRIEVAL_TOKEN_BUDGET):
+        selected = []
+        used_tokens = 0
+        for doc_id in range(min(top_k, len(self.records))):
+            cost = int(self.token_counts[doc_id])
+            if token_budget is not None and used_tokens + cost > token_budget:
+                break
+            selected.append(self.records[doc_id])
+            used_tokens += cost
+        return selected
+
+
+# Indexes by document name. A new ETag triggers a rebuild that reuses the
+# tokenised form of every record that did not change.
+class IndexStore:
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, name, etag, text):
+        index = self._indexes.get(name)
+        if index is not None and index.etag == etag:
+            return index
+
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is not None and index.etag == etag:
+                return index
+            previous = index.term_counts_by_record if index is not None else {}
+            header, records = split_header(split_records(text))
+            term_counts = [previous.get(record) or Counter(tokenize(record)) for record in records]
+            index = RetrievalIndex(records, term_counts, etag, header)
+            self._indexes[name] = index
+            return index
+
+
+# Process-wide index store, shared by every browser session
+@st.cache_resource
+def get_index_store():
+    return IndexStore()
+
+# Function to build the prompt context for a question from a cached document:
+# the whole text when it fits full_document_tokens, otherwise the column
+# header (if any) followed by the records retrieved for the question
+def retrieve_context(query, document, name, top_k=RETRIEVAL_TOP_K, token_budget=RETRIEVAL_TOKEN_BUDGET,
+                     full_document_tokens=RETRIEVAL_FULL_DOCUMENT_TOKENS):
+    if estimate_tokens(document.text) <= full_document_tokens:
+        return document.text
+    index = get_index_store().get_index(name, document.etag, document.text)
+    if index.header is not None and token_budget is not None:
+        token_budget = max(0, token_budget - estimate_tokens(index.header))
+    records = index.search(query, top_k, token_budget)
+    if not records:
+        # Nothing matched lexically; give the model the leading records instead
+        records = index.search_leading(top_k, token_budget)
+    if index.header is not None:
+        records = [index.header] + records
+    return "\n".join(records)
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from itertools import chain, islice
+import streamlit as st
+from aws_clients import get_client
+
+# How long the listing is trusted before new keys are fetched
+S3_LISTING_TTL = float(os.environ.get("S3_LISTING_TTL", "60"))
+# How often the whole bucket is listed again, which also drops deleted keys
+# and finds new keys that sort before the last one seen
+S3_LISTING_FULL_RESCAN = float(os.environ.get("S3_LISTING_FULL_RESCAN", "900"))
+
+
+# Sorted index of the keys in a bucket. The first refresh lists every page;
+# later ones only ask for keys after the last one seen (StartAfter), which is
+# one request when nothing or little has changed. Readers never wait on a
+# refresh: it builds a new list and swaps it in.
+class S3ListingIndex:
+    def __init__(self, s3_client, bucket_name, ttl_seconds=S3_LISTING_TTL, full_rescan_seconds=S3_LISTING_FULL_RESCAN,
+                 clock=time.monotonic):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.ttl_seconds = ttl_seconds
+        self.full_rescan_seconds = full_rescan_seconds
+        self.clock = clock
+        self._keys = []
+        self._etags = {}
+        # Last key S3 itself returned; keys added by add() may sort after it
+        self._listed_through = None
+        self._refreshed_at = None
+        self._rescanned_at = None
+        self._lock = threading.Lock()
+        self.stats = {"list_requests": 0, "full_rescans": 0, "incremental": 0}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _list(self, start_after=None):
+        params = {"Bucket": self.bucket_name}
+        if start_after:
+            params["StartAfter"] = start_after
+        etags = {}
+        for page in self.s3_client.get_paginator('list_objects_v2').paginate(**params):
+            self.stats["list_requests"] += 1
+            etags.update((content['Key'], content.get('ETag')) for content in page.get('Contents', []))
+        return etags
+
+    # Function to bring the index up to date if its TTL has passed, or now if
+    # forced. Another session already refreshing counts as refreshed.
+    def refresh(self, force=False):
+        now = self.clock()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.ttl_seconds:
+            return False
+        if not self._lock.acquire(blocking=self._refreshed_at is None):
+            return False
+        try:
+            now = self.clock()
+            if force or self._rescanned_at is None or now - self._rescanned_at >= self.full_rescan_seconds:
+                # S3 lists keys in UTF-8 byte order, which is Python's str order
+                self._etags = self._list()
+                self._keys = list(self._etags)
+                self._listed_through = self._keys[-1] if self._keys else None
+                self._rescanned_at = now
+                self.stats["full_rescans"] += 1
+            else:
+                new_etags = self._list(start_after=self._listed_through)
+                if new_etags:
+                    etags = dict(self._etags)
+                    etags.update(new_etags)
+                    self._etags = etags
+                    self._keys = sorted(etags)
+                    self._listed_through = max(new_etags)
+                self.stats["incremental"] += 1
+            self._refreshed_at = now
+            return True
+        finally:
+            self._lock.release()
+
+    # Function to record a key this app wrote, so it shows up before the next refresh
+    def add(self, key):
+        with self._lock:
+            index = bisect_left(self._keys, key)
+            if index == len(self._keys) or self._keys[index] != key:
+                keys = list(self._keys)
+                insort(keys, key)
+                self._keys = keys
+                etags = dict(self._etags)
+                etags[key] = None
+                self._etags = etags
+
+    # Function to get a key's ETag as last listed, or None if not known yet
+    def etag(self, key):
+        return self._etags.get(key)
+
+    # Function to find up to `limit` keys: those starting with the query first
+    # (a binary search into the sorted keys), then those containing it
+    # anywhere, ignoring case. Stops scanning as soon as it has enough.
+    # Returns (keys, more), where more says whether further matches exist.
+    def search(self, query="", limit=200, suffixes=None):
+        keys = self._keys
+
+        def starting_with():
+            for index in range(bisect_left(keys, query), len(keys)):
+                if not keys[index].startswith(query):
+                    return
+                yield keys[index]
+
+        def containing():
+            needle = query.lower()
+            for key in keys:
+                if needle in key.lower() and not key.startswith(query):
+                    yield key
+
+        matches = starting_with() if not query else chain(starting_with(), containing())
+        if suffixes:
+            matches = (key for key in matches if key.lower().endswith(suffixes))
+        found = list(islice(matches, limit + 1))
+        return found[:limit], len(found) > limit
+
+
+# Process-wide listing index per bucket, shared by every browser session
+@st.cache_resource
+def get_s3_listing_index(bucket_name, region_name=None):
+    return S3ListingIndex(get_client('s3', region_name), bucket_name)
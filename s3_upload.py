@@ -0,0 +1,94 @@
+import hashlib
+import os
+import posixpath
+import re
+import threading
+import streamlit as st
+from boto3.s3.transfer import TransferConfig
+from aws_clients import MAX_POOL_CONNECTIONS, get_client
+
+# Uploaded images are stored as <prefix><sha256>/<file name>, so identical
+# content shares one object and a same-named different image cannot
+# overwrite it
+UPLOAD_PREFIX = os.environ.get("UPLOAD_PREFIX", "uploads/")
+MULTIPART_THRESHOLD = int(os.environ.get("UPLOAD_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+MULTIPART_CHUNKSIZE = int(os.environ.get("UPLOAD_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+# Parts in flight per upload; kept under the shared client's connection pool
+UPLOAD_CONCURRENCY = min(int(os.environ.get("UPLOAD_CONCURRENCY", "10")), MAX_POOL_CONNECTIONS)
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Function to hash a file object from the start and rewind it
+def content_digest(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+# Function to build the object key for some content, keeping the file name readable
+def content_key(digest, file_name, prefix=UPLOAD_PREFIX):
+    name = re.sub(r'[^\w.-]+', '_', posixpath.basename(file_name.replace('\\', '/'))) or "upload"
+    return f"{prefix}{digest}/{name}"
+
+
+# Uploads files under their content hash and skips any upload whose content
+# is already in the bucket. Known hashes are kept in memory; an unknown hash
+# costs one list_objects_v2 call on its prefix, which finds the content under
+# any file name.
+class DedupingUploader:
+    def __init__(self, s3_client, bucket_name, prefix=UPLOAD_PREFIX, transfer_config=None):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.transfer_config = transfer_config or TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNKSIZE,
+            max_concurrency=UPLOAD_CONCURRENCY,
+            use_threads=True
+        )
+        self._keys_by_digest = {}
+        self._lock = threading.Lock()
+        self.stats = {"uploaded": 0, "known": 0, "found_in_bucket": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    # Function to find an object already holding this content
+    def existing_key(self, digest):
+        key = self._keys_by_digest.get(digest)
+        if key is not None:
+            self._count("known")
+            return key
+        response = self.s3_client.list_objects_v2(Bucket=self.bucket_name, Prefix=f"{self.prefix}{digest}/", MaxKeys=1)
+        if response.get("Contents"):
+            key = response["Contents"][0]["Key"]
+            self._count("found_in_bucket")
+            with self._lock:
+                self._keys_by_digest[digest] = key
+        return key
+
+    # Function to upload a file object unless its content is already stored.
+    # Returns (object key, whether it was uploaded now).
+    def upload(self, fileobj, file_name, content_type=None):
+        digest = content_digest(fileobj)
+        key = self.existing_key(digest)
+        if key is not None:
+            return key, False
+
+        key = content_key(digest, file_name, self.prefix)
+        extra_args = {"ContentType": content_type} if content_type else None
+        self.s3_client.upload_fileobj(fileobj, self.bucket_name, key, ExtraArgs=extra_args, Config=self.transfer_config)
+        self._count("uploaded")
+        with self._lock:
+            self._keys_by_digest[digest] = key
+        return key, True
+
+
+# Process-wide uploader per bucket, so every session shares the known hashes
+@st.cache_resource
+def get_uploader(bucket_name, region_name=None):
+    return DedupingUploader(get_client('s3', region_name), bucket_name)
@@ -0,0 +1,69 @@
+# A UTF-8 character takes up to this many bytes; smaller pieces could not
+# always hold one
+MIN_SEGMENT_BYTES = 4
+
+
+# Function to cut UTF-8 bytes into pieces of at most max_bytes. Cuts prefer the
+# last space in the second half of the window and never land inside a
+# multi-byte character.
+def split_utf8(encoded, max_bytes):
+    if max_bytes < MIN_SEGMENT_BYTES:
+        raise ValueError(f"max_bytes must be at least {MIN_SEGMENT_BYTES}, got {max_bytes}")
+    start = 0
+    while len(encoded) - start > max_bytes:
+        end = start + max_bytes
+        space = encoded.rfind(b" ", start + max_bytes // 2, end + 1)
+        if space != -1:
+            end = space
+        else:
+            # Back off over continuation bytes (0b10xxxxxx) to a character start
+            while end > start and (encoded[end] & 0xC0) == 0x80:
+                end -= 1
+        piece = encoded[start:end].strip()
+        if piece:
+            yield piece
+        start = end
+    piece = encoded[start:].strip()
+    if piece:
+        yield piece
+
+
+# Generator packing sentences into segments of at most max_bytes UTF-8 bytes.
+# Keeps a running byte count, so each sentence is encoded once. Without
+# `sentences`, nltk splits the whole text up front; the packing after that
+# is incremental, and each segment is yielded once it is full so a consumer
+# batching them can send a batch before the rest are packed. A sentence
+# longer than max_bytes is hard-split on its own.
+def iter_segments(text, max_bytes=1000, sentences=None):
+    if max_bytes < MIN_SEGMENT_BYTES:
+        raise ValueError(f"max_bytes must be at least {MIN_SEGMENT_BYTES}, got {max_bytes}")
+    if sentences is None:
+        # nltk takes a quarter of a second to import; only pay for it here
+        from nltk.tokenize import sent_tokenize
+        sentences = sent_tokenize(text)
+
+    parts = []
+    size = 0
+    for sentence in sentences:
+        encoded = sentence.strip().encode('utf-8')
+        if not encoded:
+            continue
+
+        if len(encoded) > max_bytes:
+            if parts:
+                yield {"Text": b" ".join(parts).decode('utf-8')}
+                parts, size = [], 0
+            for piece in split_utf8(encoded, max_bytes):
+                yield {"Text": piece.decode('utf-8')}
+            continue
+
+        added = len(encoded) + (1 if parts else 0)
+        if size + added > max_bytes:
+            yield {"Text": b" ".join(parts).decode('utf-8')}
+            parts, size = [encoded], len(encoded)
+        else:
+            parts.append(encoded)
+            size += added
+
+    if parts:
+        yield {"Text": b" ".join(parts).decode('utf-8')}
@@ -0,0 +1,137 @@
+import json
+
+import pytest
+
+import inference_cache
+from bedrock_streaming import BedrockStream, anthropic_messages_text, invoke_model_stream, titan_text
+from inference_cache import InferenceCache, memoized
+
+WORDS = [f"word{index} " for index in range(10)]
+
+
+def chunk(body):
+    return {"chunk": {"bytes": json.dumps(body).encode("utf-8")}}
+
+
+# Anthropic messages stream: message_start, text deltas, then the metrics
+def anthropic_events(words, fail_after=None):
+    yield chunk({"type": "message_start", "message": {"role": "assistant"}})
+    for index, word in enumerate(words):
+        if fail_after is not None and index == fail_after:
+            yield {"modelStreamErrorException": {"message": "stream reset"}}
+            return
+        yield chunk({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}})
+    yield chunk({"type": "message_stop", "amazon-bedrock-invocationMetrics": {"outputTokenCount": len(words)}})
+
+
+# Titan stream whose last chunk carries the guardrail action and trace
+def titan_events(text, action="NONE"):
+    yield chunk({"outputText": text[:len(text) // 2], "index": 0})
+    yield chunk({"outputText": text[len(text) // 2:], "index": 0, "amazon-bedrock-guardrailAction": action,
+                 "amazon-bedrock-trace": {"guardrail": {"input": {}}}})
+
+
+class StubBedrock:
+    def __init__(self, events):
+        self.events = events
+        self.requests = []
+
+    def invoke_model_with_response_stream(self, **request):
+        self.requests.append(request)
+        return {"body": self.events}
+
+
+class StubModel:
+    def __init__(self):
+        self.calls = 0
+        self.fail_after = None
+
+    def invoke(self, prompt, stream=False):
+        self.calls += 1
+        words = WORDS if prompt != "empty" else []
+        return BedrockStream(anthropic_events(words, self.fail_after), anthropic_messages_text)
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    cache = InferenceCache(db_path=str(tmp_path / "cache.db"))
+    monkeypatch.setattr(inference_cache, "get_inference_cache", lambda: cache)
+    model = StubModel()
+    model.cached_invoke = memoized("test.bedrock.stream", model_id="test")(model.invoke)
+    return model
+
+
+def test_a_clean_stream_assembles_text_and_metrics():
+    client = StubBedrock(anthropic_events(WORDS))
+    finished = []
+
+    stream = invoke_model_stream(client, anthropic_messages_text, modelId="m", body="{}")
+    stream.add_done_callback(finished.append)
+
+    assert "".join(stream) == "".join(WORDS) == stream.text
+    assert client.requests == [{"modelId": "m", "body": "{}"}]
+    assert finished == [stream] and stream.error is None and stream.time_to_first_token is not None
+    assert stream.metrics()["outputTokenCount"] == len(WORDS)
+
+
+def test_guardrail_metadata_comes_from_the_final_chunk():
+    stream = BedrockStream(titan_events("Sorry, I can't help with that.", "INTERVENED"), titan_text)
+
+    assert "".join(stream) == "Sorry, I can't help with that."
+    assert stream.guardrail_action == "INTERVENED"
+    assert stream.output_body["results"][0]["outputText"] == stream.text
+    assert "amazon-bedrock-trace" in stream.output_body
+
+
+def test_a_stream_exception_keeps_the_partial_answer_and_skips_callbacks():
+    finished = []
+    stream = BedrockStream(anthropic_events(WORDS, fail_after=5), anthropic_messages_text)
+    stream.add_done_callback(finished.append)
+
+    assert "".join(stream) == "".join(WORDS[:5])
+    assert stream.error.startswith("modelStreamErrorException")
+    assert finished == []
+
+
+def test_replay_yields_the_snapshot_at_once():
+    stream = BedrockStream(titan_events("Lisbon is sunny in June."), titan_text)
+    "".join(stream)
+
+    replayed = BedrockStream.replay(stream.snapshot())
+
+    assert replayed.from_cache and "".join(replayed) == stream.text
+    assert replayed.metadata == stream.metadata
+
+
+def test_a_finished_stream_is_replayed_from_the_cache(model):
+    first = model.cached_invoke("What is in my portfolio?", stream=True)
+    streamed = "".join(first)
+    second = model.cached_invoke("What is in my portfolio?", stream=True)
+
+    assert "".join(second) == streamed and second.from_cache
+    assert second.metadata == first.metadata
+    assert model.calls == 1
+
+
+def test_errored_streams_are_not_cached(model):
+    model.fail_after = 3
+    assert "".join(model.cached_invoke("errored", stream=True))
+    model.fail_after = None
+
+    assert not model.cached_invoke("errored", stream=True).from_cache
+    assert model.calls == 2
+
+
+def test_abandoned_streams_are_not_cached(model):
+    for _ in zip(range(2), model.cached_invoke("abandoned", stream=True)):
+        pass
+
+    assert not model.cached_invoke("abandoned", stream=True).from_cache
+    assert model.calls == 2
+
+
+def test_empty_streams_are_not_cached(model):
+    assert "".join(model.cached_invoke("empty", stream=True)) == ""
+
+    assert not model.cached_invoke("empty", stream=True).from_cache
+    assert model.calls == 2
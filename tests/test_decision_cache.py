@@ -0,0 +1,86 @@
+import pytest
+
+from decision_cache import DecisionCache
+
+STATE_MACHINE = "arn:aws:states:us-west-2:111122223333:stateMachine:underwriting"
+OTHER_STATE_MACHINE = "arn:aws:states:us-west-2:111122223333:stateMachine:underwriting-v2"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return DecisionCache(db_path=str(tmp_path / "decisions.db"), ttl_seconds=60, clock=clock)
+
+
+def test_put_then_get_returns_the_decision(cache, clock):
+    cache.put(STATE_MACHINE, '"etag-1"', "APPROVED", "Clear license photo", "arn:execution:1")
+
+    cached = cache.get(STATE_MACHINE, '"etag-1"')
+
+    assert (cached.decision, cached.rationale, cached.execution_arn) == ("APPROVED", "Clear license photo",
+                                                                         "arn:execution:1")
+    assert cached.created_at == clock.now
+    assert cache.stats == {"hits": 1, "misses": 0}
+
+
+def test_get_misses_other_images_and_state_machines(cache):
+    cache.put(STATE_MACHINE, '"etag-1"', "APPROVED", "ok")
+
+    assert cache.get(STATE_MACHINE, '"etag-2"') is None
+    assert cache.get(OTHER_STATE_MACHINE, '"etag-1"') is None
+    assert cache.stats == {"hits": 0, "misses": 2}
+
+
+def test_put_replaces_the_previous_decision(cache):
+    cache.put(STATE_MACHINE, '"etag-1"', "APPROVED", "first run")
+    cache.put(STATE_MACHINE, '"etag-1"', "DECLINED", "second run")
+
+    assert cache.get(STATE_MACHINE, '"etag-1"').decision == "DECLINED"
+
+
+def test_entries_older_than_the_ttl_are_ignored_and_purged(cache, clock):
+    cache.put(STATE_MACHINE, '"old"', "APPROVED", "ok")
+    clock.now += 30
+    cache.put(STATE_MACHINE, '"new"', "APPROVED", "ok")
+
+    clock.now += 30
+    assert cache.get(STATE_MACHINE, '"old"') is not None
+    clock.now += 1
+    assert cache.get(STATE_MACHINE, '"old"') is None
+    assert cache.get(STATE_MACHINE, '"new"') is not None
+
+    assert cache.purge_expired() == 1
+    assert cache.get(STATE_MACHINE, '"new"') is not None
+
+
+def test_invalidate_one_image_or_a_whole_state_machine(cache):
+    for content_id in ('"a"', '"b"', '"c"'):
+        cache.put(STATE_MACHINE, content_id, "APPROVED", "ok")
+    cache.put(OTHER_STATE_MACHINE, '"a"', "APPROVED", "ok")
+
+    assert cache.invalidate(STATE_MACHINE, '"a"') == 1
+    assert cache.get(STATE_MACHINE, '"a"') is None
+    assert cache.get(STATE_MACHINE, '"b"') is not None
+
+    assert cache.invalidate(STATE_MACHINE) == 2
+    assert cache.get(STATE_MACHINE, '"c"') is None
+    assert cache.get(OTHER_STATE_MACHINE, '"a"') is not None
+
+
+def test_decisions_survive_a_new_cache_on_the_same_file(tmp_path, clock):
+    path = str(tmp_path / "decisions.db")
+    DecisionCache(db_path=path, ttl_seconds=60, clock=clock).put(STATE_MACHINE, '"etag-1"', "APPROVED", "ok")
+
+    assert DecisionCache(db_path=path, ttl_seconds=60, clock=clock).get(STATE_MACHINE, '"etag-1"').decision == "APPROVED"
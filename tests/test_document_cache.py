@@ -0,0 +1,129 @@
+import io
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+
+from document_cache import DocumentCache
+
+BUCKET = "stock-market-data-poc"
+KEY = "Customer_Data.txt"
+TTL = 300.0
+V1 = b"customer 1 | portfolio balanced | risk moderate\n" * 100
+V2 = b"customer 2 | portfolio growth | risk high\n" * 100
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client("s3", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def expect_body(stubber, body, etag, if_none_match=None):
+    params = {"Bucket": BUCKET, "Key": KEY}
+    if if_none_match:
+        params["IfNoneMatch"] = if_none_match
+    stubber.add_response("get_object", {"Body": StreamingBody(io.BytesIO(body), len(body)), "ETag": etag,
+                                        "ContentLength": len(body)}, params)
+
+
+def expect_not_modified(stubber, etag):
+    stubber.add_client_error("get_object", service_error_code="304", service_message="Not Modified",
+                             http_status_code=304, expected_params={"Bucket": BUCKET, "Key": KEY, "IfNoneMatch": etag})
+
+
+def test_reads_within_the_ttl_make_no_request(s3, clock):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    cache = DocumentCache(client, ttl_seconds=TTL, disk_dir=None, clock=clock)
+
+    assert cache.get_text(BUCKET, KEY) == V1.decode("utf-8")
+    for _ in range(10):
+        clock.now += TTL / 20
+        assert cache.get(BUCKET, KEY).etag == '"v1"'
+    assert cache.stats["misses"] == 1 and cache.stats["hits"] == 10
+    assert cache.stats["bytes_downloaded"] == len(V1)
+
+
+def test_an_unchanged_object_is_revalidated_with_a_304(s3, clock):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    expect_not_modified(stubber, '"v1"')
+    cache = DocumentCache(client, ttl_seconds=TTL, disk_dir=None, clock=clock)
+
+    cache.get(BUCKET, KEY)
+    clock.now += TTL
+    assert cache.get_text(BUCKET, KEY) == V1.decode("utf-8")
+    assert cache.stats["not_modified"] == 1 and cache.stats["bytes_downloaded"] == len(V1)
+
+    # The 304 restarts the TTL
+    clock.now += TTL / 2
+    cache.get(BUCKET, KEY)
+    assert cache.stats["hits"] == 1
+
+
+def test_a_changed_object_is_downloaded_again(s3, clock):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    expect_body(stubber, V2, '"v2"', if_none_match='"v1"')
+    cache = DocumentCache(client, ttl_seconds=TTL, disk_dir=None, clock=clock)
+
+    cache.get(BUCKET, KEY)
+    clock.now += TTL
+    document = cache.get(BUCKET, KEY)
+    assert document.text == V2.decode("utf-8") and document.etag == '"v2"'
+    assert cache.stats["bytes_downloaded"] == len(V1) + len(V2)
+
+
+def test_errors_other_than_304_are_raised(s3, clock):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    stubber.add_client_error("get_object", service_error_code="AccessDenied", http_status_code=403,
+                             expected_params={"Bucket": BUCKET, "Key": KEY, "IfNoneMatch": '"v1"'})
+    cache = DocumentCache(client, ttl_seconds=TTL, disk_dir=None, clock=clock)
+
+    cache.get(BUCKET, KEY)
+    clock.now += TTL
+    with pytest.raises(ClientError) as error:
+        cache.get(BUCKET, KEY)
+    assert error.value.response["Error"]["Code"] == "AccessDenied"
+
+
+def test_a_fresh_process_revalidates_its_disk_copy(s3, clock, tmp_path):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    expect_not_modified(stubber, '"v1"')
+    DocumentCache(client, ttl_seconds=TTL, disk_dir=str(tmp_path), clock=clock).get(BUCKET, KEY)
+
+    restarted = DocumentCache(client, ttl_seconds=TTL, disk_dir=str(tmp_path), clock=Clock())
+    assert restarted.get_text(BUCKET, KEY) == V1.decode("utf-8")
+    assert restarted.stats["disk_hits"] == 1 and restarted.stats["bytes_downloaded"] == 0
+
+
+def test_invalidate_forces_a_revalidation(s3, clock, tmp_path):
+    client, stubber = s3
+    expect_body(stubber, V1, '"v1"')
+    expect_not_modified(stubber, '"v1"')
+    cache = DocumentCache(client, ttl_seconds=TTL, disk_dir=str(tmp_path), clock=clock)
+
+    cache.get(BUCKET, KEY)
+    cache.invalidate(BUCKET, KEY)
+    cache.get(BUCKET, KEY)
+    assert cache.stats["revalidated"] == 1
@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timezone
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from execution_tracker import DEADLINE_EXCEEDED, ExecutionTracker, TrackedExecution
+
+STATE_MACHINE = "arn:aws:states:us-west-2:111122223333:stateMachine:underwriting"
+OUTPUT = {"Body": {"content": [{"text": "<decision>Approve</decision><rationale>ok</rationale>"}]}}
+STARTED = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class SimulatedClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def execution_arn(index):
+    return f"arn:aws:states:us-west-2:111122223333:execution:underwriting:{index}"
+
+
+def expect_describe(stubber, arn, status):
+    response = {"executionArn": arn, "stateMachineArn": STATE_MACHINE, "status": status, "startDate": STARTED}
+    if status == "SUCCEEDED":
+        response["output"] = json.dumps(OUTPUT)
+    stubber.add_response("describe_execution", response, {"executionArn": arn})
+
+
+@pytest.fixture
+def stepfunctions():
+    client = boto3.client("stepfunctions", region_name="us-west-2", aws_access_key_id="test",
+                          aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def clock():
+    return SimulatedClock()
+
+
+@pytest.fixture
+def tracker(stepfunctions, clock):
+    return ExecutionTracker(stepfunctions[0], timeout=60, clock=clock, sleep=clock.sleep)
+
+
+def test_poll_only_calls_step_functions_when_due(tracker, stepfunctions, clock):
+    stubber = stepfunctions[1]
+    execution = TrackedExecution(execution_arn(0), clock())
+    execution.next_poll_at = 1.0
+
+    # Not due yet: no call queued, so any call would fail
+    assert tracker.poll(execution).status == "RUNNING"
+
+    clock.now = 1.0
+    expect_describe(stubber, execution_arn(0), "RUNNING")
+    tracker.poll(execution)
+    assert execution.polls == 1 and execution.next_poll_at > clock.now
+
+    clock.now = execution.next_poll_at
+    expect_describe(stubber, execution_arn(0), "SUCCEEDED")
+    tracker.poll(execution)
+    assert execution.status == "SUCCEEDED" and execution.output == OUTPUT
+    assert list(tracker.durations) == [clock.now]
+
+
+def test_failed_executions_keep_their_error(tracker, stepfunctions, clock):
+    stubber = stepfunctions[1]
+    execution = TrackedExecution(execution_arn(0), clock())
+    stubber.add_response("describe_execution", {"executionArn": execution_arn(0), "stateMachineArn": STATE_MACHINE,
+                                                "status": "FAILED", "startDate": STARTED, "error": "Lambda.Timeout"},
+                         {"executionArn": execution_arn(0)})
+
+    tracker.poll(execution)
+
+    assert execution.done and execution.error == "Lambda.Timeout" and not tracker.durations
+
+
+def test_the_first_poll_waits_for_the_earliest_typical_finish(tracker):
+    tracker.durations.extend([8.0] * 20)
+
+    assert tracker.next_delay(0.0) == 8.0
+    assert tracker.next_delay(8.0) == tracker.min_delay
+    assert tracker.next_delay(100.0) == tracker.max_delay
+
+
+def test_a_stuck_execution_is_given_up_at_the_deadline(tracker, stepfunctions, clock):
+    stubber = stepfunctions[1]
+    stubber.add_response("start_execution", {"executionArn": execution_arn(0), "startDate": STARTED},
+                         {"stateMachineArn": STATE_MACHINE, "input": "{}"})
+    # Polled every second, backing off to every 2 s from 20 s on: 38 calls up to the deadline
+    for _ in range(38):
+        expect_describe(stubber, execution_arn(0), "RUNNING")
+
+    execution = tracker.wait(tracker.start(STATE_MACHINE, {}))
+
+    assert execution.status == DEADLINE_EXCEEDED and clock() == 60
+    assert execution.polls == 38
+
+
+def test_express_workflows_finish_in_one_call(tracker, stepfunctions, clock):
+    stubber = stepfunctions[1]
+    stubber.add_response("describe_state_machine", {"stateMachineArn": STATE_MACHINE, "name": "underwriting",
+                                                    "definition": "{}", "roleArn": "arn:aws:iam::111122223333:role/sfn",
+                                                    "type": "EXPRESS", "creationDate": STARTED},
+                         {"stateMachineArn": STATE_MACHINE})
+    stubber.add_response("start_sync_execution", {"executionArn": execution_arn(0), "startDate": STARTED,
+                                                  "stopDate": STARTED, "status": "SUCCEEDED",
+                                                  "output": json.dumps(OUTPUT)},
+                         {"stateMachineArn": STATE_MACHINE, "input": "{}"})
+
+    assert tracker.is_express(STATE_MACHINE)
+    assert tracker.is_express(STATE_MACHINE)
+    execution = tracker.run_sync(STATE_MACHINE, {})
+
+    assert execution.status == "SUCCEEDED" and execution.output == OUTPUT
+
+
+def test_without_permission_to_describe_the_machine_it_is_polled(tracker, stepfunctions):
+    stepfunctions[1].add_client_error("describe_state_machine", service_error_code="AccessDeniedException",
+                                      http_status_code=400)
+
+    assert not tracker.is_express(STATE_MACHINE)
+
+
+def test_poll_many_lists_a_batch_and_describes_only_finished_ones(tracker, stepfunctions, clock):
+    stubber = stepfunctions[1]
+    executions = [TrackedExecution(execution_arn(index), clock()) for index in range(tracker.bulk_status_min)]
+    listed = [{"executionArn": execution_arn(index), "stateMachineArn": STATE_MACHINE, "name": str(index),
+               "status": "SUCCEEDED" if index == 0 else "RUNNING", "startDate": STARTED}
+              for index in range(tracker.bulk_status_min)]
+    stubber.add_response("list_executions", {"executions": listed},
+                         {"stateMachineArn": STATE_MACHINE, "maxResults": 1000})
+    expect_describe(stubber, execution_arn(0), "SUCCEEDED")
+
+    tracker.poll_many(STATE_MACHINE, executions)
+
+    assert [execution.status for execution in executions] == ["SUCCEEDED"] + ["RUNNING"] * 4
+    assert all(execution.next_poll_at > clock() for execution in executions[1:])
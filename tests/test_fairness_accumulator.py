@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from fairness_accumulator import FairnessAccumulator
+
+ATTRIBUTES = {"Race": ["White", "Black"], "Gender": ["Female", "Male"]}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "fairness_counts.npz")
+
+
+def accumulator(path, attributes=ATTRIBUTES, **options):
+    return FairnessAccumulator(attributes, path=path, snapshot_seconds=3600, **options)
+
+
+def test_reports_selection_per_group():
+    counts = accumulator(None)
+    for group, outcome in [(("White", "Female"), "Cardiology"), (("White", "Male"), "Neurology"),
+                           (("Black", "Female"), "Cardiology"), (("Black", "Male"), "Cardiology")]:
+        counts.record(group, outcome)
+
+    report = counts.report("Cardiology", by=["Race"], privileged=("White",)).to_dict()
+
+    assert counts.total() == 4
+    assert report["Groups"]["White"] == {"Count": 2, "Selection Rate": 0.5, "Disparate Impact": 1.0,
+                                         "Statistical Parity Difference": 0.0}
+    assert report["Groups"]["Black"]["Selection Rate"] == 1.0
+
+
+def test_the_outcome_axis_grows_past_its_initial_capacity():
+    counts = accumulator(None, outcome_capacity=2)
+    outcomes = [f"Specialty {index}" for index in range(5)]
+    for outcome in outcomes:
+        counts.record(("White", "Female"), outcome)
+    counts.record(("Black", "Male"), outcomes[0])
+
+    assert counts.outcomes == outcomes and counts.counts.shape == (2, 2, 8)
+    assert counts.total() == 6 and counts.counts[0, 0, :5].tolist() == [1] * 5
+
+
+def test_snapshots_are_reloaded(path):
+    counts = accumulator(path, outcome_capacity=1)
+    counts.record(("White", "Female"), "Cardiology")
+    counts.record(("Black", "Male"), "Neurology")
+    counts.snapshot()
+
+    reloaded = accumulator(path)
+
+    assert reloaded.outcomes == ["Cardiology", "Neurology"]
+    assert np.array_equal(reloaded.counts, counts.counts)
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage"])
+def test_a_corrupt_snapshot_is_moved_aside(path, tmp_path, damage):
+    counts = accumulator(path)
+    counts.record(("White", "Female"), "Cardiology")
+    counts.snapshot()
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2] if damage == "truncate" else b"not a snapshot")
+
+    fresh = accumulator(path)
+
+    assert fresh.total() == 0 and fresh.outcomes == []
+    assert [entry.name.endswith(".corrupt") for entry in tmp_path.iterdir()] == [True]
+
+
+def test_a_snapshot_for_other_attributes_is_moved_aside(path, tmp_path):
+    counts = accumulator(path)
+    counts.record(("White", "Female"), "Cardiology")
+    counts.snapshot()
+
+    fresh = accumulator(path, attributes={"Race": ["White", "Black", "Asian"], "Gender": ["Female", "Male"]})
+
+    assert fresh.total() == 0
+    assert [entry.name.endswith(".mismatch") for entry in tmp_path.iterdir()] == [True]
@@ -0,0 +1,127 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from identity_cache import REFRESH_MARGIN_SECONDS, IdentityCache, SessionExpired
+
+USER_POOL_ID = "us-west-2_test"
+CLIENT_ID = "testclient"
+USERNAME = "analyst"
+EXPIRES_IN = 3600
+GUARDRAIL_IDS = {"Employee": "employee-guardrail", "Portfolio_Manager": "pm-guardrail"}
+# Portfolio_Manager first, as Cognito returned it: the guardrail must follow that order
+GROUPS = ["Portfolio_Manager", "Employee"]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def auth_result(generation, refresh_token=True):
+    result = {"AccessToken": f"access-{generation}", "IdToken": f"id-{generation}", "ExpiresIn": EXPIRES_IN,
+              "TokenType": "Bearer"}
+    if refresh_token:
+        result["RefreshToken"] = "refresh-token"
+    return result
+
+
+def expect_groups(stubber, names=GROUPS):
+    stubber.add_response("admin_list_groups_for_user", {"Groups": [{"GroupName": name} for name in names]},
+                         {"Username": USERNAME, "UserPoolId": USER_POOL_ID})
+
+
+def expect_refresh(stubber, generation):
+    stubber.add_response("admin_initiate_auth",
+                         {"AuthenticationResult": auth_result(generation, refresh_token=False)},
+                         {"UserPoolId": USER_POOL_ID, "ClientId": CLIENT_ID, "AuthFlow": "REFRESH_TOKEN_AUTH",
+                          "AuthParameters": {"REFRESH_TOKEN": "refresh-token"}})
+
+
+@pytest.fixture
+def cognito():
+    client = boto3.client("cognito-idp", region_name="us-west-2", aws_access_key_id="test",
+                          aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def session_state():
+    return {}
+
+
+@pytest.fixture
+def cache(cognito, clock, session_state):
+    cache = IdentityCache(cognito[0], USER_POOL_ID, CLIENT_ID, session_state, clock=clock)
+    cache.remember_login(USERNAME, auth_result(0))
+    return cache
+
+
+def test_groups_are_looked_up_once_per_token_lifetime(cache, cognito, clock):
+    expect_groups(cognito[1])
+
+    while clock.now < 1000.0 + EXPIRES_IN - REFRESH_MARGIN_SECONDS:
+        assert cache.groups(USERNAME) == GROUPS
+        assert cache.guardrail_id(USERNAME, GUARDRAIL_IDS) == "pm-guardrail"
+        clock.now += 20
+
+
+def test_expiring_tokens_are_refreshed_and_groups_read_again(cache, cognito, clock):
+    stubber = cognito[1]
+    expect_groups(stubber)
+    cache.groups(USERNAME)
+
+    clock.now += EXPIRES_IN - REFRESH_MARGIN_SECONDS
+    expect_refresh(stubber, 1)
+    expect_groups(stubber)
+    for _ in range(5):
+        assert cache.groups(USERNAME) == GROUPS
+        clock.now += 20
+
+    identity = cache.get()
+    assert identity.tokens["AccessToken"] == "access-1"
+    # Cognito does not send the refresh token again; the old one is kept
+    assert identity.tokens["RefreshToken"] == "refresh-token"
+
+
+def test_a_rejected_refresh_token_drops_the_identity(cache, cognito, clock, session_state):
+    stubber = cognito[1]
+    expect_groups(stubber)
+    cache.groups(USERNAME)
+
+    clock.now = cache.get().expires_at
+    stubber.add_client_error("admin_initiate_auth", service_error_code="NotAuthorizedException",
+                             service_message="Refresh Token has expired", http_status_code=400)
+    with pytest.raises(SessionExpired):
+        cache.groups(USERNAME)
+    assert cache.get() is None and session_state == {}
+
+
+def test_a_different_user_gets_a_fresh_lookup(cache, cognito):
+    stubber = cognito[1]
+    expect_groups(stubber)
+    cache.groups(USERNAME)
+
+    stubber.add_response("admin_list_groups_for_user", {"Groups": [{"GroupName": "Employee"}]},
+                         {"Username": "advisor", "UserPoolId": USER_POOL_ID})
+    assert cache.guardrail_id("advisor", GUARDRAIL_IDS) == "employee-guardrail"
+
+
+def test_expired_tokens_without_a_refresh_token_end_the_session(cognito, clock, session_state):
+    cache = IdentityCache(cognito[0], USER_POOL_ID, CLIENT_ID, session_state, clock=clock)
+    cache.remember_login(USERNAME, auth_result(0, refresh_token=False))
+
+    clock.now += EXPIRES_IN
+    with pytest.raises(SessionExpired):
+        cache.groups(USERNAME)
+    assert cache.get() is None and session_state == {}
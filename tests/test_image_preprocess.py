@@ -0,0 +1,47 @@
+import io
+
+import pytest
+from PIL import Image, UnidentifiedImageError
+
+from image_preprocess import preprocess_image
+
+
+def encode(image, image_format, **options):
+    output = io.BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def test_a_sideways_phone_photo_is_uprighted_and_downscaled():
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    data = encode(Image.effect_noise((1200, 800), 40).convert("RGB"), "JPEG", exif=exif)
+
+    result = preprocess_image(data, "license.jpeg", max_side=600, content_type="image/jpeg")
+
+    assert result.size == (400, 600) and Image.open(io.BytesIO(result.data)).size == (400, 600)
+    assert result.file_name == "license.jpg" and result.content_type == "image/jpeg"
+
+
+def test_transparent_scans_are_flattened_for_jpeg():
+    image = Image.new("RGBA", (300, 200), (0, 0, 0, 0))
+    image.paste((200, 30, 30, 255), (50, 50, 250, 150))
+    data = encode(image, "PNG")
+
+    result = preprocess_image(data, "scan.png", max_side=200)
+
+    flattened = Image.open(io.BytesIO(result.data))
+    assert flattened.mode == "RGB" and flattened.getpixel((0, 0)) == (255, 255, 255)
+
+
+def test_a_small_image_that_would_grow_is_kept_as_is():
+    data = encode(Image.new("L", (64, 64), 128), "PNG")
+
+    result = preprocess_image(data, "small.png", max_side=2048, quality=100, content_type="image/png")
+
+    assert (result.data, result.file_name, result.content_type) == (data, "small.png", "image/png")
+
+
+def test_unreadable_data_raises():
+    with pytest.raises(UnidentifiedImageError):
+        preprocess_image(b"not an image", "license.jpg")
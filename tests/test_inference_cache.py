@@ -0,0 +1,80 @@
+import pytest
+
+import inference_cache
+from inference_cache import InferenceCache, memoized, summary_caption
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = InferenceCache(db_path=str(tmp_path / "cache.db"))
+    monkeypatch.setattr(inference_cache, "get_inference_cache", lambda: cache)
+    return cache
+
+
+def counting(operation, **options):
+    calls = []
+
+    @memoized(operation, **options)
+    def infer(text):
+        calls.append(text)
+        return {"answer": text.upper()}
+
+    return infer, calls
+
+
+def persisted(cache):
+    return cache._db.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0]
+
+
+def test_results_are_cached_and_persisted(cache):
+    infer, calls = counting("test.infer", model_id="m")
+
+    assert infer("chest pain") == infer("chest pain") == {"answer": "CHEST PAIN"}
+    assert calls == ["chest pain"]
+    assert persisted(cache) == 1
+
+
+def test_phi_calls_bypass_the_cache_by_default(cache):
+    infer, calls = counting("test.phi", phi=True, model_id="m")
+
+    infer("patient 42 has diabetes")
+    infer("patient 42 has diabetes")
+
+    assert len(calls) == 2
+    assert cache.summary()["entries"] == 0 and persisted(cache) == 0
+
+
+def test_phi_calls_opted_in_stay_in_memory(cache, monkeypatch):
+    monkeypatch.setattr(inference_cache, "INFERENCE_CACHE_PHI", True)
+    infer, calls = counting("test.phi", phi=True, model_id="m")
+
+    infer("patient 42 has diabetes")
+    infer("patient 42 has diabetes")
+
+    assert len(calls) == 1
+    assert cache.summary()["entries"] == 1 and persisted(cache) == 0
+
+
+def test_failures_are_not_cached(cache):
+    calls = []
+
+    @memoized("test.failure")
+    def infer(text):
+        calls.append(text)
+        return None
+
+    infer("a")
+    infer("a")
+    assert len(calls) == 2
+
+
+def test_summary_caption_reports_hits_and_bytes_saved(cache):
+    infer, _ = counting("test.infer")
+    for _ in range(4):
+        infer("chest pain")
+
+    caption = summary_caption()
+
+    assert caption.startswith("Response cache: 75% hit rate over 4 lookups")
+    assert f"{cache.stats['bytes_saved'] / 1e6:.2f} MB saved" in caption
+    assert caption.endswith("patient data is not cached")
@@ -0,0 +1,140 @@
+import warnings
+
+import boto3
+import pandas as pd
+import pytest
+from botocore.stub import Stubber
+
+from medical_batch import MedicalPipeline, audit_results, iter_input_chunks, read_checkpoint, run_batch
+from pii_prescreen import PrescreenedModerationChain
+from rate_limit import RateLimitedClient, RateLimiter
+
+ENDPOINT_ARN = "arn:aws:comprehend:us-west-2:111122223333:document-classifier-endpoint/medical-specialty"
+GROUPS = ["White", "Black", "Asian"]
+ROWS = 12
+CHUNK_SIZE = 5
+
+
+def build_moderation_config():
+    from langchain_experimental.comprehend_moderation import (
+        BaseModerationConfig,
+        ModerationPiiConfig,
+        ModerationPromptSafetyConfig
+    )
+
+    return BaseModerationConfig(filters=[ModerationPiiConfig(labels=["SSN", "PHONE", "EMAIL"], redact=True,
+                                                             mask_character="X"),
+                                         ModerationPromptSafetyConfig(threshold=0.8)])
+
+
+class CountingLimiter(RateLimiter):
+    def __init__(self):
+        super().__init__(None)
+        self.tokens = 0
+
+    def acquire(self):
+        self.tokens += 1
+
+
+# Pipeline that is interrupted (Ctrl-C) once `rows` rows have been classified
+class InterruptAfter:
+    def __init__(self, pipeline, rows):
+        self.pipeline = pipeline
+        self.rows = rows
+        self.calls = 0
+
+    def classify(self, text):
+        self.calls += 1
+        if self.calls > self.rows:
+            raise KeyboardInterrupt
+        return self.pipeline.classify(text)
+
+
+def expect_safe(stubber):
+    stubber.add_response("classify_document", {"Classes": [{"Name": "SAFE_PROMPT", "Score": 0.99}]})
+
+
+def expect_labels(stubber, labels):
+    stubber.add_response("classify_document", {"Labels": [{"Name": name, "Score": score} for name, score in labels]})
+
+
+def expect_row(stubber, row):
+    expect_safe(stubber)
+    expect_labels(stubber, [("Cardiology" if row % 2 else "Neurology", 0.8)])
+
+
+@pytest.fixture
+def comprehend():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    raw = boto3.client("comprehend", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test")
+    limiter = CountingLimiter()
+    client = RateLimitedClient(raw, limiter)
+    pipeline = MedicalPipeline(client, PrescreenedModerationChain(build_moderation_config, client=client),
+                               ENDPOINT_ARN, lambda text: text)
+    with Stubber(raw) as stubber:
+        yield pipeline, stubber, limiter
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def notes_csv(tmp_path):
+    path = tmp_path / "notes.csv"
+    pd.DataFrame({"text": [f"Note {row}: chest pain." for row in range(ROWS)],
+                  "race": [GROUPS[row % 3] for row in range(ROWS)]}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_every_comprehend_call_takes_a_rate_limiter_token(comprehend):
+    pipeline, stubber, limiter = comprehend
+    # Clear text: local PII screen, then prompt safety and classification
+    expect_safe(stubber)
+    expect_labels(stubber, [("Cardiology", 0.9), ("Neurology", 0.1)])
+    assert pipeline.classify("Chest pain on exertion.")["predicted_label"] == "Cardiology"
+    # A long digit run goes through the langchain chain: one more call
+    stubber.add_response("detect_pii_entities", {"Entities": []})
+    expect_safe(stubber)
+    expect_labels(stubber, [("Neurology", 0.7)])
+    assert pipeline.classify("Record 1234567, follow up.")["predicted_label"] == "Neurology"
+
+    assert limiter.tokens == 5
+
+
+def test_an_empty_labels_response_is_the_rows_error(comprehend):
+    pipeline, stubber, _ = comprehend
+    expect_safe(stubber)
+    expect_labels(stubber, [])
+
+    result = pipeline.classify("No findings.")
+
+    assert result["predicted_label"] is None and result["error"].startswith("ValueError")
+
+
+def test_an_interrupted_run_resumes_from_the_checkpoint(comprehend, notes_csv, tmp_path):
+    pipeline, stubber, _ = comprehend
+    output_dir = str(tmp_path / "run")
+    for row in range(CHUNK_SIZE):
+        expect_row(stubber, row)
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(notes_csv, output_dir, InterruptAfter(pipeline, CHUNK_SIZE), "text", ["race"], CHUNK_SIZE,
+                  concurrency=1)
+    assert read_checkpoint(output_dir)["rows_done"] == CHUNK_SIZE
+
+    for row in range(CHUNK_SIZE, ROWS):
+        expect_row(stubber, row)
+    assert run_batch(notes_csv, output_dir, pipeline, "text", ["race"], CHUNK_SIZE, concurrency=1) == ROWS - CHUNK_SIZE
+
+    results = pd.read_parquet(tmp_path / "run" / "parts")
+    assert sorted(results["row"]) == list(range(ROWS)) and results["error"].isna().all()
+    summary = audit_results(output_dir, ["race"], favorable_label="Cardiology", privileged=["White"], n_boot=50)
+    assert summary["Rows"] == ROWS and set(summary["Groups"]) == set(GROUPS)
+
+
+def test_a_csv_with_multiline_notes_resumes_at_the_right_row(tmp_path):
+    path = tmp_path / "notes.csv"
+    notes = [f"Note {row}:\nchest pain,\nfollow up." for row in range(ROWS)]
+    pd.DataFrame({"text": notes}).to_csv(path, index=False)
+
+    chunks = list(iter_input_chunks(str(path), CHUNK_SIZE, skip_rows=7))
+
+    assert [len(chunk) for chunk in chunks] == [3, 2]
+    assert list(pd.concat(chunks)["text"]) == notes[7:]
@@ -0,0 +1,44 @@
+import threading
+import time
+
+import streamlit as st
+
+from post_checks import PostCheck, run_post_checks
+
+
+def test_checks_run_in_parallel_and_render_on_the_script_thread():
+    script_thread = threading.current_thread()
+    ran_on, rendered = {}, []
+
+    def check(name, delay):
+        def run():
+            ran_on[name] = threading.current_thread()
+            time.sleep(delay)
+            return name.upper()
+        return PostCheck(name, run, lambda value: rendered.append((value, threading.current_thread())))
+
+    report = run_post_checks([check("slow", 0.2), check("fast", 0.0)])
+
+    assert all(thread is not script_thread for thread in ran_on.values())
+    # Rendered as each result landed, always on the script thread
+    assert rendered == [("FAST", script_thread), ("SLOW", script_thread)]
+    assert list(report.results) == ["slow", "fast"]
+    assert report.total_time < 0.35
+
+
+def test_a_failed_check_is_shown_in_its_own_section_by_the_script_thread(monkeypatch):
+    script_thread = threading.current_thread()
+    errors = []
+    monkeypatch.setattr(st, "error", lambda message: errors.append((message, threading.current_thread())))
+
+    def fail():
+        raise RuntimeError("throttled")
+
+    rendered = []
+    report = run_post_checks([PostCheck("Sentiment Analysis", fail, rendered.append),
+                              PostCheck("Toxicity Detection", lambda: "scores", rendered.append)])
+
+    assert errors == [("Sentiment Analysis failed: throttled", script_thread)]
+    assert rendered == ["scores"]
+    assert isinstance(report.results["Sentiment Analysis"].error, RuntimeError)
+    assert report.results["Toxicity Detection"].value == "scores"
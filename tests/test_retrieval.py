@@ -0,0 +1,64 @@
+from document_cache import CachedDocument
+from retrieval import IndexStore, estimate_tokens, retrieve_context, split_header, split_records
+import retrieval
+
+HEADER = "Patient_ID,Name,Age,Condition,Medication"
+CONDITIONS = ["Asthma", "Diabetes", "Hypertension", "Migraine"]
+
+
+def csv_document(rows):
+    lines = [HEADER] + [f"{row},Patient {row},{20 + row % 60},{CONDITIONS[row % 4]},Drug {row % 7}"
+                        for row in range(rows)]
+    return "\n".join(lines)
+
+
+def document(text, etag='"v1"'):
+    return CachedDocument(text, etag, 0.0)
+
+
+def test_split_header_finds_a_csv_header():
+    header, records = split_header(split_records(csv_document(3)))
+    assert header == HEADER
+    assert records[0].startswith("0,Patient 0")
+
+
+def test_split_header_leaves_headerless_records_alone():
+    records = ["1,Ann,34,Asthma", "2,Bob,51,Diabetes"]
+    assert split_header(records) == (None, records)
+    prose = ["Patient 1 has asthma.", "Patient 2 has diabetes."]
+    assert split_header(prose) == (None, prose)
+
+
+def test_a_document_that_fits_is_sent_whole(monkeypatch):
+    # Over the 4000-token retrieval budget, as the real healthcare file is
+    text = csv_document(500)
+    assert estimate_tokens(text) > 4000
+    monkeypatch.setattr(retrieval, "get_index_store", lambda: IndexStore())
+
+    context = retrieve_context("How many patients have asthma?", document(text), "healthcare.txt",
+                               top_k=20, token_budget=4000, full_document_tokens=100_000)
+
+    assert context == text
+
+
+def test_a_larger_document_is_retrieved_with_its_header_first(monkeypatch):
+    text = csv_document(2000)
+    monkeypatch.setattr(retrieval, "get_index_store", lambda: IndexStore())
+
+    context = retrieve_context("Which patients take Drug 3 for Migraine?", document(text), "healthcare.txt",
+                               top_k=20, token_budget=1000, full_document_tokens=10_000)
+
+    lines = context.split("\n")
+    assert lines[0] == HEADER
+    assert 1 < len(lines) <= 21
+    assert estimate_tokens(context) <= 1000 + len(lines)
+    assert all("Migraine" in line or "Drug 3" in line for line in lines[1:])
+
+
+def test_unmatched_questions_get_the_header_and_leading_records(monkeypatch):
+    text = csv_document(2000)
+    monkeypatch.setattr(retrieval, "get_index_store", lambda: IndexStore())
+
+    context = retrieve_context("zzz", document(text), "healthcare.txt", top_k=5, full_document_tokens=10_000)
+
+    assert context.split("\n") == text.split("\n")[:6]
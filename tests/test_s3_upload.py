@@ -0,0 +1,105 @@
+import hashlib
+import io
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from botocore.stub import ANY, Stubber
+
+from s3_upload import DedupingUploader, content_digest, content_key
+
+BUCKET = "underwriting-images"
+IMAGE = b"\xff\xd8 driver license scan" * 100
+DIGEST = hashlib.sha256(IMAGE).hexdigest()
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client("s3", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def uploader(client, **options):
+    # Single-threaded transfers keep the calls in the order they are queued
+    return DedupingUploader(client, BUCKET, prefix="uploads/",
+                            transfer_config=TransferConfig(use_threads=False, **options))
+
+
+def expect_list(stubber, keys):
+    response = {"KeyCount": len(keys)}
+    if keys:
+        response["Contents"] = [{"Key": key} for key in keys]
+    stubber.add_response("list_objects_v2", response,
+                         {"Bucket": BUCKET, "Prefix": f"uploads/{DIGEST}/", "MaxKeys": 1})
+
+
+def test_content_digest_rewinds_the_file():
+    fileobj = io.BytesIO(IMAGE)
+    fileobj.read(10)
+
+    assert content_digest(fileobj) == DIGEST
+    assert fileobj.tell() == 0
+
+
+def test_content_key_keeps_only_a_safe_base_name():
+    assert content_key(DIGEST, "C:\\scans\\my license (1).jpg", "uploads/") == f"uploads/{DIGEST}/my_license_1_.jpg"
+    assert content_key(DIGEST, "../", "uploads/") == f"uploads/{DIGEST}/upload"
+
+
+def test_new_content_is_uploaded_under_its_hash(s3):
+    client, stubber = s3
+    expect_list(stubber, [])
+    stubber.add_response("put_object", {"ETag": '"etag"'},
+                         {"Bucket": BUCKET, "Key": f"uploads/{DIGEST}/license.jpg", "Body": ANY,
+                          "ContentType": "image/jpeg", "ChecksumAlgorithm": ANY})
+
+    key, uploaded = uploader(client).upload(io.BytesIO(IMAGE), "license.jpg", "image/jpeg")
+
+    assert (key, uploaded) == (f"uploads/{DIGEST}/license.jpg", True)
+
+
+def test_known_content_is_not_uploaded_again_under_any_name(s3):
+    client, stubber = s3
+    expect_list(stubber, [])
+    stubber.add_response("put_object", {"ETag": '"etag"'},
+                         {"Bucket": BUCKET, "Key": f"uploads/{DIGEST}/license.jpg", "Body": ANY,
+                          "ChecksumAlgorithm": ANY})
+    deduping = uploader(client)
+    deduping.upload(io.BytesIO(IMAGE), "license.jpg")
+
+    assert deduping.upload(io.BytesIO(IMAGE), "renamed.jpg") == (f"uploads/{DIGEST}/license.jpg", False)
+    assert deduping.stats == {"uploaded": 1, "known": 1, "found_in_bucket": 0}
+
+
+def test_content_already_in_the_bucket_is_found_by_a_new_process(s3):
+    client, stubber = s3
+    expect_list(stubber, [f"uploads/{DIGEST}/license.jpg"])
+    deduping = uploader(client)
+
+    assert deduping.upload(io.BytesIO(IMAGE), "other.jpg") == (f"uploads/{DIGEST}/license.jpg", False)
+    assert deduping.upload(io.BytesIO(IMAGE), "other.jpg")[1] is False
+    assert deduping.stats == {"uploaded": 0, "known": 1, "found_in_bucket": 1}
+
+
+def test_large_images_are_sent_in_parts(s3):
+    client, stubber = s3
+    part_size = 5 * 1024 * 1024
+    image = IMAGE * (2 * part_size // len(IMAGE) + 1)
+    digest = hashlib.sha256(image).hexdigest()
+    key = f"uploads/{digest}/scan.png"
+    stubber.add_response("list_objects_v2", {"KeyCount": 0},
+                         {"Bucket": BUCKET, "Prefix": f"uploads/{digest}/", "MaxKeys": 1})
+    stubber.add_response("create_multipart_upload", {"UploadId": "upload-1"},
+                         {"Bucket": BUCKET, "Key": key, "ChecksumAlgorithm": ANY})
+    for part in (1, 2, 3):
+        stubber.add_response("upload_part", {"ETag": f'"part-{part}"'},
+                             {"Bucket": BUCKET, "Key": key, "UploadId": "upload-1", "PartNumber": part, "Body": ANY,
+                              "ChecksumAlgorithm": ANY})
+    stubber.add_response("complete_multipart_upload", {},
+                         {"Bucket": BUCKET, "Key": key, "UploadId": "upload-1", "MultipartUpload": ANY})
+
+    deduping = uploader(client, multipart_threshold=part_size, multipart_chunksize=part_size)
+
+    assert deduping.upload(io.BytesIO(image), "scan.png") == (key, True)
@@ -0,0 +1,46 @@
+import pytest
+
+from segmenter import iter_segments, split_utf8
+
+
+def test_pieces_never_split_a_character():
+    text = "naïve дозировка 😀 " * 20
+
+    for max_bytes in range(4, 40):
+        pieces = [piece.decode("utf-8") for piece in split_utf8(text.encode("utf-8"), max_bytes)]
+        assert all(len(piece.encode("utf-8")) <= max_bytes for piece in pieces)
+        assert "".join(pieces).replace(" ", "") == text.replace(" ", "")
+
+
+def test_cuts_prefer_a_space():
+    assert list(split_utf8(b"alpha beta gamma", 11)) == [b"alpha beta", b"gamma"]
+
+
+@pytest.mark.parametrize("max_bytes", [0, 1, 3])
+def test_too_small_a_limit_is_rejected(max_bytes):
+    with pytest.raises(ValueError):
+        list(split_utf8("😀".encode("utf-8"), max_bytes))
+    with pytest.raises(ValueError):
+        list(iter_segments("😀", max_bytes, sentences=["😀"]))
+
+
+def test_sentences_are_packed_up_to_the_limit():
+    sentences = ["One two.", "Three four.", "Five six seven eight nine ten."]
+
+    segments = [segment["Text"] for segment in iter_segments("", 20, sentences=sentences)]
+
+    assert segments == ["One two. Three four.", "Five six seven eight", "nine ten."]
+
+
+def test_segments_are_yielded_before_the_rest_is_packed():
+    seen = []
+
+    def sentences():
+        for sentence in ["First sentence.", "Second sentence.", "Third sentence."]:
+            seen.append(sentence)
+            yield sentence
+
+    segments = iter_segments("", 20, sentences=sentences())
+
+    assert next(segments) == {"Text": "First sentence."}
+    assert seen == ["First sentence.", "Second sentence."]
@@ -0,0 +1,109 @@
+import io
+
+import boto3
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+from PIL import Image
+
+from thumbnail_cache import HEAD_RANGE_BYTES, ThumbnailCache, thumbnail_key
+
+BUCKET = "underwriting-images"
+KEY = "uploads/abc/license.png"
+
+
+def png(width, height):
+    output = io.BytesIO()
+    Image.effect_noise((width, height), 60).convert("RGB").save(output, "PNG")
+    return output.getvalue()
+
+
+def body(data):
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+@pytest.fixture
+def s3():
+    client = boto3.client("s3", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test")
+    with Stubber(client) as stubber:
+        yield client, stubber
+        stubber.assert_no_pending_responses()
+
+
+def expect_no_stored_thumbnail(stubber):
+    stubber.add_client_error("get_object", service_error_code="NoSuchKey", http_status_code=404,
+                             expected_params={"Bucket": BUCKET, "Key": thumbnail_key(KEY)})
+
+
+def expect_head_range(stubber, data, etag):
+    head = data[:HEAD_RANGE_BYTES]
+    stubber.add_response("get_object", {"Body": body(head), "ETag": etag,
+                                        "ContentRange": f"bytes 0-{len(head) - 1}/{len(data)}"},
+                         {"Bucket": BUCKET, "Key": KEY, "Range": f"bytes=0-{HEAD_RANGE_BYTES - 1}"})
+
+
+def test_a_stored_thumbnail_is_served_without_touching_the_original(s3):
+    client, stubber = s3
+    thumbnail = b"\xff\xd8stored thumbnail"
+    stubber.add_response("get_object", {"Body": body(thumbnail), "Metadata": {"source-etag": '"v1"'}},
+                         {"Bucket": BUCKET, "Key": thumbnail_key(KEY)})
+    cache = ThumbnailCache(client, disk_dir=None)
+
+    assert cache.get(BUCKET, KEY, '"v1"') == thumbnail
+    assert cache.get(BUCKET, KEY, '"v1"') == thumbnail
+    assert cache.stats["stored"] == 1 and cache.stats["memory_hits"] == 1
+
+
+def test_a_stored_thumbnail_of_an_older_version_is_ignored(s3):
+    client, stubber = s3
+    data = png(64, 48)
+    stubber.add_response("get_object", {"Body": body(b"old"), "Metadata": {"source-etag": '"v1"'}},
+                         {"Bucket": BUCKET, "Key": thumbnail_key(KEY)})
+    expect_head_range(stubber, data, '"v2"')
+    cache = ThumbnailCache(client, disk_dir=None)
+
+    thumbnail = cache.get(BUCKET, KEY, '"v2"')
+
+    assert Image.open(io.BytesIO(thumbnail)).size == (64, 48)
+    assert cache.stats["stored"] == 0 and cache.stats["full"] == 1
+
+
+def test_a_large_image_without_a_preview_gets_a_placeholder_once(s3):
+    client, stubber = s3
+    data = png(1600, 1200)
+    assert len(data) > 2 * HEAD_RANGE_BYTES
+    expect_no_stored_thumbnail(stubber)
+    expect_head_range(stubber, data, '"v1"')
+    cache = ThumbnailCache(client, disk_dir=None)
+
+    assert cache.get_many(BUCKET, [(KEY, '"v1"')]) == [None]
+    # Remembered: no further requests for the same version
+    assert cache.get_many(BUCKET, [(KEY, '"v1"')]) == [None]
+    assert cache.stats["placeholders"] == 1 and cache.stats["bytes_downloaded"] == HEAD_RANGE_BYTES
+
+
+def test_a_small_image_is_rendered_from_the_ranged_get(s3):
+    client, stubber = s3
+    data = png(40, 30)
+    assert len(data) < HEAD_RANGE_BYTES
+    expect_no_stored_thumbnail(stubber)
+    expect_head_range(stubber, data, '"v1"')
+    cache = ThumbnailCache(client, disk_dir=None)
+
+    assert Image.open(io.BytesIO(cache.get(BUCKET, KEY, '"v1"'))).size == (40, 30)
+
+
+def test_store_writes_the_thumbnail_next_to_the_upload(s3, tmp_path):
+    client, stubber = s3
+    data = png(800, 600)
+    stubber.add_response("head_object", {"ETag": '"v1"'}, {"Bucket": BUCKET, "Key": KEY})
+    stubber.add_response("put_object", {}, {"Bucket": BUCKET, "Key": thumbnail_key(KEY), "Body": ANY,
+                                            "ContentType": "image/jpeg", "Metadata": {"source-etag": '"v1"'}})
+    cache = ThumbnailCache(client, disk_dir=str(tmp_path))
+
+    thumbnail = cache.store(BUCKET, KEY, data)
+
+    assert max(Image.open(io.BytesIO(thumbnail)).size) == cache.side
+    # Served from the local tiers afterwards, in this process and the next
+    assert cache.get(BUCKET, KEY, '"v1"') == thumbnail
+    assert ThumbnailCache(client, disk_dir=str(tmp_path)).get(BUCKET, KEY, '"v1"') == thumbnail
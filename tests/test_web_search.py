@@ -0,0 +1,141 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from web_search import GoogleCustomSearch, WebSearch, build_session, merge_results, reformulate
+
+STATEMENT = "Lisbon is one of the sunniest capitals in Europe. Trams are the easiest way to see the old town."
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+# Backend returning one result per query, or raising for queries in `failing`
+class StubBackend:
+    cache_id = "stub"
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        if query in self.failing:
+            raise requests.ConnectionError(query)
+        return [{"title": query, "link": f"https://travel.example/{len(self.queries)}", "snippet": query}]
+
+
+# Custom Search stand-in answering 503 to the first `failures` requests
+class FlakySearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests += 1
+        if self.server.requests <= self.server.failures:
+            status, body = 503, b'{"error": {"code": 503}}'
+        else:
+            status, body = 200, json.dumps({"items": [{"title": "Trams", "link": "https://travel.example/trams",
+                                                       "snippet": "Tram 28 crosses the old town."}]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def flaky_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakySearchHandler)
+    server.daemon_threads = True
+    server.requests = 0
+    server.failures = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_the_statement_is_searched_as_written_by_default():
+    assert reformulate(STATEMENT) == [STATEMENT]
+
+
+def test_fan_out_adds_keywords_then_sentences():
+    queries = reformulate(STATEMENT, limit=4)
+
+    assert queries[0] == STATEMENT
+    assert queries[1].startswith("Lisbon one sunniest capitals Europe")
+    assert queries[2:] == ["Lisbon is one of the sunniest capitals in Europe.",
+                           "Trams are the easiest way to see the old town."]
+
+
+def test_merged_results_interleave_by_rank_without_repeats():
+    first = [{"link": "https://a.example/1", "snippet": "one"}, {"link": "https://a.example/2", "snippet": "two"}]
+    second = [{"link": "http://A.example/1/", "snippet": "other"}, {"link": "https://b.example/3", "snippet": "Two."}]
+
+    assert merge_results([first, second]) == [first[0], first[1]]
+    assert merge_results([[], second]) == second
+
+
+def test_results_are_cached_by_normalized_query_until_the_ttl():
+    backend, clock = StubBackend(), Clock()
+    search = WebSearch(backend, ttl_seconds=60, clock=clock)
+
+    first = search.search("Lisbon trams?")
+    assert search.search("  lisbon   TRAMS ") == first
+    clock.now += 60
+    search.search("lisbon trams")
+
+    assert backend.queries == ["Lisbon trams?", "lisbon trams"]
+    assert search.stats["hits"] == 1 and search.stats["misses"] == 2
+
+
+def test_the_least_recently_used_query_is_evicted():
+    backend = StubBackend()
+    search = WebSearch(backend, max_entries=2)
+
+    search.search("a")
+    search.search("b")
+    search.search("a")
+    search.search("c")
+    search.search("a")
+    search.search("b")
+
+    assert backend.queries == ["a", "b", "c", "b"]
+
+
+def test_failed_phrasings_are_skipped_unless_all_fail():
+    search = WebSearch(StubBackend(failing=["broken"]), max_workers=2)
+
+    assert [item["title"] for item in search.search_many(["broken", "working"])] == ["working"]
+    assert search.stats["errors"] == 1
+    with pytest.raises(requests.ConnectionError):
+        search.search_many(["broken"])
+
+
+def test_a_transient_503_is_retried(flaky_server):
+    flaky_server.failures = 1
+    backend = GoogleCustomSearch("k", "c", session=build_session(retries=2),
+                                 endpoint=f"http://127.0.0.1:{flaky_server.server_address[1]}/customsearch/v1")
+
+    assert [item["title"] for item in backend.search("lisbon trams")] == ["Trams"]
+    assert flaky_server.requests == 2
+
+
+def test_persistent_errors_are_raised_once_retries_run_out(flaky_server):
+    flaky_server.failures = 10
+    backend = GoogleCustomSearch("k", "c", session=build_session(retries=1),
+                                 endpoint=f"http://127.0.0.1:{flaky_server.server_address[1]}/customsearch/v1")
+
+    with pytest.raises(requests.RequestException):
+        backend.search("lisbon trams")
+    assert flaky_server.requests == 2
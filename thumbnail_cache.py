@@ -0,0 +1,306 @@
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+from botocore.exceptions import ClientError
+from aws_clients import get_client
+
+THUMBNAIL_SIDE = int(os.environ.get("THUMBNAIL_SIDE", "256"))
+THUMBNAIL_CACHE_DIR = os.environ.get("THUMBNAIL_CACHE_DIR",
+                                     os.path.join(tempfile.gettempdir(), "underwriting-thumbnails"))
+THUMBNAIL_MEMORY_BYTES = int(os.environ.get("THUMBNAIL_MEMORY_BYTES", str(32 * 1024 * 1024)))
+THUMBNAIL_DISK_BYTES = int(os.environ.get("THUMBNAIL_DISK_BYTES", str(512 * 1024 * 1024)))
+THUMBNAIL_FETCH_WORKERS = int(os.environ.get("THUMBNAIL_FETCH_WORKERS", "8"))
+# Thumbnails written next to uploaded images as <key><suffix>. The suffix is
+# not an image extension, so listings and the gallery skip them.
+THUMBNAIL_SUFFIX = os.environ.get("THUMBNAIL_SUFFIX", ".thumb")
+# Largest image downloaded whole when it has neither a stored thumbnail nor an
+# EXIF preview; larger ones are shown as a placeholder
+THUMBNAIL_MAX_SOURCE_BYTES = int(os.environ.get("THUMBNAIL_MAX_SOURCE_BYTES", str(512 * 1024)))
+# Bytes read from the start of an image looking for its EXIF preview; an APP1
+# segment is at most 64 KiB
+HEAD_RANGE_BYTES = 64 * 1024
+
+# Transpose for each EXIF orientation, as in PIL.ImageOps.exif_transpose
+ORIENTATION_TRANSPOSE = {2: "FLIP_LEFT_RIGHT", 3: "ROTATE_180", 4: "FLIP_TOP_BOTTOM", 5: "TRANSPOSE",
+                         6: "ROTATE_270", 7: "TRANSVERSE", 8: "ROTATE_90"}
+
+
+# Function to read one TIFF IFD as {tag: (type, 4 value bytes)} and the
+# offset of the next IFD
+def _read_ifd(tiff, endian, offset):
+    (count,) = struct.unpack_from(endian + "H", tiff, offset)
+    fields = {}
+    for index in range(count):
+        tag, field_type, _, value = struct.unpack_from(endian + "HHI4s", tiff, offset + 2 + 12 * index)
+        fields[tag] = (field_type, value)
+    (next_offset,) = struct.unpack_from(endian + "I", tiff, offset + 2 + 12 * count)
+    return fields, next_offset
+
+
+def _field_int(fields, tag, endian):
+    if tag not in fields:
+        return None
+    field_type, value = fields[tag]
+    # SHORT values sit in the first two of the four value bytes
+    return struct.unpack_from(endian + ("H" if field_type == 3 else "I"), value)[0]
+
+
+# Function to find the preview JPEG that cameras embed in EXIF (IFD1) within
+# the first bytes of a JPEG. Returns (preview bytes, orientation), or
+# (None, orientation) when there is none in the bytes given.
+def embedded_preview(head):
+    if head[:2] != b"\xff\xd8":
+        return None, 1
+    position = 2
+    while position + 4 <= len(head) and head[position] == 0xFF:
+        marker = head[position + 1]
+        if marker in (0xD9, 0xDA):
+            break
+        (length,) = struct.unpack_from(">H", head, position + 2)
+        segment = head[position + 4:position + 2 + length]
+        if marker == 0xE1 and segment.startswith(b"Exif\x00\x00"):
+            tiff = segment[6:]
+            try:
+                endian = "<" if tiff[:2] == b"II" else ">"
+                ifd0, ifd1_offset = _read_ifd(tiff, endian, struct.unpack_from(endian + "I", tiff, 4)[0])
+                orientation = _field_int(ifd0, 0x0112, endian) or 1
+                if not ifd1_offset:
+                    return None, orientation
+                ifd1, _ = _read_ifd(tiff, endian, ifd1_offset)
+                offset, length = _field_int(ifd1, 0x0201, endian), _field_int(ifd1, 0x0202, endian)
+            except struct.error:
+                return None, 1
+            if offset and length and offset + length <= len(tiff):
+                return tiff[offset:offset + length], orientation
+            return None, orientation
+        position += 2 + length
+    return None, 1
+
+
+def thumbnail_key(key):
+    return key + THUMBNAIL_SUFFIX
+
+
+# Function to turn image bytes into a small upright JPEG thumbnail
+def render_thumbnail(data, side=THUMBNAIL_SIDE, orientation=None):
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    # JPEGs decode straight to a fraction of their size
+    image.draft("RGB", (side, side))
+    if orientation is None:
+        image = ImageOps.exif_transpose(image)
+    elif orientation in ORIENTATION_TRANSPOSE:
+        image = image.transpose(getattr(Image.Transpose, ORIENTATION_TRANSPOSE[orientation]))
+    image.thumbnail((side, side))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, "JPEG", quality=80)
+    return output.getvalue()
+
+
+# Thumbnails of S3 images keyed by bucket, key and ETag, so a changed object
+# gets a new thumbnail. Lookups go memory LRU, then disk LRU, then S3. On S3
+# the thumbnail store() wrote next to the image at upload time is used if it
+# was made from the current object; otherwise one ranged GET of the first
+# 64 KiB finds a camera's EXIF preview, or the whole image when it is that
+# small. Images up to THUMBNAIL_MAX_SOURCE_BYTES are fetched in full as a
+# last resort; larger ones get no thumbnail (a placeholder in the gallery),
+# remembered so they are not asked for again. get_many() fetches the misses
+# of one gallery page concurrently.
+class ThumbnailCache:
+    def __init__(self, s3_client, side=THUMBNAIL_SIDE, disk_dir=THUMBNAIL_CACHE_DIR,
+                 memory_bytes=THUMBNAIL_MEMORY_BYTES, disk_bytes=THUMBNAIL_DISK_BYTES,
+                 max_workers=THUMBNAIL_FETCH_WORKERS):
+        self.s3_client = s3_client
+        self.side = side
+        self.disk_dir = disk_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = OrderedDict()
+        self._disk_size = 0
+        # File names of object versions that have no thumbnail to show
+        self._no_preview = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "stored": 0, "ranged": 0, "full": 0, "placeholders": 0,
+                      "bytes_downloaded": 0, "errors": 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            # Oldest first, so the disk LRU survives restarts
+            entries = [entry for entry in os.scandir(disk_dir) if entry.name.endswith(".jpg")]
+            for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+                self._disk[entry.name] = entry.stat().st_size
+                self._disk_size += entry.stat().st_size
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _file_name(self, bucket, key, etag):
+        return hashlib.sha256(f"{bucket}/{key}/{etag}".encode("utf-8")).hexdigest() + ".jpg"
+
+    def _remember(self, name, thumbnail):
+        with self._lock:
+            old = self._memory.pop(name, None)
+            if old is not None:
+                self._memory_size -= len(old)
+            self._memory[name] = thumbnail
+            self._memory_size += len(thumbnail)
+            while self._memory_size > self.memory_bytes and self._memory:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _read_disk(self, name):
+        if not self.disk_dir or name not in self._disk:
+            return None
+        path = os.path.join(self.disk_dir, name)
+        try:
+            with open(path, "rb") as f:
+                thumbnail = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        with self._lock:
+            if name in self._disk:
+                self._disk.move_to_end(name)
+        return thumbnail
+
+    def _write_disk(self, name, thumbnail):
+        if not self.disk_dir:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(thumbnail)
+        os.replace(tmp_path, os.path.join(self.disk_dir, name))
+        evicted = []
+        with self._lock:
+            self._disk_size += len(thumbnail) - self._disk.pop(name, 0)
+            self._disk[name] = len(thumbnail)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_name, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_name)
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.disk_dir, old_name))
+            except OSError:
+                pass
+
+    # Function to read the thumbnail stored next to an image. Returns
+    # (thumbnail, source ETag), or None when there is none for this version.
+    def _stored(self, bucket, key, etag):
+        try:
+            response = self.s3_client.get_object(Bucket=bucket, Key=thumbnail_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        source_etag = response.get("Metadata", {}).get("source-etag")
+        if source_etag is None or (etag is not None and source_etag != etag):
+            return None
+        thumbnail = response["Body"].read()
+        self._count("bytes_downloaded", len(thumbnail))
+        self._count("stored")
+        return thumbnail, source_etag
+
+    # Function to make a thumbnail from S3. Returns (thumbnail or None, ETag).
+    def _fetch(self, bucket, key, etag):
+        stored = self._stored(bucket, key, etag)
+        if stored is not None:
+            return stored
+
+        response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{HEAD_RANGE_BYTES - 1}")
+        head = response["Body"].read()
+        self._count("bytes_downloaded", len(head))
+        preview, orientation = embedded_preview(head)
+        if preview is not None:
+            self._count("ranged")
+            return render_thumbnail(preview, self.side, orientation), response["ETag"]
+        total = response.get("ContentRange", "").rpartition("/")[2]
+        if not total.isdigit() or len(head) >= int(total):
+            # The whole object fit in the range
+            self._count("full")
+            return render_thumbnail(head, self.side), response["ETag"]
+        if int(total) > THUMBNAIL_MAX_SOURCE_BYTES:
+            self._count("placeholders")
+            return None, response["ETag"]
+        # Fetch only the rest, pinned to the version whose head we read
+        self._count("full")
+        response = self.s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={len(head)}-",
+                                             IfMatch=response["ETag"])
+        rest = response["Body"].read()
+        self._count("bytes_downloaded", len(rest))
+        return render_thumbnail(head + rest, self.side), response["ETag"]
+
+    # Function to get one thumbnail; etag may be None if the listing has not
+    # seen the object yet, in which case the fetched ETag is used
+    def get(self, bucket, key, etag=None):
+        if etag is not None:
+            name = self._file_name(bucket, key, etag)
+            with self._lock:
+                thumbnail = self._memory.get(name)
+                if thumbnail is not None:
+                    self._memory.move_to_end(name)
+                    self.stats["memory_hits"] += 1
+                    return thumbnail
+                if name in self._no_preview:
+                    return None
+            thumbnail = self._read_disk(name)
+            if thumbnail is not None:
+                self._count("disk_hits")
+                self._remember(name, thumbnail)
+                return thumbnail
+
+        thumbnail, etag = self._fetch(bucket, key, etag)
+        name = self._file_name(bucket, key, etag)
+        if thumbnail is None:
+            with self._lock:
+                self._no_preview.add(name)
+            return None
+        self._remember(name, thumbnail)
+        self._write_disk(name, thumbnail)
+        return thumbnail
+
+    # Function to write the thumbnail of a just-uploaded image next to it, so
+    # the gallery never has to download the original. `data` is the image as
+    # uploaded; the stored copy records the ETag it was made from.
+    def store(self, bucket, key, data):
+        etag = self.s3_client.head_object(Bucket=bucket, Key=key)["ETag"]
+        thumbnail = render_thumbnail(data, self.side)
+        self.s3_client.put_object(Bucket=bucket, Key=thumbnail_key(key), Body=thumbnail, ContentType="image/jpeg",
+                                  Metadata={"source-etag": etag})
+        name = self._file_name(bucket, key, etag)
+        self._remember(name, thumbnail)
+        self._write_disk(name, thumbnail)
+        return thumbnail
+
+    def _get_or_none(self, bucket, key, etag):
+        try:
+            return self.get(bucket, key, etag)
+        except Exception:
+            # S3 errors, and Pillow rejecting some files outright (unreadable,
+            # decompression bomb), leave that image without a preview
+            self._count("errors")
+            return None
+
+    # Function to get the thumbnails for one page of (key, etag) pairs, in
+    # order; None marks an image without a preview, shown as a placeholder
+    def get_many(self, bucket, keys_and_etags):
+        futures = [self._pool.submit(self._get_or_none, bucket, key, etag) for key, etag in keys_and_etags]
+        return [future.result() for future in futures]
+
+
+# Process-wide thumbnail cache, shared by every browser session
+@st.cache_resource
+def get_thumbnail_cache(region_name=None):
+    return ThumbnailCache(get_client('s3', region_name))
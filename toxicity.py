@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import BotoCoreError, ClientError
+from segmenter import iter_segments
+
+# DetectToxicContent limits: at most 10 segments per request, 1 KB per segment
+MAX_SEGMENTS_PER_REQUEST = 10
+MAX_SEGMENT_BYTES = 1000
+# Batches in flight at once for a single text
+TOXICITY_MAX_WORKERS = int(os.environ.get("TOXICITY_MAX_WORKERS", "4"))
+
+
+# Toxicity results lined up with the segments they were computed for. A
+# segment whose batch failed has None in `results`; `errors` says why.
+class ToxicityReport:
+    def __init__(self, segments, results, errors):
+        self.segments = segments
+        self.results = results
+        self.errors = errors
+
+    # (segment, result) pairs for every segment that was scored
+    def scored(self):
+        return [(segment, result) for segment, result in zip(self.segments, self.results) if result is not None]
+
+    def result_list(self):
+        return [result for _, result in self.scored()]
+
+    def failed(self):
+        return bool(self.segments) and not self.scored()
+
+
+# Function to score segments in full batches of 10, several batches at a time.
+# `segments` may be a generator: each batch is sent as soon as it fills up,
+# so scoring overlaps with segmenting the rest of the text.
+def detect_toxic_segments(comprehend_client, segments, language_code='en', max_workers=TOXICITY_MAX_WORKERS):
+    seen = []
+    errors = []
+    futures = {}
+
+    def score_batch(batch):
+        response = comprehend_client.detect_toxic_content(TextSegments=batch, LanguageCode=language_code)
+        return response['ResultList']
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        batch = []
+        for segment in segments:
+            seen.append(segment)
+            batch.append(segment)
+            if len(batch) == MAX_SEGMENTS_PER_REQUEST:
+                futures[pool.submit(score_batch, batch)] = len(seen) - len(batch)
+                batch = []
+        if batch:
+            futures[pool.submit(score_batch, batch)] = len(seen) - len(batch)
+
+        results = [None] * len(seen)
+        for future in as_completed(futures):
+            start = futures[future]
+            try:
+                batch_results = future.result()
+            except (ClientError, BotoCoreError) as e:
+                end = min(start + MAX_SEGMENTS_PER_REQUEST, len(seen))
+                errors.append(f"segments {start + 1}-{end}: {e}")
+            else:
+                results[start:start + len(batch_results)] = batch_results
+
+    return ToxicityReport(seen, results, errors)
+
+
+# Function to segment a text and score it
+def detect_toxicity_in_text(comprehend_client, text, language_code='en', max_workers=TOXICITY_MAX_WORKERS):
+    return detect_toxic_segments(comprehend_client, iter_segments(text, MAX_SEGMENT_BYTES), language_code, max_workers)
@@ -0,0 +1,159 @@
+import statistics
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Columns of the downloadable results table, in order
+RESULT_COLUMNS = ["s3_key", "status", "decision", "rationale", "latency_s", "execution_arn", "error"]
+
+
+# Function to pull the decision and rationale out of the model's reply
+def parse_decision_rationale(text):
+    decision_start = text.find('<decision>') + len('<decision>')
+    decision_end = text.find('</decision>')
+    rationale_start = text.find('<rationale>') + len('<rationale>')
+    rationale_end = text.find('</rationale>')
+    return text[decision_start:decision_end].strip(), text[rationale_start:rationale_end].strip()
+
+
+# One license image in a batch
+class BatchItem:
+    def __init__(self, key):
+        self.key = key
+        self.execution = None
+        self.future = None
+        self.error = None
+
+    @property
+    def status(self):
+        if self.error:
+            return "ERROR"
+        if self.execution:
+            return self.execution.status
+        return "RUNNING" if self.future else "PENDING"
+
+    @property
+    def done(self):
+        return self.error is not None or (self.execution is not None and self.execution.done)
+
+
+# Runs many images through the underwriting state machine. advance() never
+# blocks, so a Streamlit fragment can drive it on every refresh: it starts
+# executions while fewer than `concurrency` are in flight and the rate
+# limiter has a token, then checks the running ones through the tracker's
+# shared poller. Express workflows have no execution status to poll, so
+# their start_sync_execution calls run on a thread pool instead.
+class UnderwritingBatch:
+    def __init__(self, tracker, state_machine_arn, bucket_name, keys, concurrency=10, rate_limiter=None):
+        self.tracker = tracker
+        self.state_machine_arn = state_machine_arn
+        self.bucket_name = bucket_name
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = rate_limiter
+        self.items = [BatchItem(key) for key in dict.fromkeys(keys)]
+        self.started_at = tracker.clock()
+        self.finished_at = None
+        self._pending = deque(self.items)
+        self._in_flight = []
+        self.express = tracker.is_express(state_machine_arn)
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency) if self.express else None
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def _input(self, key):
+        return {"detail": {"s3_bucket": self.bucket_name, "s3_key": key}}
+
+    def _start_next(self):
+        while self._pending and len(self._in_flight) < self.concurrency:
+            if self.rate_limiter and not self.rate_limiter.try_acquire():
+                return
+            item = self._pending.popleft()
+            if self.express:
+                item.future = self._pool.submit(self.tracker.run_sync, self.state_machine_arn, self._input(item.key))
+            else:
+                try:
+                    item.execution = self.tracker.start(self.state_machine_arn, self._input(item.key))
+                except (ClientError, BotoCoreError) as e:
+                    item.error = f"{type(e).__name__}: {e}"
+                    continue
+            self._in_flight.append(item)
+
+    def _collect(self):
+        for item in self._in_flight:
+            if item.future and item.future.done() and item.execution is None and item.error is None:
+                try:
+                    item.execution = item.future.result()
+                except (ClientError, BotoCoreError) as e:
+                    item.error = f"{type(e).__name__}: {e}"
+        self._in_flight = [item for item in self._in_flight if not item.done]
+
+    # Function to move the batch forward without waiting. Returns True once
+    # every item has finished.
+    def advance(self):
+        if self.done:
+            return True
+        self._collect()
+        self._start_next()
+        if not self.express:
+            self.tracker.poll_many(self.state_machine_arn, [item.execution for item in self._in_flight])
+        self._collect()
+        self._start_next()
+
+        if not self._pending and not self._in_flight:
+            self.finished_at = self.tracker.clock()
+            if self._pool:
+                self._pool.shutdown(wait=False)
+        return self.done
+
+    # Function to run the batch to the end, for scripts
+    def run(self, interval=0.5):
+        while not self.advance():
+            self.tracker.sleep(interval)
+        return self
+
+    def counts(self):
+        counts = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return counts
+
+    # Function to build one result row per image, in input order
+    def results(self):
+        rows = []
+        for item in self.items:
+            execution = item.execution
+            decision = rationale = None
+            error = item.error or (execution.error if execution else None)
+            if execution and execution.status == "SUCCEEDED":
+                try:
+                    decision, rationale = parse_decision_rationale(execution.output["Body"]["content"][0]["text"])
+                except (KeyError, IndexError, TypeError):
+                    error = "Unexpected state machine output"
+            latency = round(execution.elapsed(self.tracker.clock()), 2) if execution and execution.done else None
+            rows.append({"s3_key": item.key, "status": item.status, "decision": decision, "rationale": rationale,
+                         "latency_s": latency, "execution_arn": execution.execution_arn if execution else None,
+                         "error": error})
+        return rows
+
+    # Function to summarise throughput and per-execution latency
+    def stats(self):
+        now = self.finished_at if self.done else self.tracker.clock()
+        elapsed = now - self.started_at
+        finished = [item for item in self.items if item.done]
+        latencies = sorted(item.execution.elapsed(now) for item in finished if item.execution)
+        stats = {
+            "images": len(self.items),
+            "finished": len(finished),
+            "succeeded": sum(item.status == "SUCCEEDED" for item in finished),
+            "elapsed_s": round(elapsed, 1),
+            "throughput_per_min": round(len(finished) / elapsed * 60, 1) if elapsed > 0 else 0.0,
+        }
+        if latencies:
+            stats.update({
+                "latency_p50_s": round(statistics.median(latencies), 1),
+                "latency_p95_s": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+                "latency_max_s": round(latencies[-1], 1),
+            })
+        return stats
@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GOOGLE_SEARCH_ENDPOINT = os.environ.get("SEARCH_ENDPOINT", "https://www.googleapis.com/customsearch/v1")
+SEARCH_CONNECT_TIMEOUT = float(os.environ.get("SEARCH_CONNECT_TIMEOUT", "3.05"))
+SEARCH_READ_TIMEOUT = float(os.environ.get("SEARCH_READ_TIMEOUT", "10"))
+SEARCH_RETRIES = int(os.environ.get("SEARCH_RETRIES", "3"))
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_ENTRIES = int(os.environ.get("SEARCH_CACHE_ENTRIES", "1000"))
+# Phrasings a statement is searched under, run at once. 1 searches the
+# statement as written, as the fact-checker always has; more is opt-in.
+SEARCH_FAN_OUT = int(os.environ.get("SEARCH_FAN_OUT", "1"))
+
+# Words left out of the keyword reformulation of a statement
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do for from has have how i if in into is it its of on or our so that the "
+    "their there these they this to was we were what when where which who will with you your".split()
+)
+# Longest query sent for one phrasing, in words
+MAX_QUERY_WORDS = 32
+
+
+# Function to build an HTTP session with pooled connections and retries on
+# connection errors, 429 and 5xx, with exponential backoff
+def build_session(retries=SEARCH_RETRIES, pool_size=10):
+    retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET",), respect_retry_after_header=True)
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Function to reduce a query to the form cached results are stored under
+def normalize_query(query):
+    return " ".join(query.lower().split()).strip(" .?!")
+
+
+# Function to derive up to `limit` search queries from a statement: the
+# statement as written, then its keywords, then its sentences one by one
+# capped at MAX_QUERY_WORDS
+def reformulate(statement, limit=SEARCH_FAN_OUT):
+    words = re.findall(r"[\w'-]+", statement)
+    keywords = list(dict.fromkeys(word for word in words if word.lower() not in STOPWORDS))
+    candidates = [statement, " ".join(keywords[:12])]
+    candidates += [" ".join(sentence.split()[:MAX_QUERY_WORDS]) for sentence in re.split(r"(?<=[.!?])\s+", statement)]
+    queries, seen = [], set()
+    for query in candidates:
+        if query.strip() and normalize_query(query) not in seen:
+            seen.add(normalize_query(query))
+            queries.append(query)
+    return queries[:max(1, limit)] or [statement]
+
+
+# Google Programmable Search backend. Any object with a cache_id and a
+# search(query) returning [{"title", "link", "snippet"}] can stand in for it.
+class GoogleCustomSearch:
+    def __init__(self, api_key, cse_id, session=None, endpoint=GOOGLE_SEARCH_ENDPOINT, num=5,
+                 timeout=(SEARCH_CONNECT_TIMEOUT, SEARCH_READ_TIMEOUT)):
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.session = session or build_session()
+        self.endpoint = endpoint
+        self.num = num
+        self.timeout = timeout
+        self.cache_id = f"{endpoint}|{cse_id}|{num}"
+
+    def search(self, query):
+        params = {"key": self.api_key, "cx": self.cse_id, "q": query, "num": self.num}
+        response = self.session.get(self.endpoint, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return [{"title": item.get("title", ""), "link": item.get("link", ""), "snippet": item.get("snippet", "")}
+                for item in response.json().get("items", [])]
+
+
+# Function to compare result links regardless of scheme, case of the host,
+# fragment and a trailing slash
+def link_identity(link):
+    parts = urlsplit(link)
+    return urlunsplit(("", parts.netloc.lower(), parts.path.rstrip("/"), parts.query, ""))
+
+
+# Function to merge several ranked result lists: interleaved by rank, so each
+# phrasing's best hits come first, without repeated links or snippets
+def merge_results(result_lists):
+    merged, links, snippets = [], set(), set()
+    for rank in range(max((len(results) for results in result_lists), default=0)):
+        for results in result_lists:
+            if rank >= len(results):
+                continue
+            item = results[rank]
+            link, snippet = link_identity(item["link"]), normalize_query(item["snippet"])
+            if link in links or (snippet and snippet in snippets):
+                continue
+            links.add(link)
+            snippets.add(snippet)
+            merged.append(item)
+    return merged
+
+
+# Web search with a TTL cache keyed by backend and normalized query, and
+# parallel fan-out over several phrasings of one question
+class WebSearch:
+    def __init__(self, backend, ttl_seconds=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_ENTRIES,
+                 max_workers=SEARCH_FAN_OUT, clock=time.monotonic):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="web-search")
+        self.stats = {"hits": 0, "misses": 0, "errors": 0}
+
+    def search(self, query):
+        key = (self.backend.cache_id, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+
+        results = self.backend.search(query)
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl_seconds, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return results
+
+    # Function to search several phrasings at once and merge what they find.
+    # Failed phrasings are skipped; the error is raised only if all fail.
+    def search_many(self, queries):
+        futures = [self._pool.submit(self.search, query) for query in queries]
+        result_lists, error = [], None
+        for future in futures:
+            try:
+                result_lists.append(future.result())
+            except requests.RequestException as e:
+                with self._lock:
+                    self.stats["errors"] += 1
+                error = e
+        if not result_lists and error is not None:
+            raise error
+        return merge_results(result_lists)
+
+
+# Process-wide search client per credential pair, sharing its connection
+# pool and result cache across sessions
+@st.cache_resource
+def get_web_search(api_key, cse_id):
+    return WebSearch(GoogleCustomSearch(api_key, cse_id))